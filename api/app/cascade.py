@@ -0,0 +1,141 @@
+"""
+Каскад детектор -> классификатор с эскалацией по уверенности
+
+Быстрая модель обрабатывает каждое изображение. Детекции, уверенность
+которых ниже порога класса знака, вырезаются и пакетами по batch_size
+перепроверяются тяжёлым классификатором, его метка заменяет метку быстрой
+модели. Пороги по классам приходят из каталога TrafficSign (поле
+escalation_threshold), для остальных классов действует default_threshold.
+"""
+import threading
+import time
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+def crop(image, box):
+    """Вырезка рамки [x, y, w, h] из изображения (H, W, 3), не меньше 1x1"""
+    height, width = image.shape[:2]
+    x, y, w, h = box
+    x0 = min(max(int(x), 0), width - 1)
+    y0 = min(max(int(y), 0), height - 1)
+    x1 = min(max(int(x + w), x0 + 1), width)
+    y1 = min(max(int(y + h), y0 + 1), height)
+    return image[y0:y1, x0:x1]
+
+
+class CascadeMetrics:
+    """Накопительные метрики каскада процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.images = 0
+            self.detections = 0
+            self.escalated = 0
+            self.fast_time = 0.0
+            self.heavy_time = 0.0
+
+    def record(self, images, detections, escalated, fast_time, heavy_time):
+        with self._lock:
+            self.images += images
+            self.detections += detections
+            self.escalated += escalated
+            self.fast_time += fast_time
+            self.heavy_time += heavy_time
+
+    def snapshot(self):
+        """
+        Доля эскалаций и оценка сэкономленного времени.
+
+        Базовая линия «всегда тяжёлая модель» - детекции * среднее время
+        тяжёлого классификатора на вырезку; экономия - базовая линия минус
+        фактическое время каскада (быстрая модель + эскалации). Отрицательное
+        значение - каскад медленнее, чем одна тяжёлая модель.
+
+        Поиск рамок в базовую линию не входит, а в fast_time входит: быстрая
+        модель находит и классифицирует знаки за один проход. Поэтому
+        latency_saved - нижняя оценка экономии: без учёта детектора, который
+        нужен и тяжёлому конвейеру.
+        """
+        with self._lock:
+            per_crop = self.heavy_time / self.escalated if self.escalated else None
+            saved = (self.detections * per_crop - (self.fast_time + self.heavy_time)
+                     if per_crop is not None else None)
+            return {
+                "images": self.images,
+                "detections": self.detections,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.detections, 4) if self.detections else 0.0,
+                "fast_time": round(self.fast_time, 6),
+                "heavy_time": round(self.heavy_time, 6),
+                "heavy_time_per_crop": round(per_crop, 6) if per_crop is not None else None,
+                "latency_saved": round(saved, 6) if saved is not None else None,
+            }
+
+
+class Cascade:
+    """
+    Эскалация неуверенных детекций быстрой модели на тяжёлый классификатор.
+
+    Классификатор создаётся фабрикой classifier_factory при первой эскалации.
+    """
+
+    def __init__(self, classifier_factory, default_threshold=0.7, batch_size=32):
+        self.classifier_factory = classifier_factory
+        self.default_threshold = default_threshold
+        self.batch_size = batch_size
+        self.metrics = CascadeMetrics()
+        self._classifier = None
+        self._lock = threading.Lock()
+
+    @property
+    def classifier(self):
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    self._classifier = self.classifier_factory()
+        return self._classifier
+
+    def _thresholds(self, ids, thresholds):
+        if not thresholds:
+            return np.full(len(ids), self.default_threshold)
+        return np.array([thresholds.get(int(sign_id), self.default_threshold) for sign_id in ids.tolist()])
+
+    def refine(self, images, batch, fast_time=0.0, thresholds=None):
+        """
+        Перепроверяет неуверенные детекции пакета.
+
+        images - декодированные изображения, batch - результаты быстрой
+        модели [(ids, scores, boxes), ...]. Возвращает (новый batch, число эскалаций).
+        """
+        refined = []
+        pending = []  # (номер изображения, номер детекции, вырезка)
+        for position, (image, (ids, scores, boxes)) in enumerate(zip(images, batch)):
+            ids, scores = np.array(ids), np.array(scores, dtype=np.float64)
+            refined.append((ids, scores, boxes))
+            for index in np.flatnonzero(scores < self._thresholds(ids, thresholds)).tolist():
+                pending.append((position, index, crop(image, boxes[index])))
+
+        start_time = time.perf_counter()
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            heavy_ids, heavy_scores = self.classifier.classify_crops([item[2] for item in chunk])
+            for (position, index, _), sign_id, score in zip(chunk, heavy_ids, heavy_scores):
+                refined[position][0][index] = sign_id
+                refined[position][1][index] = score
+        heavy_time = time.perf_counter() - start_time
+
+        self.metrics.record(
+            images=len(images),
+            detections=sum(len(ids) for ids, _, _ in batch),
+            escalated=len(pending),
+            fast_time=fast_time,
+            heavy_time=heavy_time,
+        )
+        return refined, len(pending)
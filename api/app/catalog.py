@@ -0,0 +1,14 @@
+"""
+Каталог дорожных знаков, которые распознаёт модель
+"""
+
+# Список дорожных знаков для демонстрации
+TRAFFIC_SIGNS = [
+    {"id": 1, "name": "Стоп", "confidence": 0.95},
+    {"id": 2, "name": "Ограничение скорости 60", "confidence": 0.87},
+    {"id": 3, "name": "Поворот направо", "confidence": 0.78},
+    {"id": 4, "name": "Пешеходный переход", "confidence": 0.92},
+    {"id": 5, "name": "Главная дорога", "confidence": 0.85},
+]
+
+SIGN_NAMES = {sign["id"]: sign["name"] for sign in TRAFFIC_SIGNS}
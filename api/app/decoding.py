@@ -0,0 +1,104 @@
+"""
+Декодирование изображений из байтов запроса с ограничением памяти
+
+Порядок проверок, от дешёвых к дорогим:
+  1. размер base64 строки - до декодирования base64 (байтовый бюджет);
+  2. размеры из заголовка (Image.open не читает пиксели) - до декодирования
+     пикселей (бюджет пикселей);
+  3. декодирование сразу в уменьшенном размере: для JPEG - draft mode
+     (масштаб 1/2..1/8 прямо в декодере, полноразмерный буфер не создаётся),
+     для остальных форматов - reduce() после загрузки.
+
+Пиковая память на запрос ограничена max_bytes + max_pixels * 3 байт
+(для JPEG с target_size - намного меньше).
+"""
+import base64
+import binascii
+import io
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+
+class ImageDecodeError(ValueError):
+    """Байты не удалось разобрать как изображение"""
+
+
+class ImageTooLargeError(ImageDecodeError):
+    """Изображение превышает бюджет байтов или пикселей"""
+
+
+def decode_base64(image_base64, max_bytes=None):
+    """
+    base64 -> байты; размер проверяется по длине строки до декодирования.
+
+    Бросает ImageTooLargeError или ImageDecodeError.
+    """
+    if max_bytes is not None and len(image_base64) * 3 // 4 > max_bytes:
+        raise ImageTooLargeError(f"Image exceeds {max_bytes} bytes")
+    try:
+        return base64.b64decode(image_base64)
+    except (binascii.Error, ValueError):
+        raise ImageDecodeError("Invalid base64 image data") from None
+
+
+def sniff_size(image_data):
+    """(формат, ширина, высота) по заголовку без декодирования пикселей или None"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            return image.format, image.width, image.height
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from None
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+def check_pixels(width, height, max_pixels):
+    if max_pixels is not None and width * height > max_pixels:
+        raise ImageTooLargeError(f"Image {width}x{height} exceeds {max_pixels} pixels")
+
+
+def decode_bounded(image_data, max_pixels=None, target_size=None):
+    """
+    Байты -> (массив RGB (H, W, 3) uint8, (масштаб по x, масштаб по y)).
+
+    С target_size изображение декодируется уменьшенным так, что длинная
+    сторона не меньше target_size; масштаб переводит координаты в массиве
+    в координаты исходного изображения.
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+            check_pixels(width, height, max_pixels)
+            if target_size and max(width, height) > target_size:
+                ratio = target_size / max(width, height)
+                # JPEG: декодер сам уменьшает в 2/4/8 раз, не ниже запрошенного размера
+                image.draft("RGB", (max(1, int(width * ratio)), max(1, int(height * ratio))))
+            rgb = image.convert("RGB")
+            # Остальные форматы (и остаток после draft) - целочисленное уменьшение
+            factor = int(max(rgb.size) / target_size) if target_size else 1
+            if factor >= 2:
+                rgb = rgb.reduce(factor)
+            array = np.asarray(rgb)
+    except ImageDecodeError:
+        raise
+    except Image.DecompressionBombError as e:
+        # Встроенная защита Pillow срабатывает ещё в Image.open
+        raise ImageTooLargeError(str(e)) from None
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ImageDecodeError(f"Cannot decode image: {e}") from e
+    return array, (width / array.shape[1], height / array.shape[0])
+
+
+def decode_image(image_data, max_pixels=None):
+    """Байты изображения -> массив RGB формы (H, W, 3), uint8, в исходном размере"""
+    return decode_bounded(image_data, max_pixels)[0]
+
+
+def scale_boxes(boxes, scale):
+    """Рамки [x, y, w, h] из координат уменьшенного изображения в исходные"""
+    if scale == (1.0, 1.0) or not len(boxes):
+        return boxes
+    return (np.asarray(boxes, dtype=np.float64) * [scale[0], scale[1], scale[0], scale[1]]).round(1)
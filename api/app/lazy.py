@@ -0,0 +1,48 @@
+"""
+Отложенный импорт тяжёлых зависимостей (numpy, Pillow, torch, OpenCV)
+
+    np = lazy_import("numpy")
+
+Модуль импортируется при первом обращении к атрибуту, поэтому лёгкие
+эндпоинты (/, /health), тесты и CLI не платят за загрузку ML-библиотек.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Заместитель модуля, импортирующий настоящий модуль по требованию"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        # Кэшируем атрибут: следующие обращения идут мимо __getattr__
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """Возвращает модуль, если он уже загружен, иначе ленивый заместитель"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def is_loaded(name):
+    """Загружен ли модуль в процесс на самом деле"""
+    return name in sys.modules
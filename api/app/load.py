@@ -0,0 +1,131 @@
+"""
+Нагрузка на процесс API для проб готовности и автоскейлера
+
+LoadMonitor - ASGI middleware на путях детекции: считает запросы в работе,
+запросы, ждущие свободного слота (при max_concurrency > 0), и время ответа
+с учётом ожидания. При переполненной очереди (max_queue) запрос сразу
+получает 503 с Retry-After, а не ждёт до таймаута клиента.
+
+LoadStats.snapshot() не трогает модель и брокер: несколько счётчиков и
+сортировка окна последних задержек - её можно опрашивать часто.
+Метрики - на процесс: при нескольких воркерах uvicorn/gunicorn каждый
+отвечает за себя.
+"""
+import asyncio
+import collections
+import contextlib
+import time
+
+from fastapi.responses import ORJSONResponse
+
+
+def percentile(values, percent):
+    """Перцентиль по отсортированному списку (None для пустого)"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class LoadStats:
+    """Счётчики запросов в работе и окно последних задержек"""
+
+    def __init__(self, max_concurrency=0, max_queue=0, window=60.0, max_samples=2048):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.window = window
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._samples = collections.deque(maxlen=max_samples)  # (время окончания, длительность)
+        self._semaphore = None
+        self._loop = None
+
+    def _slot_semaphore(self):
+        # Семафор привязан к циклу событий; новый цикл (например, в тестах) - новый семафор
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def overloaded(self):
+        """Очередь ожидания заполнена: новые запросы будут отклоняться"""
+        return bool(self.max_queue) and self.queued >= self.max_queue
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Слот обработки запроса; без max_concurrency - сразу"""
+        if self.max_concurrency <= 0:
+            yield
+            return
+        semaphore = self._slot_semaphore()
+        self.queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def record(self, duration, now=None):
+        self.completed += 1
+        self._samples.append((time.monotonic() if now is None else now, duration))
+
+    def latency(self, now=None):
+        """(p50, p95, число ответов) за последние window секунд"""
+        cutoff = (time.monotonic() if now is None else now) - self.window
+        samples = self._samples
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        durations = sorted(duration for _, duration in samples)
+        return percentile(durations, 50), percentile(durations, 95), len(durations)
+
+    def snapshot(self, now=None):
+        p50, p95, count = self.latency(now)
+        capacity = self.max_concurrency or None
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": capacity,
+            "max_queue": self.max_queue or None,
+            # Доля занятых слотов с учётом очереди; > 1 - запросы ждут
+            "saturation": round((self.in_flight + self.queued) / capacity, 3) if capacity else None,
+            "latency_p50": round(p50, 6) if p50 is not None else None,
+            "latency_p95": round(p95, 6) if p95 is not None else None,
+            "requests_per_second": round(count / self.window, 3),
+            "window": self.window,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class LoadMonitor:
+    """ASGI middleware: учёт нагрузки и ограничение конкурентности для путей prefixes"""
+
+    def __init__(self, app, stats, prefixes=("/detection/",)):
+        self.app = app
+        self.stats = stats
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        stats = self.stats
+        if stats.overloaded():
+            stats.rejected += 1
+            response = ORJSONResponse({"success": False, "error": "Server is overloaded, retry later"},
+                                      status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        async with stats.slot():
+            stats.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                stats.in_flight -= 1
+                stats.record(time.perf_counter() - start)
@@ -1,21 +1,65 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Optional
-import base64
-import random
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Literal, Optional
+import asyncio
+import os
 import time
+import zlib
+
+from .cascade import Cascade
+from .catalog import TRAFFIC_SIGNS, SIGN_NAMES
+from .decoding import (
+    ImageDecodeError, ImageTooLargeError, check_pixels, decode_base64, decode_bounded, decode_image,
+    scale_boxes, sniff_size,
+)
+from .load import LoadMonitor, LoadStats
+from .registry import DemoClassifier, ModelRegistry
+from .responses import columnar_payload, detections_to_rows
+from .shadow import ShadowMirror
+from .tiling import detect_tiled
+from .tracking import StreamStore, Tracker
+
+# Когда загружать модель и тяжёлые зависимости:
+#   lazy    - в фоне после старта воркера или при первом запросе детекции
+#   startup - в startup-хуке каждого воркера (по умолчанию)
+#   preload - при импорте модуля, до fork (gunicorn --preload): воркеры
+#             получают уже загруженную модель через copy-on-write
+MODEL_LOAD = os.environ.get("MODEL_LOAD", "startup")
+
+@asynccontextmanager
+async def lifespan(app):
+    if MODEL_LOAD == "startup":
+        preload_model()
+    elif MODEL_LOAD == "lazy":
+        # Старт не ждёт модель: она грузится в фоне (или первым запросом),
+        # /ready отвечает 503, пока загрузка не закончится
+        registry.start_loading()
+    yield
 
 # Создаем FastAPI приложение
 app = FastAPI(
     title="Traffic Sign Detection API",
     description="API для распознавания дорожных знаков",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Модели данных (что принимаем и что возвращаем)
 class DetectionRequest(BaseModel):
     image_base64: str  # Изображение в формате base64
     user_id: Optional[int] = None  # ID пользователя (если есть)
+    # Тайловый режим для изображений высокого разрешения (см. tiling.py)
+    tiled: bool = False
+    tile_size: Optional[int] = Field(None, ge=64, le=4096)  # По умолчанию - вход модели
+    tile_overlap: float = Field(0.2, ge=0, lt=0.9)          # Доля перекрытия тайлов
+    tile_batch_size: int = Field(8, ge=1, le=64)            # Тайлов за один проход модели
+    # Каскад: неуверенные детекции перепроверяет тяжёлый классификатор (см. cascade.py)
+    cascade: bool = False
+    cascade_thresholds: Optional[Dict[int, float]] = None   # Порог эскалации по id знака
 
 class DetectionResult(BaseModel):
     sign_id: int          # ID знака
@@ -24,19 +68,277 @@ class DetectionResult(BaseModel):
     bounding_box: List[float]  # Координаты [x, y, ширина, высота]
 
 class DetectionResponse(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
     success: bool                     # Успешно ли распознавание
     results: List[DetectionResult]    # Список найденных знаков
     processing_time: float            # Время обработки в секундах
     error: Optional[str] = None       # Сообщение об ошибке (если есть)
+    model_version: Optional[str] = None  # Версия модели, выдавшей результат
+    tiles: Optional[int] = None       # Число тайлов (в тайловом режиме)
+    escalated: Optional[int] = None   # Детекций перепроверено тяжёлым классификатором (каскад)
+
+class BatchDetectionRequest(BaseModel):
+    images_base64: List[str]          # Изображения в формате base64
+    user_id: Optional[int] = None
+    format: Literal["rows", "columnar"] = "columnar"  # Формат ответа
+    cascade: bool = False
+    cascade_thresholds: Optional[Dict[int, float]] = None
+
+class StreamFrameRequest(BaseModel):
+    image_base64: str                 # Очередной кадр потока
+    stream_id: str = Field(min_length=1, max_length=128)  # ID потока (камеры) в рамках пользователя
+    user_id: Optional[int] = None
+    end: bool = False                 # Последний кадр: завершить все треки потока
+
+# Кадров в одном запросе /detection/track: всё тело запроса держится в памяти,
+# длинные видео отправляются покадрово через /detection/stream
+MAX_TRACK_FRAMES = int(os.environ.get("MAX_TRACK_FRAMES", "300"))
+
+class TrackRequest(BaseModel):
+    frames_base64: List[str] = Field(min_length=1, max_length=MAX_TRACK_FRAMES)  # Кадры видео по порядку
+    user_id: Optional[int] = None
+
+class ModelActivationRequest(BaseModel):
+    version: str                      # Версия модели из реестра
+
+# Реестр версий модели (веса + манифест), см. registry.py
+registry = ModelRegistry(
+    os.environ.get("MODEL_REGISTRY_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")),
+    poll_interval=float(os.environ.get("MODEL_REGISTRY_POLL", "5")),
+)
+
+# Каскад: тяжёлый классификатор загружается при первой эскалации
+cascade = Cascade(
+    lambda: DemoClassifier("heavy-builtin"),
+    default_threshold=float(os.environ.get("CASCADE_THRESHOLD", "0.7")),
+    batch_size=int(os.environ.get("CASCADE_BATCH_SIZE", "32")),
+)
+
+# Трекеры потоков кадров (в памяти процесса): кадры одного потока
+# должны приходить в один и тот же воркер API
+streams = StreamStore(
+    max_streams=int(os.environ.get("MAX_STREAMS", "1000")),
+    idle_timeout=float(os.environ.get("STREAM_IDLE_TIMEOUT", "300")),
+)
+
+# Теневая модель: выборка запросов /detection/detect асинхронно
+# прогоняется через версию SHADOW_MODEL_VERSION (см. shadow.py)
+SHADOW_MODEL_VERSION = os.environ.get("SHADOW_MODEL_VERSION", "")
+shadow = ShadowMirror(
+    lambda: registry.load(SHADOW_MODEL_VERSION),
+    store_path=os.environ.get(
+        "SHADOW_STORE", os.path.join(os.path.dirname(os.path.dirname(__file__)), "shadow.sqlite3"),
+    ),
+    sample_rate=float(os.environ.get("SHADOW_SAMPLE_RATE", "0.05")),
+    max_queue=int(os.environ.get("SHADOW_QUEUE_SIZE", "100")),
+) if SHADOW_MODEL_VERSION else None
+
+# Бюджеты декодирования (см. decoding.py): запросы сверх них отклоняются
+# до декодирования base64 и пикселей
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", 40_000_000))
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", 100 * 1024 * 1024))
+
+
+class RequestBodyTooLarge(HTTPException):
+    """Тело запроса при чтении превысило лимит RequestSizeLimit"""
+
+    def __init__(self, max_bytes):
+        super().__init__(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+
+
+class RequestSizeLimit:
+    """
+    ASGI middleware: тело больше max_bytes отклоняется с 413.
+
+    Тело с Content-Length сверх лимита отклоняется, не читаясь; у тела без
+    него (chunked) или с заниженным Content-Length байты считаются по мере
+    чтения из receive(), и чтение прерывается на первом сообщении сверх
+    лимита - как у RequestDecompression для распакованного тела.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestBodyTooLarge(self.max_bytes)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestBodyTooLarge:
+            # Тело читал middleware вне обработчиков FastAPI (RequestDecompression)
+            if response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        response = ORJSONResponse(
+            {"success": False, "error": f"Request body exceeds {self.max_bytes} bytes"}, status_code=413,
+        )
+        await response(scope, receive, send)
+
+
+class RequestDecompression:
+    """
+    ASGI middleware: тело с Content-Encoding gzip/deflate распаковывается
+    потоково и не больше чем до max_bytes (защита от zip-бомб)
+    """
+
+    ENCODINGS = (b"gzip", b"deflate")
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        encoding = dict(scope.get("headers", [])).get(b"content-encoding", b"").strip().lower()
+        if scope["type"] != "http" or encoding not in self.ENCODINGS:
+            await self.app(scope, receive, send)
+            return
+
+        # wbits=47: заголовок gzip или zlib определяется автоматически
+        decompressor = zlib.decompressobj(wbits=47)
+        chunks, size, more_body = [], 0, True
+        try:
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                more_body = message.get("more_body", False)
+                data = decompressor.decompress(message.get("body", b""), self.max_bytes + 1 - size)
+                size += len(data)
+                if size > self.max_bytes or decompressor.unconsumed_tail:
+                    await self._reject(f"Decompressed request body exceeds {self.max_bytes} bytes", 413,
+                                       scope, receive, send)
+                    return
+                chunks.append(data)
+            if not decompressor.eof:
+                raise zlib.error("truncated stream")
+        except zlib.error as e:
+            await self._reject(f"Invalid {encoding.decode()} request body: {e}", 400, scope, receive, send)
+            return
+
+        body = b"".join(chunks)
+        headers = [(name, value) for name, value in scope["headers"]
+                   if name not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        delivered = False
+
+        async def replay():
+            nonlocal delivered
+            if delivered:
+                return await receive()
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(dict(scope, headers=headers), replay, send)
+
+    @staticmethod
+    async def _reject(error, status_code, scope, receive, send):
+        await ORJSONResponse({"success": False, "error": error}, status_code=status_code)(scope, receive, send)
+
+
+# Нагрузка процесса (см. load.py): запросы в работе, очередь, задержка для
+# /ready и /load; MAX_CONCURRENT_REQUESTS > 0 ограничивает конкурентность
+# детекции, а при MAX_QUEUED_REQUESTS ждущих запрос сразу получает 503
+load = LoadStats(
+    max_concurrency=int(os.environ.get("MAX_CONCURRENT_REQUESTS", "0")),
+    max_queue=int(os.environ.get("MAX_QUEUED_REQUESTS", "0")),
+    window=float(os.environ.get("LOAD_WINDOW", "60")),
+)
+
+@app.exception_handler(RequestBodyTooLarge)
+async def request_body_too_large(request, exc):
+    # Тело читал FastAPI при разборе параметров endpoint
+    return ORJSONResponse({"success": False, "error": exc.detail}, status_code=413)
+
+
+# Порядок вызова: RequestSizeLimit (сжатое тело) -> LoadMonitor -> RequestDecompression
+app.add_middleware(RequestDecompression, max_bytes=MAX_REQUEST_BYTES)
+app.add_middleware(LoadMonitor, stats=load, prefixes=("/detection/", "/async/detect"))
+app.add_middleware(RequestSizeLimit, max_bytes=MAX_REQUEST_BYTES)
+
+
+def preload_model():
+    """Загружает модель (и её зависимости) заранее и прогревает её"""
+    model = registry.current
+    model.predict_batch([b""])
+    return model
+
+if MODEL_LOAD == "preload":
+    preload_model()
+
+
+def _image_bytes(image_base64):
+    """
+    base64 -> байты изображения в пределах MAX_IMAGE_BYTES и MAX_IMAGE_PIXELS.
+
+    Размеры проверяются по заголовку, пиксели не декодируются. Бросает
+    ImageDecodeError (ImageTooLargeError при превышении бюджета).
+    """
+    image_data = decode_base64(image_base64, MAX_IMAGE_BYTES)
+    header = sniff_size(image_data)
+    if header is not None:
+        check_pixels(header[1], header[2], MAX_IMAGE_PIXELS)
+    return image_data
+
+
+def _detection_response(results, processing_time, model_version, **extra):
+    return ORJSONResponse({
+        "success": True,
+        "results": results,
+        "processing_time": round(processing_time, 6),
+        "error": None,
+        "model_version": model_version,
+        **extra,
+    })
+
+
+def _error_response(error, status_code=200):
+    return ORJSONResponse({"success": False, "results": [], "processing_time": 0, "error": error},
+                          status_code=status_code)
 
-# Список дорожных знаков для демонстрации
-TRAFFIC_SIGNS = [
-    {"id": 1, "name": "Стоп", "confidence": 0.95},
-    {"id": 2, "name": "Ограничение скорости 60", "confidence": 0.87},
-    {"id": 3, "name": "Поворот направо", "confidence": 0.78},
-    {"id": 4, "name": "Пешеходный переход", "confidence": 0.92},
-    {"id": 5, "name": "Главная дорога", "confidence": 0.85},
-]
+
+def _decode_error_response(error, prefix=""):
+    """Ошибка декодирования; превышение бюджета - 413"""
+    return _error_response(prefix + str(error), status_code=413 if isinstance(error, ImageTooLargeError) else 200)
+
+
+def _track_row(track):
+    """Трек -> словарь для ответа (с названием знака)"""
+    row = track.summary()
+    row["sign_name"] = SIGN_NAMES.get(row["sign_id"], f"Sign #{row['sign_id']}")
+    return row
+
+
+def _decode_frame(image_base64):
+    """base64 кадра -> RGB массив; при ошибке бросает ImageDecodeError"""
+    return decode_image(_image_bytes(image_base64), MAX_IMAGE_PIXELS)
 
 @app.get("/")
 async def root():
@@ -44,10 +346,17 @@ async def root():
     return {
         "message": "Traffic Sign Detection API",
         "version": "1.0.0",
+        "model_version": registry.status()["active"],
         "endpoints": {
             "detect": "/detection/detect (POST)",
+            "stream": "/detection/stream (POST)",
+            "models": "/models",
+            "cascade_metrics": "/cascade/metrics",
+            "shadow_metrics": "/shadow/metrics",
             "docs": "/docs",
-            "health": "/health"
+            "health": "/health",
+            "ready": "/ready",
+            "load": "/load"
         }
     }
 
@@ -56,14 +365,45 @@ async def health_check():
     """Проверка здоровья сервиса"""
     return {"status": "healthy", "service": "traffic_sign_detection"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Готовность принимать трафик: модель загружена и очередь не переполнена.
+
+    Неготовый процесс отвечает 503. Проба только сообщает состояние:
+    загрузку модели запускает старт воркера (MODEL_LOAD), а не /ready.
+    """
+    loaded = registry.loaded
+    overloaded = load.overloaded()
+    ready = loaded and not overloaded
+    return ORJSONResponse(
+        {"ready": ready, "model_loaded": loaded, "overloaded": overloaded, "model_error": registry.last_error},
+        status_code=200 if ready else 503,
+    )
+
+@app.get("/load")
+async def load_metrics():
+    """Нагрузка этого процесса для автоскейлера: запросы в работе, очередь, p95 задержки"""
+    return {
+        "pid": os.getpid(),
+        "model_loaded": registry.loaded,
+        "model_version": registry.current.version if registry.loaded else None,
+        **load.snapshot(),
+    }
+
+# Обработчики детекции - обычные def: FastAPI выполняет их в threadpool, так что
+# декодирование и модель не блокируют event loop, /ready и /load отвечают сразу,
+# а LoadMonitor видит реальное число одновременных запросов
 @app.post("/detection/detect", response_model=DetectionResponse)
-async def detect_signs(request: DetectionRequest):
+def detect_signs(request: DetectionRequest):
     """
     Основной endpoint для распознавания дорожных знаков
     
     Принимает:
     - image_base64: изображение в формате base64
     - user_id: ID пользователя (опционально)
+    - tiled: тайловая детекция для больших изображений (опционально)
+    - cascade, cascade_thresholds: каскад с тяжёлым классификатором (опционально)
     
     Возвращает:
     - success: True/False
@@ -74,61 +414,213 @@ async def detect_signs(request: DetectionRequest):
     start_time = time.time()
     
     try:
-        # Декодируем изображение (в реальном проекте здесь была бы нейросеть)
-        # Для демонстрации просто проверяем, что это валидный base64
+        # Декодируем base64 в пределах бюджетов; размеры изображения
+        # проверяются по заголовку до декодирования пикселей
         try:
-            image_data = base64.b64decode(request.image_base64)
-        except:
-            return DetectionResponse(
-                success=False,
-                results=[],
-                processing_time=0,
-                error="Invalid base64 image data"
-            )
+            image_data = _image_bytes(request.image_base64)
+        except ImageDecodeError as e:
+            return _decode_error_response(e)
         
         # Имитируем обработку (в реальном проекте здесь вызывается ML модель)
         time.sleep(0.1)  # Задержка для имитации обработки
         
-        # Генерируем случайные результаты для демонстрации
-        results = []
-        num_signs = random.randint(1, 3)  # От 1 до 3 знаков
-        
-        for i in range(num_signs):
-            sign = random.choice(TRAFFIC_SIGNS)
-            confidence = sign["confidence"] + random.uniform(-0.1, 0.05)
-            confidence = max(0.1, min(0.99, confidence))  # Ограничиваем от 0.1 до 0.99
-            
-            # Генерируем случайные координаты bounding box
-            bbox = [
-                random.uniform(100, 300),  # x
-                random.uniform(100, 300),  # y
-                random.uniform(50, 100),   # ширина
-                random.uniform(50, 100)    # высота
-            ]
-            
-            results.append(DetectionResult(
-                sign_id=sign["id"],
-                sign_name=sign["name"],
-                confidence=round(confidence, 2),
-                bounding_box=[round(x, 1) for x in bbox]
-            ))
-        
-        processing_time = time.time() - start_time
-        
-        return DetectionResponse(
-            success=True,
-            results=results,
-            processing_time=round(processing_time, 6),
-            error=None
-        )
+        model = registry.get()
+        extra = {}
+        scale = (1.0, 1.0)
+        if request.tiled or request.cascade:
+            try:
+                # Тайлам нужно полное разрешение, остальным - размер входа модели
+                image, scale = decode_bounded(image_data, MAX_IMAGE_PIXELS,
+                                              target_size=None if request.tiled else model.input_size)
+            except ImageDecodeError as e:
+                return _decode_error_response(e)
+
+        fast_start = time.perf_counter()
+        if request.tiled:
+            ids, scores, boxes, extra["tiles"] = detect_tiled(
+                model, image,
+                tile_size=request.tile_size or model.input_size,
+                overlap=request.tile_overlap,
+                batch_size=request.tile_batch_size,
+            )
+        else:
+            model_input = image if request.cascade else image_data
+            cpu_start = time.thread_time()
+            ids, scores, boxes = model.predict(model_input)
+            if shadow is not None:
+                # Сравнивается выход самих моделей, до каскада
+                shadow.offer(model_input, (ids, scores, boxes), model.version,
+                             time.perf_counter() - fast_start, time.thread_time() - cpu_start)
+
+        if request.cascade:
+            [(ids, scores, boxes)], extra["escalated"] = cascade.refine(
+                [image], [(ids, scores, boxes)],
+                fast_time=time.perf_counter() - fast_start,
+                thresholds=request.cascade_thresholds,
+            )
+
+        results = detections_to_rows(ids, scores, scale_boxes(boxes, scale), SIGN_NAMES)
+        return _detection_response(results, time.time() - start_time, model.version, **extra)
         
     except Exception as e:
-        return DetectionResponse(
-            success=False,
-            results=[],
-            processing_time=0,
-            error=f"Detection error: {str(e)}"
+        return _error_response(f"Detection error: {str(e)}")
+
+@app.post("/detection/detect/batch")
+def detect_signs_batch(request: BatchDetectionRequest):
+    """
+    Пакетное распознавание нескольких изображений за один запрос
+
+    format="columnar" (по умолчанию) возвращает параллельные массивы
+    ids/scores/boxes и offsets; format="rows" - список ответов как у /detection/detect.
+    """
+    start_time = time.time()
+
+    images = []
+    for position, image_base64 in enumerate(request.images_base64):
+        try:
+            images.append(_image_bytes(image_base64))
+        except ImageDecodeError as e:
+            return _decode_error_response(e, prefix=f"Image {position}: ")
+
+    model = registry.get()
+    scales = None
+    if request.cascade:
+        try:
+            images, scales = zip(*(decode_bounded(image_data, MAX_IMAGE_PIXELS, target_size=model.input_size)
+                                   for image_data in images)) if images else ([], [])
+        except ImageDecodeError as e:
+            return _decode_error_response(e)
+
+    # Весь пакет обрабатывается одной версией модели: подмена происходит между пакетами
+    fast_start = time.perf_counter()
+    batch = model.predict_batch(images)
+    escalated = None
+    if request.cascade:
+        # Неуверенные вырезки всех изображений пакета идут в классификатор общими пакетами
+        batch, escalated = cascade.refine(
+            images, batch, fast_time=time.perf_counter() - fast_start, thresholds=request.cascade_thresholds,
         )
+        batch = [(ids, scores, scale_boxes(boxes, scale)) for (ids, scores, boxes), scale in zip(batch, scales)]
+
+    processing_time = round(time.time() - start_time, 6)
+    if request.format == "columnar":
+        payload = columnar_payload(batch, processing_time)
+    else:
+        payload = {
+            "success": True,
+            "format": "rows",
+            "count": len(batch),
+            "results": [detections_to_rows(ids, scores, boxes, SIGN_NAMES) for ids, scores, boxes in batch],
+            "processing_time": processing_time,
+        }
+    payload["model_version"] = model.version
+    if escalated is not None:
+        payload["escalated"] = escalated
+    return ORJSONResponse(payload)
+
+@app.post("/detection/stream")
+def detect_stream_frame(request: StreamFrameRequest):
+    """
+    Детекция с трекингом для потока кадров одной камеры
+
+    Классификатор запускается только для новых треков и треков с низкой
+    уверенностью. Завершённые треки возвращаются в emitted один раз,
+    с лучшей меткой за всё время жизни трека.
+    """
+    start_time = time.time()
+    try:
+        image = _decode_frame(request.image_base64)
+    except ImageDecodeError as e:
+        return _decode_error_response(e)
+
+    key = (request.user_id, request.stream_id)
+    tracker = streams.get(key)
+    model = registry.get()
+    with tracker.lock:
+        frame = tracker.step(model, image)
+        emitted = frame["emitted"]
+        if request.end:
+            emitted = emitted + tracker.flush()
+            streams.pop(key)
+        frame_number, stats = tracker.frame, tracker.summary()
+
+    return ORJSONResponse({
+        "success": True,
+        "stream_id": request.stream_id,
+        "frame": frame_number,
+        "tracks": [_track_row(track) for track in frame["tracks"]],
+        "emitted": [_track_row(track) for track in emitted],
+        "detections": frame["detections"],
+        "classifier_calls": frame["classifier_calls"],
+        "classifier_calls_saved": frame["detections"] - frame["classifier_calls"],
+        "stats": stats,
+        "model_version": model.version,
+        "processing_time": round(time.time() - start_time, 6),
+    })
+
+@app.post("/detection/track")
+def track_frames(request: TrackRequest):
+    """
+    Трекинг по всей последовательности кадров за один запрос (видео целиком)
+
+    Возвращает по одной записи на трек и статистику вызовов классификатора.
+    """
+    start_time = time.time()
+    tracker = Tracker()
+    # Вся последовательность обрабатывается одной версией модели
+    model = registry.get()
+    emitted = []
+    for position, image_base64 in enumerate(request.frames_base64):
+        try:
+            image = _decode_frame(image_base64)
+        except ImageDecodeError as e:
+            return _decode_error_response(e, prefix=f"Frame {position}: ")
+        emitted.extend(tracker.step(model, image)["emitted"])
+    emitted.extend(tracker.flush())
+
+    return ORJSONResponse({
+        "success": True,
+        "tracks": [_track_row(track) for track in sorted(emitted, key=lambda track: track.track_id)],
+        "stats": tracker.summary(),
+        "model_version": model.version,
+        "processing_time": round(time.time() - start_time, 6),
+    })
+
+@app.get("/cascade/metrics")
+async def cascade_metrics():
+    """Доля эскалаций на тяжёлый классификатор и сэкономленное время (с запуска процесса)"""
+    return cascade.metrics.snapshot()
+
+@app.get("/shadow/metrics")
+def shadow_metrics():
+    """
+    Согласие теневой модели с основной, разница задержки и процессорного времени
+
+    Обычный def: первый вызов один раз читает суммы из SQLite, и это
+    происходит в threadpool, а не в event loop.
+    """
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, "shadow_version": SHADOW_MODEL_VERSION, **shadow.summary()}
+
+@app.get("/models")
+async def list_models():
+    """Версии модели в реестре и активная версия этого процесса"""
+    return registry.status()
+
+@app.post("/models/activate")
+async def activate_model(request: ModelActivationRequest):
+    """
+    Публикует версию модели как активную.
+
+    Загрузка идёт в фоне, текущие запросы дорабатывают на старой версии;
+    остальные процессы подхватывают изменение манифеста сами.
+    """
+    try:
+        registry.publish(request.version)
+    except KeyError as e:
+        return ORJSONResponse({"success": False, "error": str(e)}, status_code=404)
+    return {"success": True, **registry.status()}
 
 @app.get("/signs/list")
 async def list_available_signs():
@@ -156,51 +648,15 @@ async def async_detect_signs(request: DetectionRequest):
         
         # Декодируем изображение
         try:
-            image_data = base64.b64decode(request.image_base64)
-        except:
-            return DetectionResponse(
-                success=False,
-                results=[],
-                processing_time=0,
-                error="Invalid base64 image data"
-            )
+            image_data = _image_bytes(request.image_base64)
+        except ImageDecodeError as e:
+            return _decode_error_response(e)
         
         # Генерируем результаты (в реальном проекте здесь асинхронный ML)
-        results = []
-        num_signs = random.randint(1, 3)
-        
-        for i in range(num_signs):
-            sign = random.choice(TRAFFIC_SIGNS)
-            confidence = sign["confidence"] + random.uniform(-0.1, 0.05)
-            confidence = max(0.1, min(0.99, confidence))
-            
-            bbox = [
-                random.uniform(100, 300),
-                random.uniform(100, 300),
-                random.uniform(50, 100),
-                random.uniform(50, 100)
-            ]
-            
-            results.append(DetectionResult(
-                sign_id=sign["id"],
-                sign_name=sign["name"],
-                confidence=round(confidence, 2),
-                bounding_box=[round(x, 1) for x in bbox]
-            ))
-        
-        processing_time = time.time() - start_time
-        
-        return DetectionResponse(
-            success=True,
-            results=results,
-            processing_time=round(processing_time, 6),
-            error=None
-        )
+        model = registry.get()
+        ids, scores, boxes = await run_in_threadpool(model.predict, image_data)
+        results = detections_to_rows(ids, scores, boxes, SIGN_NAMES)
+        return _detection_response(results, time.time() - start_time, model.version)
         
     except Exception as e:
-        return DetectionResponse(
-            success=False,
-            results=[],
-            processing_time=0,
-            error=f"Async detection error: {str(e)}"
-        )
+        return _error_response(f"Async detection error: {str(e)}")
@@ -0,0 +1,273 @@
+"""
+Реестр версий модели с горячей заменой без перезапуска
+
+Структура каталога реестра (MODEL_REGISTRY_DIR):
+
+    models/
+        manifest.json          {"active": "1.1.0",
+                                "versions": {"1.0.0": {"path": "1.0.0",
+                                                       "architecture": "demo",
+                                                       "weights": {"sign_confidence": "sign_confidence.npy"}}}}
+        1.0.0/sign_confidence.npy
+        1.1.0/...
+
+Новая версия загружается в фоновом потоке (веса отображаются в память через
+np.load(mmap_mode="r")), прогревается и только потом атомарно подменяет
+текущую. Запрос берёт ссылку на модель один раз в начале обработки, поэтому
+запросы «в полёте» дорабатывают на старой версии.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .catalog import TRAFFIC_SIGNS
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_VERSION = "builtin"
+MANIFEST_NAME = "manifest.json"
+
+
+class DemoModel:
+    """
+    Демонстрационная модель: вместо нейросети генерирует случайные детекции.
+
+    Веса версии (если есть) задают базовую уверенность по каждому знаку.
+    """
+
+    input_size = 640  # Сторона квадратного входа модели, пикселей
+
+    def __init__(self, version, weights=None):
+        self.version = version
+        self.weights = weights or {}
+        self.sign_ids = np.array([sign["id"] for sign in TRAFFIC_SIGNS])
+        self.sign_confidence = np.asarray(
+            self.weights.get("sign_confidence", [sign["confidence"] for sign in TRAFFIC_SIGNS]),
+            dtype=np.float64,
+        )
+        self._rng = np.random.default_rng()
+
+    def detect(self, image):
+        """Этап детекции: рамки знаков без классификации -> boxes[N, 4]"""
+        rng = self._rng
+        num_signs = int(rng.integers(1, 4))  # От 1 до 3 знаков
+        if getattr(image, "ndim", 0) >= 2:
+            # Декодированное изображение: рамки внутри его границ
+            height, width = image.shape[:2]
+            sizes = rng.uniform(0.25, 0.5, (num_signs, 2)) * np.minimum([width, height], 200)
+            origins = rng.uniform(0, 1, (num_signs, 2)) * ([width, height] - sizes)
+            return np.hstack([origins, sizes]).round(1)
+        # Координаты bounding box: x, y в [100, 300], ширина и высота в [50, 100]
+        return np.hstack([
+            rng.uniform(100, 300, (num_signs, 2)),
+            rng.uniform(50, 100, (num_signs, 2)),
+        ]).round(1)
+
+    def classify(self, image, boxes):
+        """Этап классификации знаков в рамках boxes -> массивы (ids, scores)"""
+        rng = self._rng
+        index = rng.integers(len(self.sign_ids), size=len(boxes))
+        scores = self.sign_confidence[index] + rng.uniform(-0.1, 0.05, len(boxes))
+        scores = np.clip(scores, 0.1, 0.99).round(2)  # Ограничиваем от 0.1 до 0.99
+        return self.sign_ids[index], scores
+
+    def predict(self, image):
+        """Одно изображение -> массивы (ids, scores, boxes[N, 4])"""
+        boxes = self.detect(image)
+        ids, scores = self.classify(image, boxes)
+        return ids, scores, boxes
+
+    def predict_batch(self, images):
+        return [self.predict(image) for image in images]
+
+
+class DemoClassifier:
+    """
+    Демонстрационный «тяжёлый» классификатор вырезанных знаков для каскада.
+
+    Медленнее DemoModel (crop_cost секунд на вырезку), но увереннее.
+    """
+
+    def __init__(self, version, crop_cost=0.002):
+        self.version = version
+        self.crop_cost = crop_cost
+        self.sign_ids = np.array([sign["id"] for sign in TRAFFIC_SIGNS])
+        self._rng = np.random.default_rng()
+
+    def classify_crops(self, crops):
+        """Пакет вырезок -> массивы (ids, scores)"""
+        time.sleep(self.crop_cost * len(crops))  # Имитация тяжёлой модели
+        index = self._rng.integers(len(self.sign_ids), size=len(crops))
+        scores = self._rng.uniform(0.85, 0.99, len(crops)).round(2)
+        return self.sign_ids[index], scores
+
+
+ARCHITECTURES = {
+    "demo": DemoModel,
+}
+
+
+class ModelRegistry:
+    """Хранит активную модель и подгружает новые версии в фоне"""
+
+    def __init__(self, root, poll_interval=5.0):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._model = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._last_error = None
+        self._manifest_mtime = None
+        self._next_poll = 0.0
+
+    # --- манифест ---
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _manifest_mtime_now(self):
+        try:
+            return os.stat(self._manifest_path()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def read_manifest(self):
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": BUILTIN_VERSION, "versions": {}}
+
+    def write_manifest(self, manifest):
+        """Атомарная запись манифеста (через временный файл и rename)"""
+        os.makedirs(self.root, exist_ok=True)
+        # У каждого писателя свой временный файл: одновременные публикации
+        # не пишут в один файл, и rename не выложит смешанный манифест
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.root, prefix=MANIFEST_NAME + ".",
+                                         suffix=".tmp", delete=False) as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        try:
+            os.replace(f.name, self._manifest_path())
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    # --- загрузка ---
+
+    def load(self, version):
+        """Синхронно загружает версию модели и прогревает её"""
+        if version == BUILTIN_VERSION:
+            return DemoModel(BUILTIN_VERSION)
+
+        entry = self.read_manifest()["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Model version {version!r} is not in the registry")
+
+        version_dir = os.path.join(self.root, entry.get("path", version))
+        weights = {
+            name: np.load(os.path.join(version_dir, file_name), mmap_mode="r")
+            for name, file_name in entry.get("weights", {}).items()
+        }
+        model = ARCHITECTURES[entry.get("architecture", "demo")](version, weights)
+        model.predict_batch([b""])  # прогрев до подмены
+        return model
+
+    def _load_and_swap(self, version):
+        try:
+            model = self.load(version)
+        except Exception as e:
+            logger.exception("Failed to load model version %s", version)
+            with self._lock:
+                self._last_error = f"{version}: {e}"
+                self._loading = None
+            return
+        with self._lock:
+            self._model = model
+            self._loading = None
+            self._last_error = None
+        logger.info("Model version %s is now active", version)
+
+    def activate(self, version, background=True):
+        """Загружает версию (по умолчанию в фоне) и подменяет текущую модель"""
+        with self._lock:
+            if self._loading == version or (self._model is not None and self._model.version == version):
+                return
+            self._loading = version
+        if background:
+            threading.Thread(target=self._load_and_swap, args=(version,), daemon=True).start()
+        else:
+            self._load_and_swap(version)
+
+    def publish(self, version):
+        """Делает версию активной в манифесте: её подхватят все процессы"""
+        manifest = self.read_manifest()
+        if version != BUILTIN_VERSION and version not in manifest["versions"]:
+            raise KeyError(f"Model version {version!r} is not in the registry")
+        manifest["active"] = version
+        self.write_manifest(manifest)
+        self.activate(version)
+
+    # --- доступ к модели ---
+
+    def refresh(self):
+        """Не чаще poll_interval проверяет манифест и запускает загрузку новой активной версии"""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_interval
+        mtime = self._manifest_mtime_now()
+        if mtime != self._manifest_mtime:
+            self._manifest_mtime = mtime
+            self.activate(self.read_manifest().get("active", BUILTIN_VERSION))
+
+    @property
+    def current(self):
+        """Текущая модель; при первом обращении загружается синхронно"""
+        model = self._model
+        if model is None:
+            self._manifest_mtime = self._manifest_mtime_now()
+            self._next_poll = time.monotonic() + self.poll_interval
+            self._load_and_swap(self.read_manifest().get("active", BUILTIN_VERSION))
+            model = self._model
+            if model is None:
+                # Активная версия не загрузилась - работаем на встроенной
+                model = self._model = DemoModel(BUILTIN_VERSION)
+        return model
+
+    def start_loading(self):
+        """Запускает фоновую загрузку опубликованной версии, не дожидаясь первого запроса"""
+        self._manifest_mtime = self._manifest_mtime_now()
+        self._next_poll = time.monotonic() + self.poll_interval
+        self.activate(self.read_manifest().get("active", BUILTIN_VERSION))
+
+    @property
+    def last_error(self):
+        """Ошибка последней неудачной загрузки (None после успешной)"""
+        return self._last_error
+
+    @property
+    def loaded(self):
+        """Модель уже в памяти: запрос не будет ждать её загрузки"""
+        return self._model is not None
+
+    def get(self):
+        """Модель для обработки запроса или пакета; заодно проверяет манифест"""
+        model = self.current
+        self.refresh()
+        return model
+
+    def status(self):
+        manifest = self.read_manifest()
+        return {
+            "active": self._model.version if self._model is not None else None,
+            "published": manifest.get("active", BUILTIN_VERSION),
+            "loading": self._loading,
+            "last_error": self._last_error,
+            "versions": sorted(manifest["versions"]),
+        }
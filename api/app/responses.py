@@ -0,0 +1,55 @@
+"""
+Быстрая сериализация ответов детекции
+
+Результаты детекции хранятся как numpy-массивы (ids, scores, boxes) и
+отдаются через ORJSONResponse: orjson сериализует массивы напрямую, без
+промежуточных pydantic-моделей и поэлементного round().
+"""
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+def detections_to_rows(ids, scores, boxes, sign_names):
+    """Массивы детекций -> список словарей в формате DetectionResult"""
+    return [
+        {
+            "sign_id": sign_id,
+            "sign_name": sign_names.get(sign_id, f"Sign #{sign_id}"),
+            "confidence": score,
+            "bounding_box": box,
+        }
+        for sign_id, score, box in zip(ids.tolist(), scores.tolist(), boxes.tolist())
+    ]
+
+
+def columnar_payload(batch, processing_time):
+    """
+    Колоночный формат для пакетных результатов.
+
+    Детекции всех изображений лежат в параллельных массивах ids/scores/boxes;
+    детекции изображения i занимают срез offsets[i]:offsets[i + 1].
+    """
+    counts = [len(ids) for ids, _, _ in batch]
+    offsets = np.zeros(len(batch) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    if batch:
+        ids = np.concatenate([ids for ids, _, _ in batch])
+        scores = np.concatenate([scores for _, scores, _ in batch])
+        boxes = np.concatenate([boxes for _, _, boxes in batch]).reshape(-1, 4)
+    else:
+        ids = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0, dtype=np.float64)
+        boxes = np.zeros((0, 4), dtype=np.float64)
+
+    return {
+        "success": True,
+        "format": "columnar",
+        "count": len(batch),
+        "offsets": offsets,
+        "ids": np.ascontiguousarray(ids),
+        "scores": np.ascontiguousarray(scores),
+        "boxes": np.ascontiguousarray(boxes),
+        "processing_time": processing_time,
+    }
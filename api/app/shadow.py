@@ -0,0 +1,245 @@
+"""
+Теневая модель: зеркалирование части трафика /detection/detect
+
+Доля sample_rate запросов после ответа основной модели кладётся в
+ограниченную очередь (без ожидания: при заполненной очереди запрос просто
+не зеркалируется и учитывается как dropped). Фоновый поток прогоняет те же
+входные данные через теневую модель и пишет в локальную SQLite базу
+согласие с основной моделью, задержку и процессорное время обеих моделей;
+сводка считается по суммам в памяти, без запросов к базе.
+Путь запроса пользователя затрагивает только случайный выбор и put_nowait.
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from .tracking import associate
+
+logger = logging.getLogger(__name__)
+
+# Рамки основной и теневой модели считаются одним знаком при IoU не ниже
+MATCH_IOU = 0.5
+# Сколько результатов копится до commit в SQLite
+COMMIT_EVERY = 50
+# Суммы, из которых считается сводка: число сравнений и суммы столбцов
+TOTALS = ("count", "agreement", "primary_ms", "shadow_ms", "primary_cpu_ms", "shadow_cpu_ms")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_results (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    primary_version TEXT NOT NULL,
+    shadow_version TEXT NOT NULL,
+    primary_count INTEGER NOT NULL,
+    shadow_count INTEGER NOT NULL,
+    matched INTEGER NOT NULL,
+    same_label INTEGER NOT NULL,
+    agreement REAL NOT NULL,
+    primary_ms REAL NOT NULL,
+    shadow_ms REAL NOT NULL,
+    primary_cpu_ms REAL NOT NULL,
+    shadow_cpu_ms REAL NOT NULL
+)
+"""
+
+
+def compare(primary, shadow):
+    """
+    Согласие двух результатов (ids, scores, boxes).
+
+    Рамки сопоставляются жадно по IoU >= MATCH_IOU. agreement - доля
+    совпавших по рамке и метке знаков: 2 * same_label / (N основной + N теневой),
+    1.0 если обе модели ничего не нашли.
+    """
+    primary_ids, _, primary_boxes = primary
+    shadow_ids, _, shadow_boxes = shadow
+    pairs, _ = associate(primary_boxes, shadow_boxes, MATCH_IOU)
+    same_label = sum(1 for i, j in pairs if primary_ids[i] == shadow_ids[j])
+    total = len(primary_ids) + len(shadow_ids)
+    return {
+        "primary_count": len(primary_ids),
+        "shadow_count": len(shadow_ids),
+        "matched": len(pairs),
+        "same_label": same_label,
+        "agreement": 2 * same_label / total if total else 1.0,
+    }
+
+
+class ShadowMirror:
+    """
+    Асинхронный прогон выборки запросов через теневую модель.
+
+    Модель создаётся фабрикой model_factory в фоновом потоке при первом
+    задании, так что включённое зеркалирование не замедляет старт процесса.
+    """
+
+    def __init__(self, model_factory, store_path, sample_rate=0.05, max_queue=100):
+        self.model_factory = model_factory
+        self.store_path = store_path
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._model = None
+        # Ошибка создания теневой модели: после неё зеркалирование остановлено
+        self.failure = None
+        self.counters = {"sampled": 0, "dropped": 0, "completed": 0, "errors": 0}
+        # Суммы по базе сравнений (см. _load_totals), дальше ведутся в памяти
+        self._totals = None
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def offer(self, image, primary, primary_version, primary_time, primary_cpu):
+        """
+        Предлагает запрос для зеркалирования. Не блокирует: возвращает True,
+        если задание поставлено в очередь.
+        """
+        if self.failure is not None or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        self._count("sampled")
+        try:
+            self._queue.put_nowait((image, primary, primary_version, primary_time, primary_cpu))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="shadow-mirror", daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        directory = os.path.dirname(self.store_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.store_path)
+        connection.execute(SCHEMA)
+        return connection
+
+    def _load_totals(self):
+        """
+        Один раз за процесс читает суммы по уже накопленной базе; новые
+        сравнения добавляет _store, так что сводка не сканирует таблицу.
+        Строки других процессов, пишущих в ту же базу, войдут в сводку
+        после перезапуска.
+        """
+        with self._lock:
+            if self._totals is not None:
+                return
+        row = None
+        if os.path.exists(self.store_path):
+            connection = sqlite3.connect(self.store_path)
+            try:
+                row = connection.execute(
+                    "SELECT COUNT(*), TOTAL(agreement), TOTAL(primary_ms), TOTAL(shadow_ms),"
+                    " TOTAL(primary_cpu_ms), TOTAL(shadow_cpu_ms) FROM shadow_results"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                connection.close()
+        with self._lock:
+            if self._totals is None:
+                self._totals = dict(zip(TOTALS, row or (0,) * len(TOTALS)))
+
+    def _run(self):
+        # До первой вставки: иначе строки этого процесса попали бы в суммы дважды
+        self._load_totals()
+        connection = self._connect()
+        pending = 0
+        while True:
+            try:
+                job = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                # Простой: сбрасываем накопленное
+                if pending:
+                    connection.commit()
+                    pending = 0
+                continue
+            try:
+                self._store(connection, *job)
+                pending += 1
+                self._count("completed")
+            except Exception:
+                logger.exception("Shadow model evaluation failed")
+                self._count("errors")
+            try:
+                if pending >= COMMIT_EVERY or self._queue.empty():
+                    connection.commit()
+                    pending = 0
+            finally:
+                # После commit: drain() возвращается, когда строки уже в базе
+                self._queue.task_done()
+
+    def _store(self, connection, image, primary, primary_version, primary_time, primary_cpu):
+        if self._model is None:
+            if self.failure is not None:
+                raise RuntimeError(f"Shadow model is unavailable: {self.failure}")
+            try:
+                self._model = self.model_factory()
+            except Exception as e:
+                # Без модели каждое задание падало бы так же - больше не зеркалируем
+                self.failure = f"{type(e).__name__}: {e}"
+                raise
+        model = self._model
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        shadow = model.predict(image)
+        shadow_time, shadow_cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+
+        row = compare(primary, shadow)
+        connection.execute(
+            "INSERT INTO shadow_results (created_at, primary_version, shadow_version, primary_count,"
+            " shadow_count, matched, same_label, agreement, primary_ms, shadow_ms, primary_cpu_ms,"
+            " shadow_cpu_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), primary_version, model.version, row["primary_count"], row["shadow_count"],
+             row["matched"], row["same_label"], row["agreement"], primary_time * 1000, shadow_time * 1000,
+             primary_cpu * 1000, shadow_cpu * 1000),
+        )
+        with self._lock:
+            totals = self._totals
+            totals["count"] += 1
+            totals["agreement"] += row["agreement"]
+            totals["primary_ms"] += primary_time * 1000
+            totals["shadow_ms"] += shadow_time * 1000
+            totals["primary_cpu_ms"] += primary_cpu * 1000
+            totals["shadow_cpu_ms"] += shadow_cpu * 1000
+
+    def drain(self):
+        """Ждёт обработки всех поставленных заданий (для тестов и остановки)"""
+        self._queue.join()
+
+    def summary(self):
+        """Счётчики процесса и сводка по базе сравнений (из сумм в памяти)"""
+        self._load_totals()
+        with self._lock:
+            summary = {"sample_rate": self.sample_rate, "queued": self._queue.qsize(), **self.counters,
+                       "failure": self.failure}
+            totals = dict(self._totals)
+        count = totals.pop("count")
+        if not count:
+            return {**summary, "compared": 0}
+        mean = {name: total / count for name, total in totals.items()}
+
+        def rounded(value):
+            return round(value, 4)
+
+        return {
+            **summary,
+            "compared": count,
+            "agreement": rounded(mean["agreement"]),
+            "primary_ms": rounded(mean["primary_ms"]),
+            "shadow_ms": rounded(mean["shadow_ms"]),
+            "latency_delta_ms": rounded(mean["shadow_ms"] - mean["primary_ms"]),
+            "cpu_delta_ms": rounded(mean["shadow_cpu_ms"] - mean["primary_cpu_ms"]),
+        }
@@ -0,0 +1,96 @@
+"""
+Тайловая детекция для изображений высокого разрешения
+
+Большое изображение режется на перекрывающиеся тайлы размером со вход
+модели, тайлы прогоняются через модель пакетами по batch_size, рамки
+переводятся в координаты исходного изображения и объединяются NMS по
+всем тайлам. Одновременно в памяти находится не больше batch_size тайлов,
+поэтому размер входного тензора модели не зависит от размера изображения.
+"""
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+def _axis_starts(length, tile, stride):
+    """Начала тайлов вдоль оси; последний тайл прижимается к краю"""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Сетка тайлов (x0, y0, x1, y1), покрывающая изображение.
+
+    overlap - доля перекрытия соседних тайлов (0 <= overlap < 1).
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in _axis_starts(height, tile_size, stride)
+        for x0 in _axis_starts(width, tile_size, stride)
+    ]
+
+
+def box_iou(box, boxes):
+    """IoU одной рамки [x, y, w, h] с массивом рамок [N, 4]"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[0] + box[2], boxes[:, 0] + boxes[:, 2])
+    y2 = np.minimum(box[1] + box[3], boxes[:, 1] + boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = box[2] * box[3] + boxes[:, 2] * boxes[:, 3] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def nms(ids, scores, boxes, iou_threshold=0.5):
+    """NMS с учётом класса: индексы оставшихся детекций по убыванию уверенности"""
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    suppressed = np.zeros(len(scores), dtype=bool)
+    for position, index in enumerate(order):
+        if suppressed[index]:
+            continue
+        keep.append(index)
+        rest = order[position + 1:]
+        same_class = rest[(ids[rest] == ids[index]) & ~suppressed[rest]]
+        if len(same_class):
+            overlaps = box_iou(boxes[index], boxes[same_class])
+            suppressed[same_class[overlaps > iou_threshold]] = True
+    return np.asarray(keep, dtype=np.int64)
+
+
+def detect_tiled(model, image, tile_size, overlap=0.2, batch_size=8, iou_threshold=0.5):
+    """
+    Тайловая детекция на изображении image (H, W, 3).
+
+    Возвращает (ids, scores, boxes, число тайлов) в координатах исходного изображения.
+    """
+    height, width = image.shape[:2]
+    tiles = tile_grid(width, height, tile_size, overlap)
+
+    all_ids, all_scores, all_boxes = [], [], []
+    for start in range(0, len(tiles), batch_size):
+        batch_tiles = tiles[start:start + batch_size]
+        crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in batch_tiles]
+        for (x0, y0, _, _), (ids, scores, boxes) in zip(batch_tiles, model.predict_batch(crops)):
+            if not len(ids):
+                continue
+            boxes = np.array(boxes, dtype=np.float64)
+            boxes[:, 0] += x0
+            boxes[:, 1] += y0
+            all_ids.append(ids)
+            all_scores.append(scores)
+            all_boxes.append(boxes)
+
+    if not all_ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, 4)), len(tiles)
+
+    ids = np.concatenate(all_ids)
+    scores = np.concatenate(all_scores)
+    boxes = np.concatenate(all_boxes)
+    keep = nms(ids, scores, boxes, iou_threshold)
+    return ids[keep], scores[keep], boxes[keep].round(1), len(tiles)
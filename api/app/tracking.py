@@ -0,0 +1,252 @@
+"""
+Трекинг знаков между кадрами видео
+
+Для последовательных кадров одной камеры один и тот же знак детектируется
+десятки раз, пока машина к нему приближается. Трекер связывает детекции
+соседних кадров в треки (фильтр Калмана + сопоставление по IoU) и
+запускает классификатор только для новых треков и треков с низкой
+уверенностью. Лучшая метка трека выдаётся один раз - когда трек
+завершается.
+"""
+import functools
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from .lazy import lazy_import
+from .tiling import box_iou
+
+np = lazy_import("numpy")
+
+
+@functools.lru_cache(maxsize=None)
+def _kalman_matrices():
+    """Матрицы модели постоянной скорости: состояние [cx, cy, w, h, vx, vy]"""
+    transition = np.eye(6)
+    transition[0, 4] = transition[1, 5] = 1.0
+    observation = np.eye(4, 6)
+    process_noise = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01])
+    measurement_noise = np.diag([1.0, 1.0, 10.0, 10.0])
+    return transition, observation, process_noise, measurement_noise
+
+
+class KalmanBoxFilter:
+    """Фильтр Калмана для рамки [x, y, w, h] с постоянной скоростью центра"""
+
+    def __init__(self, box):
+        x, y, w, h = box
+        self.state = np.array([x + w / 2, y + h / 2, w, h, 0.0, 0.0])
+        self.covariance = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0])
+
+    def predict(self):
+        transition, _, process_noise, _ = _kalman_matrices()
+        self.state = transition @ self.state
+        self.covariance = transition @ self.covariance @ transition.T + process_noise
+        return self.box
+
+    def update(self, box):
+        _, observation, _, measurement_noise = _kalman_matrices()
+        x, y, w, h = box
+        residual = np.array([x + w / 2, y + h / 2, w, h]) - observation @ self.state
+        innovation = observation @ self.covariance @ observation.T + measurement_noise
+        gain = self.covariance @ observation.T @ np.linalg.inv(innovation)
+        self.state = self.state + gain @ residual
+        self.covariance = (np.eye(6) - gain @ observation) @ self.covariance
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.state[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, w, h])
+
+
+class Track:
+    """Трек одного знака: положение, лучшая метка и счётчики"""
+
+    def __init__(self, track_id, box, frame):
+        self.track_id = track_id
+        self.filter = KalmanBoxFilter(box)
+        self.box = np.asarray(box, dtype=np.float64)
+        self.first_frame = self.last_frame = frame
+        self.hits = 1
+        self.misses = 0
+        self.sign_id = None
+        self.confidence = 0.0
+        self.best_box = self.box
+
+    def assign_label(self, sign_id, confidence):
+        """Запоминает метку классификатора, если она увереннее текущей"""
+        if confidence > self.confidence:
+            self.sign_id = int(sign_id)
+            self.confidence = float(confidence)
+            self.best_box = self.box
+
+    def summary(self):
+        return {
+            "track_id": self.track_id,
+            "sign_id": self.sign_id,
+            "confidence": self.confidence,
+            "bounding_box": self.best_box.round(1).tolist(),
+            "first_frame": self.first_frame,
+            "last_frame": self.last_frame,
+            "frames": self.hits,
+        }
+
+
+def associate(predicted, boxes, iou_threshold):
+    """
+    Жадное сопоставление предсказанных рамок треков с детекциями по IoU.
+
+    Возвращает (пары (трек, детекция), несопоставленные детекции).
+    """
+    if not len(predicted) or not len(boxes):
+        return [], list(range(len(boxes)))
+
+    iou = np.stack([box_iou(box, boxes) for box in predicted])
+    pairs = []
+    used_tracks, used_boxes = set(), set()
+    for flat in np.argsort(-iou, axis=None, kind="stable"):
+        track_index, box_index = divmod(int(flat), len(boxes))
+        if iou[track_index, box_index] < iou_threshold:
+            break
+        if track_index in used_tracks or box_index in used_boxes:
+            continue
+        pairs.append((track_index, box_index))
+        used_tracks.add(track_index)
+        used_boxes.add(box_index)
+    return pairs, [index for index in range(len(boxes)) if index not in used_boxes]
+
+
+class Tracker:
+    """
+    Трекер одного потока кадров.
+
+    iou_threshold    - минимальный IoU для продолжения трека;
+    max_misses       - сколько кадров подряд трек может не находиться, прежде чем завершиться;
+    reclassify_below - трек с уверенностью ниже порога классифицируется повторно.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=5, reclassify_below=0.6):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reclassify_below = reclassify_below
+        self.tracks = []
+        self.frame = 0
+        self.stats = {"frames": 0, "detections": 0, "classifier_calls": 0}
+        self._ids = itertools.count(1)
+        # Кадры одного потока обрабатываются по очереди, даже из разных потоков threadpool
+        self.lock = threading.Lock()
+
+    def step(self, model, image):
+        """
+        Обрабатывает очередной кадр.
+
+        Возвращает dict: tracks - активные треки кадра, emitted - завершённые
+        треки, detections и classifier_calls - счётчики этого кадра.
+        """
+        self.frame += 1
+        boxes = np.asarray(model.detect(image), dtype=np.float64).reshape(-1, 4)
+
+        predicted = [track.filter.predict() for track in self.tracks]
+        pairs, unmatched = associate(predicted, boxes, self.iou_threshold)
+
+        matched = set()
+        to_classify = []  # (трек, индекс детекции)
+        for track_index, box_index in pairs:
+            track = self.tracks[track_index]
+            track.filter.update(boxes[box_index])
+            track.box = boxes[box_index]
+            track.hits += 1
+            track.misses = 0
+            track.last_frame = self.frame
+            matched.add(track_index)
+            if track.confidence < self.reclassify_below:
+                to_classify.append((track, box_index))
+
+        for box_index in unmatched:
+            track = Track(next(self._ids), boxes[box_index], self.frame)
+            self.tracks.append(track)
+            to_classify.append((track, box_index))
+
+        if to_classify:
+            ids, scores = model.classify(image, boxes[[box_index for _, box_index in to_classify]])
+            for (track, _), sign_id, score in zip(to_classify, ids, scores):
+                track.assign_label(sign_id, score)
+
+        emitted = []
+        alive = []
+        for index, track in enumerate(self.tracks):
+            if index < len(predicted) and index not in matched:
+                track.misses += 1
+            if track.misses > self.max_misses:
+                emitted.append(track)
+            else:
+                alive.append(track)
+        self.tracks = alive
+
+        self.stats["frames"] += 1
+        self.stats["detections"] += len(boxes)
+        self.stats["classifier_calls"] += len(to_classify)
+        return {
+            "tracks": [track for track in alive if track.misses == 0],
+            "emitted": emitted,
+            "detections": len(boxes),
+            "classifier_calls": len(to_classify),
+        }
+
+    def flush(self):
+        """Завершает все треки (конец потока) и возвращает их"""
+        emitted, self.tracks = self.tracks, []
+        return emitted
+
+    def summary(self):
+        """Накопленная статистика: сколько вызовов классификатора сэкономлено"""
+        detections = self.stats["detections"]
+        saved = detections - self.stats["classifier_calls"]
+        return {
+            **self.stats,
+            "classifier_calls_saved": saved,
+            "saved_ratio": round(saved / detections, 4) if detections else 0.0,
+        }
+
+
+class StreamStore:
+    """
+    Трекеры потоков кадров (ключ - пользователь и stream_id) в памяти процесса.
+
+    Потоки, не получавшие кадров дольше idle_timeout секунд, и самые старые
+    потоки сверх max_streams удаляются вместе с незавершёнными треками.
+    """
+
+    def __init__(self, max_streams=1000, idle_timeout=300.0, **tracker_options):
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.tracker_options = tracker_options
+        self._streams = OrderedDict()  # key -> (время последнего кадра, Tracker)
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._streams:
+            key, (touched, _) = next(iter(self._streams.items()))
+            if now - touched <= self.idle_timeout and len(self._streams) <= self.max_streams:
+                break
+            del self._streams[key]
+
+    def get(self, key):
+        """Трекер потока; новый поток создаётся при первом кадре"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._streams.pop(key, None)
+            tracker = item[1] if item else Tracker(**self.tracker_options)
+            self._streams[key] = (now, tracker)
+            self._evict(now)
+        return tracker
+
+    def pop(self, key):
+        with self._lock:
+            item = self._streams.pop(key, None)
+        return item[1] if item else None
+
+    def __len__(self):
+        return len(self._streams)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Бенчмарк памяти и времени декодирования больших изображений
+
+Каждый замер - отдельный процесс (пиковый RSS процесса не уменьшается):
+  - full    - полное декодирование в исходном размере (как decode_image);
+  - bounded - decode_bounded до размера входа модели (JPEG draft + reduce).
+Прирост пикового RSS считается от состояния после импортов и чтения файла.
+
+Пример (из каталога api/):
+    python benchmarks/bench_decode.py --megapixels 24 48 100
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, resource, sys, time
+import numpy as np
+from PIL import Image
+from app.decoding import decode_bounded, decode_image
+Image.MAX_IMAGE_PIXELS = None
+
+data = open(sys.argv[1], "rb").read()
+mode = sys.argv[2]
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == "full":
+    array = decode_image(data)
+else:
+    array, _ = decode_bounded(data, target_size=640)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"ms": elapsed * 1000, "peak_mb": (peak - before) / 1024, "shape": list(array.shape)}))
+"""
+
+
+def make_jpeg(path, megapixels, image_format):
+    import numpy as np
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    # Градиент с шумом: сжимается как фотография, а не как однотонная заливка
+    rng = np.random.default_rng(0)
+    row = np.linspace(0, 255, width, dtype=np.float32)
+    column = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    Image.MAX_IMAGE_PIXELS = None
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = (row + column) / 2
+    image[..., 1] = row
+    image[..., 2] = rng.integers(0, 40, (height, width), dtype=np.uint8) + column.astype(np.uint8) // 2
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format=image_format, quality=90)
+    with open(path, "wb") as f:
+        f.write(buffer.getvalue())
+    return width, height, len(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 48])
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "PNG"])
+    args = parser.parse_args()
+
+    print(f"{'изображение':<26}{'режим':<10}{'время, мс':>11}{'пик RSS, МБ':>13}  результат")
+    for megapixels in args.megapixels:
+        with tempfile.NamedTemporaryFile(suffix="." + args.format.lower()) as f:
+            width, height, size = make_jpeg(f.name, megapixels, args.format)
+            label = f"{width}x{height} ({size / 2**20:.1f} МБ)"
+            for mode in ("full", "bounded"):
+                output = subprocess.run([sys.executable, "-c", MEASURE, f.name, mode], cwd=API_DIR,
+                                        check=True, capture_output=True, text=True).stdout
+                result = json.loads(output)
+                shape = "x".join(map(str, result["shape"][:2][::-1]))
+                print(f"{label:<26}{mode:<10}{result['ms']:>11.1f}{result['peak_mb']:>13.1f}  {shape}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Бенчмарк холодного старта ML API
+
+Каждый замер запускается в отдельном процессе, чтобы не мешал кэш импортов:
+  - import      - время импорта app.main (то, что платит каждый reload, воркер и тест);
+  - health      - импорт + первый ответ /health;
+  - inference   - импорт + загрузка модели + первая детекция (time-to-first-inference).
+Также выводится, какие тяжёлые модули оказались загружены после импорта.
+
+Пример (из каталога api/):
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["numpy", "PIL", "torch", "torchvision", "cv2"]
+
+SCENARIOS = {
+    "import": """
+import app.main
+""",
+    "health": """
+from fastapi.testclient import TestClient
+import app.main
+TestClient(app.main.app).get("/health")
+""",
+    "inference": """
+import base64
+from fastapi.testclient import TestClient
+import app.main
+TestClient(app.main.app).post("/detection/detect", json={"image_base64": base64.b64encode(b"x").decode()})
+""",
+}
+
+TEMPLATE = """
+import json, sys, time
+started = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_scenario(name, env):
+    code = TEMPLATE.format(body=SCENARIOS[name], heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model-load", default="lazy", choices=["lazy", "startup", "preload"],
+                        help="значение MODEL_LOAD для замеров")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_LOAD=args.model_load)
+    print("=" * 60)
+    print(f"Холодный старт ML API (MODEL_LOAD={args.model_load}, {args.runs} запусков)")
+    print("=" * 60)
+    for name in SCENARIOS:
+        results = [run_scenario(name, env) for _ in range(args.runs)]
+        times = [r["elapsed"] * 1000 for r in results]
+        loaded = ", ".join(results[-1]["loaded"]) or "-"
+        print(f"{name:10} медиана {statistics.median(times):8.1f} ms   "
+              f"мин {min(times):8.1f} ms   тяжёлые модули: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
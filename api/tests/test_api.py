@@ -1,6 +1,8 @@
 """
 Тесты для FastAPI
 """
+import base64
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -37,3 +39,37 @@ def test_list_signs():
     assert "signs" in data
     assert "total" in data
     assert isinstance(data["signs"], list)
+
+def test_detect_endpoint_valid_image():
+    """Тест детекции: ответ в формате DetectionResponse"""
+    image_base64 = base64.b64encode(b"fake image bytes").decode()
+    response = client.post("/detection/detect", json={"image_base64": image_base64})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert 1 <= len(data["results"]) <= 3
+    for result in data["results"]:
+        assert set(result) == {"sign_id", "sign_name", "confidence", "bounding_box"}
+        assert len(result["bounding_box"]) == 4
+        assert 0.1 <= result["confidence"] <= 0.99
+
+def test_batch_detect_columnar():
+    """Тест пакетной детекции в колоночном формате"""
+    images = [base64.b64encode(b"image %d" % i).decode() for i in range(3)]
+    response = client.post("/detection/detect/batch", json={"images_base64": images})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["format"] == "columnar"
+    assert data["count"] == 3
+    assert len(data["offsets"]) == 4
+    total = data["offsets"][-1]
+    assert len(data["ids"]) == len(data["scores"]) == len(data["boxes"]) == total
+    assert all(len(box) == 4 for box in data["boxes"])
+
+def test_batch_detect_rows():
+    """Тест пакетной детекции в построчном формате"""
+    images = [base64.b64encode(b"image").decode()] * 2
+    response = client.post("/detection/detect/batch", json={"images_base64": images, "format": "rows"})
+    data = response.json()
+    assert data["count"] == 2
+    assert all("sign_name" in result for result in data["results"][0])
@@ -0,0 +1,119 @@
+"""
+Тесты каскада быстрая модель -> тяжёлый классификатор
+"""
+import base64
+import io
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.cascade import Cascade, crop
+from app.main import app, cascade
+
+client = TestClient(app)
+
+
+class RecordingClassifier:
+    def __init__(self):
+        self.batches = []
+
+    def classify_crops(self, crops):
+        self.batches.append([c.shape for c in crops])
+        return np.full(len(crops), 9), np.full(len(crops), 0.97)
+
+
+def _fast_result(scores, sign_id=1):
+    scores = np.array(scores)
+    boxes = np.tile([10.0, 10.0, 20.0, 20.0], (len(scores), 1))
+    return np.full(len(scores), sign_id), scores, boxes
+
+
+def test_only_low_confidence_detections_are_escalated_in_batches():
+    classifier = RecordingClassifier()
+    engine = Cascade(lambda: classifier, default_threshold=0.7, batch_size=2)
+    images = [np.zeros((100, 100, 3), dtype=np.uint8)] * 2
+    batch = [_fast_result([0.9, 0.5]), _fast_result([0.6, 0.65, 0.95])]
+
+    refined, escalated = engine.refine(images, batch)
+
+    assert escalated == 3
+    assert [len(chunk) for chunk in classifier.batches] == [2, 1]
+    assert refined[0][0].tolist() == [1, 9]
+    assert refined[1][1].tolist() == [0.97, 0.97, 0.95]
+
+    metrics = engine.metrics.snapshot()
+    assert metrics["escalation_rate"] == 0.6
+    assert metrics["latency_saved"] is not None
+
+
+def test_latency_saved_counts_fast_model_time():
+    engine = Cascade(RecordingClassifier)
+    engine.metrics.record(images=2, detections=10, escalated=2, fast_time=0.05, heavy_time=0.2)
+    metrics = engine.metrics.snapshot()
+    # Базовая линия 10 * 0.1 = 1.0 с, каскад 0.05 + 0.2 с
+    assert metrics["heavy_time_per_crop"] == 0.1
+    assert metrics["latency_saved"] == 0.75
+
+
+def test_per_class_thresholds_override_default():
+    engine = Cascade(RecordingClassifier, default_threshold=0.7)
+    image = np.zeros((50, 50, 3), dtype=np.uint8)
+    _, escalated = engine.refine([image], [_fast_result([0.8], sign_id=2)], thresholds={2: 0.9})
+    assert escalated == 1
+    _, escalated = engine.refine([image], [_fast_result([0.5], sign_id=2)], thresholds={2: 0.3})
+    assert escalated == 0
+
+
+def test_crop_is_clipped_to_image():
+    image = np.zeros((40, 60, 3), dtype=np.uint8)
+    assert crop(image, [50.0, 30.0, 30.0, 30.0]).shape == (10, 10, 3)
+    assert crop(image, [-5.0, -5.0, 0.2, 0.2]).shape == (1, 1, 3)
+
+
+def _image_base64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_detect_endpoint_cascade_mode():
+    cascade.metrics.reset()
+    # Порог выше любой уверенности быстрой модели: эскалируются все детекции
+    data = client.post("/detection/detect", json={
+        "image_base64": _image_base64(), "cascade": True,
+        "cascade_thresholds": {str(sign_id): 1.0 for sign_id in range(1, 6)},
+    }).json()
+    assert data["success"] is True
+    assert data["escalated"] == len(data["results"])
+    assert all(r["confidence"] >= 0.85 for r in data["results"])
+
+    metrics = client.get("/cascade/metrics").json()
+    assert metrics["escalation_rate"] == 1.0
+
+
+def test_batch_endpoint_cascade_mode():
+    data = client.post("/detection/detect/batch", json={
+        "images_base64": [_image_base64()] * 3, "cascade": True, "format": "rows",
+    }).json()
+    assert data["success"] is True
+    assert 0 <= data["escalated"] <= sum(len(rows) for rows in data["results"])
+
+
+def test_cascade_refine_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+
+    loops = []
+    refine = cascade.refine
+
+    def recording_refine(*args, **kwargs):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return refine(*args, **kwargs)
+
+    monkeypatch.setattr(cascade, "refine", recording_refine)
+    client.post("/detection/detect", json={"image_base64": _image_base64(), "cascade": True})
+    client.post("/detection/detect/batch", json={"images_base64": [_image_base64()], "cascade": True})
+    assert loops == [None, None]
@@ -0,0 +1,136 @@
+"""
+Тесты декодирования с бюджетами байтов и пикселей
+"""
+import base64
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import main
+from app.decoding import ImageTooLargeError, decode_base64, decode_bounded, scale_boxes, sniff_size
+
+client = TestClient(main.app)
+
+
+def _encoded(size, image_format="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_byte_budget_is_checked_before_base64_decoding():
+    with pytest.raises(ImageTooLargeError):
+        decode_base64("A" * 4000, max_bytes=1000)
+    assert decode_base64(base64.b64encode(b"abc").decode(), max_bytes=1000) == b"abc"
+
+
+def test_header_sniffing_and_pixel_budget():
+    data = _encoded((4000, 3000))
+    assert sniff_size(data) == ("JPEG", 4000, 3000)
+    assert sniff_size(b"not an image") is None
+    with pytest.raises(ImageTooLargeError):
+        decode_bounded(data, max_pixels=1_000_000)
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG"])
+def test_decoding_to_model_size_keeps_original_coordinates(image_format):
+    array, scale = decode_bounded(_encoded((4000, 3000), image_format), target_size=640)
+    assert 640 <= max(array.shape[:2]) < 1280
+    assert array.shape[1] * scale[0] == pytest.approx(4000)
+    assert scale_boxes([[10.0, 10.0, 20.0, 20.0]], scale)[0][2] == pytest.approx(20 * scale[0], abs=0.1)
+
+    array, scale = decode_bounded(_encoded((300, 200), image_format), target_size=640)
+    assert array.shape[:2] == (200, 300) and scale == (1.0, 1.0)
+
+
+def test_oversized_upload_is_rejected_with_413(monkeypatch):
+    monkeypatch.setattr(main, "MAX_IMAGE_PIXELS", 1_000_000)
+    payload = {"image_base64": base64.b64encode(_encoded((2000, 1000))).decode()}
+    response = client.post("/detection/detect", json=payload)
+    assert response.status_code == 413
+    assert "exceeds" in response.json()["error"]
+
+    response = client.post("/detection/detect/batch", json={"images_base64": [payload["image_base64"]]})
+    assert response.status_code == 413
+    assert response.json()["error"].startswith("Image 0:")
+
+
+class FixedBoxModel:
+    version = "fixed"
+    input_size = 640
+
+    def __init__(self):
+        self.shapes = []
+
+    def predict(self, image):
+        self.shapes.append(image.shape)
+        return np.array([1]), np.array([0.99]), np.array([[10.0, 20.0, 100.0, 50.0]])
+
+
+def test_cascade_decodes_at_model_size_and_reports_original_coordinates(monkeypatch):
+    model = FixedBoxModel()
+    monkeypatch.setattr(main.registry, "get", lambda: model)
+    payload = {"image_base64": base64.b64encode(_encoded((2560, 1920))).decode(), "cascade": True}
+    data = client.post("/detection/detect", json=payload).json()
+
+    assert model.shapes == [(480, 640, 3)]  # JPEG draft 1/4
+    assert data["results"][0]["bounding_box"] == [40.0, 80.0, 400.0, 200.0]
+
+
+def test_request_body_limit():
+    small = TestClient(main.RequestSizeLimit(main.app, max_bytes=100))
+    response = small.post("/detection/detect", json={"image_base64": "A" * 200})
+    assert response.status_code == 413
+
+
+def test_request_body_limit_counts_streamed_bytes():
+    import gzip
+
+    small = TestClient(main.RequestSizeLimit(main.app, max_bytes=100))
+
+    def chunks(data, size=40):
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+
+    # Без Content-Length (chunked): лимит по прочитанным байтам
+    body = b'{"image_base64": "' + b"A" * 200 + b'"}'
+    response = small.post("/detection/detect", content=chunks(body), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert response.json() == {"success": False, "error": "Request body exceeds 100 bytes"}
+
+    # Сжатое тело читает RequestDecompression - 413 и от него
+    compressed = gzip.compress(body)
+    noise = bytes(range(256)) * 2
+    response = small.post("/detection/detect", content=chunks(compressed + noise),
+                          headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 413
+
+    response = small.post("/detection/detect", content=chunks(b'{"image_base64": ""}'),
+                          headers={"Content-Type": "application/json"})
+    assert response.status_code == 200
+
+
+def test_gzip_request_body_is_decompressed():
+    import gzip
+    import json
+
+    body = gzip.compress(json.dumps({"images_base64": [base64.b64encode(b"image").decode()] * 2}).encode())
+    response = TestClient(main.app).post("/detection/detect/batch", content=body,
+                                         headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+
+
+def test_decompressed_body_limit_and_invalid_stream():
+    import gzip
+
+    small = TestClient(main.RequestDecompression(main.app, max_bytes=1000))
+    bomb = gzip.compress(b"{" + b" " * 100_000 + b"}")
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    assert small.post("/detection/detect", content=bomb, headers=headers).status_code == 413
+    truncated = gzip.compress(b'{"image_base64": ""}')[:-10]
+    assert small.post("/detection/detect", content=truncated, headers=headers).status_code == 400
+    assert small.post("/detection/detect", content=b"not gzip", headers=headers).status_code == 400
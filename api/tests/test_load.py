@@ -0,0 +1,135 @@
+"""
+Тесты метрик нагрузки, /ready и /load
+"""
+import asyncio
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.load import LoadMonitor, LoadStats
+
+client = TestClient(app.main.app)
+
+
+def test_latency_percentiles_use_recent_window():
+    stats = LoadStats(window=10)
+    stats.record(9.0, now=80.0)  # вне окна к моменту 100
+    for duration in (0.5, 0.1, 0.2, 0.3):
+        stats.record(duration, now=95.0)
+    p50, p95, count = stats.latency(now=100.0)
+    assert (p50, p95, count) == (0.3, 0.5, 4)
+    assert stats.snapshot(now=100.0)["requests_per_second"] == 0.4
+
+
+def test_concurrency_limit_queues_and_sheds():
+    stats = LoadStats(max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+    statuses = []
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    monitor = LoadMonitor(slow_app, stats, prefixes=("/detection/",))
+
+    async def request():
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+        await monitor({"type": "http", "path": "/detection/detect", "headers": []}, None, send)
+
+    async def scenario():
+        first, second = asyncio.create_task(request()), asyncio.create_task(request())
+        await asyncio.sleep(0)
+        assert (stats.in_flight, stats.queued, stats.overloaded()) == (1, 1, True)
+        await request()  # третий сразу отклоняется
+        assert statuses == [503]
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert statuses == [503, 200, 200]
+    snapshot = stats.snapshot()
+    assert (snapshot["in_flight"], snapshot["queued"], snapshot["completed"], snapshot["rejected"]) == (0, 0, 2, 1)
+
+
+def test_ready_and_load_endpoints():
+    app.main.preload_model()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["model_loaded"] is True
+
+    before = client.get("/load").json()["completed"]
+    client.post("/detection/detect", json={"image_base64": "invalid"})
+    load = client.get("/load").json()
+    assert load["completed"] == before + 1
+    assert load["in_flight"] == 0
+    assert load["latency_p95"] is not None
+    assert load["model_version"]
+
+
+def test_ready_reports_overload(monkeypatch):
+    app.main.preload_model()
+    monkeypatch.setattr(app.main.load, "max_queue", 2)
+    monkeypatch.setattr(app.main.load, "queued", 2)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["overloaded"] is True
+
+
+def test_ready_does_not_start_model_loading(monkeypatch):
+    monkeypatch.setattr(app.main.registry, "_model", None)
+    monkeypatch.setattr(app.main.registry, "_last_error", "2.0.0: broken weights")
+    monkeypatch.setattr(app.main.registry, "activate", lambda *args, **kwargs: pytest.fail("probe started a load"))
+    monkeypatch.setattr(app.main.registry, "read_manifest", lambda: pytest.fail("probe read the manifest"))
+    for _ in range(3):
+        response = client.get("/ready")
+        assert response.status_code == 503
+    assert response.json()["model_error"] == "2.0.0: broken weights"
+
+
+def test_load_answers_while_detection_is_in_flight(monkeypatch):
+    import threading
+
+    import httpx
+
+    app.main.preload_model()
+    started, release = threading.Event(), threading.Event()
+    model = app.main.registry.current
+
+    class SlowModel:
+        version = model.version
+
+        def predict(self, image):
+            started.set()
+            release.wait(5)
+            return model.predict(image)
+
+    monkeypatch.setattr(app.main.registry, "get", SlowModel)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            image = base64.b64encode(b"\xff\xd8\xff").decode()
+            slow = asyncio.create_task(http.post("/detection/detect", json={"image_base64": image}))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            load = (await asyncio.wait_for(http.get("/load"), 1)).json()
+            ready = await asyncio.wait_for(http.get("/ready"), 1)
+            release.set()
+            return load, ready, await slow
+
+    try:
+        load, ready, response = asyncio.run(scenario())
+    finally:
+        release.set()
+    assert load["in_flight"] == 1
+    assert ready.status_code == 200
+    assert response.json()["success"] is True
+
+
+def test_async_endpoints_work():
+    assert client.get("/async/health").json()["status"] == "healthy"
@@ -0,0 +1,99 @@
+"""
+Тесты реестра моделей и горячей замены версии
+"""
+import base64
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.registry import BUILTIN_VERSION, ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Реестр с двумя версиями модели во временном каталоге"""
+    for version, confidence in (("1.0.0", 0.5), ("2.0.0", 0.9)):
+        (tmp_path / version).mkdir()
+        np.save(tmp_path / version / "sign_confidence.npy", np.full(5, confidence))
+    manifest = {
+        "active": "1.0.0",
+        "versions": {
+            version: {"path": version, "architecture": "demo",
+                      "weights": {"sign_confidence": "sign_confidence.npy"}}
+            for version in ("1.0.0", "2.0.0")
+        },
+    }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+
+    registry = ModelRegistry(str(tmp_path), poll_interval=0)
+    monkeypatch.setattr(main, "registry", registry)
+    return registry
+
+
+def test_weights_are_memory_mapped(registry):
+    model = registry.current
+    assert model.version == "1.0.0"
+    assert isinstance(model.weights["sign_confidence"], np.memmap)
+
+
+def test_swap_keeps_in_flight_model(registry):
+    in_flight = registry.get()
+    registry.activate("2.0.0", background=False)
+    assert in_flight.version == "1.0.0"
+    assert registry.get().version == "2.0.0"
+
+
+def _wait_for_version(registry, version, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while registry.current.version != version and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return registry.current.version
+
+
+def test_manifest_change_is_picked_up(registry):
+    registry.current
+    other = ModelRegistry(registry.root)
+    manifest = other.read_manifest()
+    manifest["active"] = "2.0.0"
+    other.write_manifest(manifest)
+
+    registry._manifest_mtime = None  # mtime мог не измениться в пределах разрешения ФС
+    assert registry.get().version == "1.0.0"
+    assert _wait_for_version(registry, "2.0.0") == "2.0.0"
+
+
+def test_unknown_version_keeps_current(registry):
+    registry.current
+    registry.activate("9.9.9", background=False)
+    assert registry.current.version == "1.0.0"
+    assert "9.9.9" in registry.status()["last_error"]
+
+
+def test_detect_response_is_stamped_with_version(registry):
+    client = TestClient(main.app)
+    image_base64 = base64.b64encode(b"image").decode()
+    data = client.post("/detection/detect", json={"image_base64": image_base64}).json()
+    assert data["model_version"] == "1.0.0"
+
+    response = client.post("/models/activate", json={"version": "missing"})
+    assert response.status_code == 404
+
+
+def test_builtin_version_without_manifest(tmp_path):
+    assert ModelRegistry(str(tmp_path)).current.version == BUILTIN_VERSION
+
+
+def test_concurrent_publishes_write_whole_manifests(registry):
+    from concurrent.futures import ThreadPoolExecutor
+
+    publishers = [ModelRegistry(registry.root) for _ in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda item: item[1].publish(("1.0.0", "2.0.0")[item[0] % 2]), enumerate(publishers * 5)))
+
+    assert registry.read_manifest()["active"] in ("1.0.0", "2.0.0")
+    assert [name for name in os.listdir(registry.root) if name.endswith(".tmp")] == []
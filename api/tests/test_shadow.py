@@ -0,0 +1,127 @@
+"""
+Тесты зеркалирования запросов на теневую модель
+"""
+import base64
+import sqlite3
+import threading
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import main
+from app.shadow import ShadowMirror, compare
+
+client = TestClient(main.app)
+
+
+class FixedModel:
+    def __init__(self, version, ids, boxes):
+        self.version = version
+        self.result = (np.array(ids), np.full(len(ids), 0.9), np.array(boxes, dtype=float).reshape(-1, 4))
+        self.calls = 0
+
+    def predict(self, image):
+        self.calls += 1
+        return self.result
+
+
+class BlockingModel(FixedModel):
+    def __init__(self):
+        super().__init__("blocked", [], [])
+        self.release = threading.Event()
+
+    def predict(self, image):
+        self.release.wait(5)
+        return super().predict(image)
+
+
+def test_compare_matches_boxes_and_labels():
+    primary = FixedModel("a", [1, 2], [[0, 0, 10, 10], [50, 50, 10, 10]]).result
+    shadow = FixedModel("b", [1, 3, 4], [[1, 1, 10, 10], [50, 50, 10, 10], [90, 90, 5, 5]]).result
+    row = compare(primary, shadow)
+    assert (row["matched"], row["same_label"]) == (2, 1)
+    assert row["agreement"] == 2 * 1 / 5
+    empty = FixedModel("c", [], []).result
+    assert compare(empty, empty)["agreement"] == 1.0
+
+
+def test_sampled_requests_are_compared_off_the_request_path(tmp_path, monkeypatch):
+    shadow_model = FixedModel("2.0.0", [1], [[0, 0, 10, 10]])
+    mirror = ShadowMirror(lambda: shadow_model, str(tmp_path / "shadow.sqlite3"), sample_rate=1.0)
+    monkeypatch.setattr(main, "shadow", mirror)
+    monkeypatch.setattr(main, "SHADOW_MODEL_VERSION", "2.0.0")
+
+    for _ in range(3):
+        response = client.post("/detection/detect", json={"image_base64": base64.b64encode(b"img").decode()})
+        assert response.json()["success"]
+    mirror.drain()
+
+    assert shadow_model.calls == 3
+    with sqlite3.connect(mirror.store_path) as connection:
+        rows = connection.execute("SELECT primary_version, shadow_version, shadow_count FROM shadow_results").fetchall()
+    assert rows == [(main.registry.current.version, "2.0.0", 1)] * 3
+
+    metrics = client.get("/shadow/metrics").json()
+    assert metrics["enabled"] and metrics["compared"] == 3 and metrics["completed"] == 3
+    assert metrics["latency_delta_ms"] is not None
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    model = BlockingModel()
+    mirror = ShadowMirror(lambda: model, str(tmp_path / "shadow.sqlite3"), sample_rate=1.0, max_queue=1)
+    primary = FixedModel("1.0.0", [], []).result
+    offered = [mirror.offer(b"img", primary, "1.0.0", 0.01, 0.01) for _ in range(5)]
+    model.release.set()
+    mirror.drain()
+
+    # Одно задание в работе, одно в очереди, остальные отброшены
+    assert offered.count(True) in (1, 2)
+    assert mirror.counters["dropped"] == 5 - offered.count(True)
+    assert mirror.counters["completed"] == offered.count(True)
+
+
+def test_zero_sample_rate_mirrors_nothing(tmp_path):
+    mirror = ShadowMirror(lambda: None, str(tmp_path / "shadow.sqlite3"), sample_rate=0.0)
+    assert not mirror.offer(b"img", None, "1.0.0", 0.0, 0.0)
+    assert mirror.summary()["compared"] == 0
+
+
+def test_summary_keeps_running_totals_without_rescanning(tmp_path, monkeypatch):
+    path = str(tmp_path / "shadow.sqlite3")
+    primary = FixedModel("1.0.0", [1], [[0, 0, 10, 10]]).result
+    first = ShadowMirror(lambda: FixedModel("2.0.0", [1], [[0, 0, 10, 10]]), path, sample_rate=1.0)
+    first.offer(b"img", primary, "1.0.0", 0.01, 0.01)
+    first.drain()
+
+    # Новый процесс: история из базы читается один раз, дальше суммы в памяти
+    mirror = ShadowMirror(lambda: FixedModel("2.0.0", [], []), path, sample_rate=1.0)
+    assert mirror.summary()["compared"] == 1
+    mirror.offer(b"img", primary, "1.0.0", 0.01, 0.01)
+    mirror.drain()
+
+    def no_scan(*args, **kwargs):
+        raise AssertionError("summary queried SQLite")
+
+    monkeypatch.setattr(mirror, "_connect", no_scan)
+    monkeypatch.setattr("app.shadow.sqlite3.connect", no_scan)
+    summary = mirror.summary()
+    assert summary["compared"] == 2
+    assert summary["agreement"] == 0.5
+
+
+def test_failed_model_factory_stops_mirroring(tmp_path):
+    calls = []
+
+    def broken_factory():
+        calls.append(1)
+        raise FileNotFoundError("weights are missing")
+
+    mirror = ShadowMirror(broken_factory, str(tmp_path / "shadow.sqlite3"), sample_rate=1.0)
+    primary = FixedModel("1.0.0", [], []).result
+    assert mirror.offer(b"img", primary, "1.0.0", 0.01, 0.01)
+    mirror.drain()
+
+    assert not any(mirror.offer(b"img", primary, "1.0.0", 0.01, 0.01) for _ in range(3))
+    assert calls == [1]
+    assert mirror.counters["errors"] == 1
+    assert mirror.summary()["failure"] == "FileNotFoundError: weights are missing"
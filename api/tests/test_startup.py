@@ -0,0 +1,32 @@
+"""
+Тесты быстрого старта: тяжёлые зависимости не импортируются заранее
+"""
+import os
+import subprocess
+import sys
+
+from app.lazy import LazyModule, lazy_import
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        "import sys\n"
+        "from fastapi.testclient import TestClient\n"
+        "import app.main\n"
+        "client = TestClient(app.main.app)\n"
+        "assert client.get('/').status_code == 200\n"
+        "assert client.get('/health').status_code == 200\n"
+        "print(','.join(m for m in ('numpy', 'PIL', 'torch', 'torchvision', 'cv2') if m in sys.modules))\n"
+    )
+    env = dict(os.environ, MODEL_LOAD="lazy")
+    output = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == ""
+
+
+def test_lazy_module_loads_on_attribute_access():
+    module = LazyModule("json")
+    assert module.dumps([1]) == "[1]"
+    assert lazy_import("os") is os
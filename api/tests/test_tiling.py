@@ -0,0 +1,95 @@
+"""
+Тесты тайловой детекции
+"""
+import base64
+import io
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.tiling import detect_tiled, nms, tile_grid
+
+client = TestClient(app)
+
+
+def test_tile_grid_covers_image_with_overlap():
+    tiles = tile_grid(1500, 700, tile_size=640, overlap=0.25)
+    covered = np.zeros((700, 1500), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        assert x1 - x0 <= 640 and y1 - y0 <= 640
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+
+
+def test_small_image_is_single_tile():
+    assert tile_grid(300, 200, tile_size=640, overlap=0.2) == [(0, 0, 300, 200)]
+
+
+def test_nms_is_class_aware():
+    ids = np.array([1, 1, 2])
+    scores = np.array([0.9, 0.8, 0.7])
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10]], dtype=float)
+    assert sorted(nms(ids, scores, boxes).tolist()) == [0, 2]
+
+
+class FixedSignModel:
+    """Модель, видящая один знак в фиксированной точке исходного изображения"""
+
+    def __init__(self, sign_xy, max_batch):
+        self.sign_xy = sign_xy
+        self.max_batch = max_batch
+        self.tiles = []
+
+    def predict_batch(self, crops):
+        assert len(crops) <= self.max_batch
+        results = []
+        for crop in crops:
+            # Координаты тайла восстанавливаем по значениям пикселей (см. тест)
+            x0, y0 = int(crop[0, 0, 0]) * 10, int(crop[0, 0, 1]) * 10
+            self.tiles.append((x0, y0))
+            x, y = self.sign_xy[0] - x0, self.sign_xy[1] - y0
+            h, w = crop.shape[:2]
+            if 0 <= x <= w - 20 and 0 <= y <= h - 20:
+                results.append((np.array([1]), np.array([0.9]), np.array([[x, y, 20.0, 20.0]])))
+            else:
+                results.append((np.zeros(0, dtype=int), np.zeros(0), np.zeros((0, 4))))
+        return results
+
+
+def test_detect_tiled_merges_duplicates_in_original_coordinates():
+    width, height = 1000, 600
+    # Пиксель (y, x) хранит (x // 10, y // 10) - так модель узнаёт смещение тайла
+    xs, ys = np.meshgrid(np.arange(width) // 10, np.arange(height) // 10)
+    image = np.stack([xs, ys, np.zeros_like(xs)], axis=-1).astype(np.uint8)
+
+    model = FixedSignModel(sign_xy=(420, 300), max_batch=2)
+    ids, scores, boxes, tiles = detect_tiled(model, image, tile_size=400, overlap=0.5, batch_size=2)
+
+    assert tiles == len(model.tiles) > 1
+    assert ids.tolist() == [1]
+    assert boxes.tolist() == [[420.0, 300.0, 20.0, 20.0]]
+
+
+def test_detect_endpoint_tiled_mode():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1800, 900), "white").save(buffer, format="PNG")
+    image_base64 = base64.b64encode(buffer.getvalue()).decode()
+
+    response = client.post("/detection/detect", json={
+        "image_base64": image_base64, "tiled": True, "tile_size": 640, "tile_batch_size": 2,
+    })
+    data = response.json()
+    assert data["success"] is True
+    assert data["tiles"] == 8  # 4 x 2 при шаге 512
+    for result in data["results"]:
+        x, y, w, h = result["bounding_box"]
+        assert 0 <= x and x + w <= 1800 and 0 <= y and y + h <= 900
+
+
+def test_detect_endpoint_tiled_rejects_non_image():
+    image_base64 = base64.b64encode(b"not an image").decode()
+    data = client.post("/detection/detect", json={"image_base64": image_base64, "tiled": True}).json()
+    assert data["success"] is False
+    assert "Cannot decode image" in data["error"]
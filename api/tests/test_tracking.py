@@ -0,0 +1,124 @@
+"""
+Тесты трекинга знаков между кадрами
+"""
+import base64
+import io
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app, streams
+from app.tracking import StreamStore, Tracker
+
+client = TestClient(app)
+
+
+class MovingSignModel:
+    """Один знак, который приближается: рамка сдвигается и растёт от кадра к кадру"""
+
+    def __init__(self, visible_frames, scores=(0.9,)):
+        self.visible_frames = visible_frames
+        self.scores = list(scores)
+        self.frame = 0
+        self.classified = 0
+
+    def detect(self, image):
+        self.frame += 1
+        if self.frame > self.visible_frames:
+            return np.zeros((0, 4))
+        return np.array([[100.0 + 3 * self.frame, 100.0, 40.0 + self.frame, 40.0 + self.frame]])
+
+    def classify(self, image, boxes):
+        self.classified += len(boxes)
+        score = self.scores[min(self.classified, len(self.scores)) - 1]
+        return np.full(len(boxes), 3), np.full(len(boxes), score)
+
+
+def _frame_base64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_confident_track_is_classified_once_and_emitted_once():
+    model = MovingSignModel(visible_frames=10)
+    tracker = Tracker(max_misses=2)
+
+    emitted = []
+    for _ in range(13):
+        emitted.extend(tracker.step(model, None)["emitted"])
+    emitted.extend(tracker.flush())
+
+    assert model.classified == 1
+    assert len(emitted) == 1
+    track = emitted[0].summary()
+    assert track["sign_id"] == 3
+    assert (track["first_frame"], track["last_frame"], track["frames"]) == (1, 10, 10)
+
+    stats = tracker.summary()
+    assert stats["detections"] == 10
+    assert stats["classifier_calls_saved"] == 9
+
+
+def test_low_confidence_track_is_reclassified_until_confident():
+    model = MovingSignModel(visible_frames=5, scores=(0.3, 0.5, 0.8))
+    tracker = Tracker(reclassify_below=0.6)
+    for _ in range(5):
+        tracker.step(model, None)
+
+    (track,) = tracker.flush()
+    assert model.classified == 3
+    assert track.confidence == 0.8
+
+
+def test_stream_store_evicts_oldest_stream():
+    store = StreamStore(max_streams=2)
+    first = store.get((1, "a"))
+    store.get((1, "b"))
+    store.get((1, "c"))
+    assert len(store) == 2
+    assert store.get((1, "a")) is not first
+
+
+def test_stream_endpoint_keeps_tracks_per_user_stream():
+    frame = _frame_base64()
+    response = client.post("/detection/stream", json={"image_base64": frame, "stream_id": "cam-1", "user_id": 7})
+    data = response.json()
+    assert data["success"] is True
+    assert data["frame"] == 1
+    assert data["classifier_calls"] == data["detections"] == len(data["tracks"])
+    assert all(track["track_id"] and track["sign_name"] for track in data["tracks"])
+
+    data = client.post("/detection/stream", json={
+        "image_base64": frame, "stream_id": "cam-1", "user_id": 7, "end": True,
+    }).json()
+    assert data["frame"] == 2
+    assert data["stats"]["frames"] == 2
+    # Конец потока: все треки завершены, каждый выдан один раз
+    assert data["emitted"]
+    assert len({track["track_id"] for track in data["emitted"]}) == len(data["emitted"])
+    assert (7, "cam-1") not in streams._streams
+
+
+def test_track_endpoint_returns_one_row_per_track():
+    frame = _frame_base64()
+    data = client.post("/detection/track", json={"frames_base64": [frame] * 3}).json()
+    assert data["success"] is True
+    assert data["stats"]["frames"] == 3
+    assert len(data["tracks"]) >= 1
+    assert len({track["track_id"] for track in data["tracks"]}) == len(data["tracks"])
+
+
+def test_track_endpoint_limits_frames():
+    from app.main import MAX_TRACK_FRAMES
+
+    response = client.post("/detection/track", json={"frames_base64": ["x"] * (MAX_TRACK_FRAMES + 1)})
+    assert response.status_code == 422
+    assert client.post("/detection/track", json={"frames_base64": []}).status_code == 422
+
+
+def test_track_endpoint_reports_bad_frame():
+    data = client.post("/detection/track", json={"frames_base64": [_frame_base64(), "!!!"]}).json()
+    assert data["success"] is False
+    assert data["error"].startswith("Frame 1:")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Бенчмарк клиента ML API против локального экземпляра
+
+Сравниваются способы отправить одни и те же изображения:
+  - naive        - httpx.post на каждое изображение, новое соединение, без
+                   повторов (как requests.post в интеграциях);
+  - pooled       - DetectionClient.detect по одному, общий пул соединений;
+  - batched      - DetectionClient.detect_many: пакеты, gzip, конкурентность;
+  - async        - AsyncDetectionClient.detect_many с теми же параметрами.
+
+Без --url запускается uvicorn с api/ на свободном порту (--workers процессов).
+
+Пример (из каталога client/):
+    python benchmarks/bench_client.py --images 200 --workers 2
+    python benchmarks/bench_client.py --url http://localhost:8001 --images 500
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(os.path.dirname(CLIENT_DIR), "api")
+sys.path.insert(0, CLIENT_DIR)
+
+import httpx  # noqa: E402
+
+from traffic_sign_client import AsyncDetectionClient, DetectionClient  # noqa: E402
+
+
+def make_images(count, width, height):
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        # Градиент с шумом: размер JPEG как у фотографии, а не однотонной заливки
+        row = np.linspace(0, 255, width, dtype=np.float32)
+        pixels = np.empty((height, width, 3), dtype=np.uint8)
+        pixels[...] = row[None, :, None]
+        pixels += rng.integers(0, 30, (height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(workers):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=API_DIR, env=dict(os.environ, MODEL_LOAD="startup"),
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + "/ready").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("ML API did not become ready")
+
+
+def naive(url, images, args):
+    for image in images:
+        response = httpx.post(url + "/detection/detect", timeout=60,
+                              json={"image_base64": base64.b64encode(image).decode()})
+        response.raise_for_status()
+
+
+def pooled(url, images, args):
+    with DetectionClient(url, max_concurrency=1) as client:
+        for image in images:
+            client.detect(image)
+
+
+def batched(url, images, args):
+    with DetectionClient(url, batch_size=args.batch_size, max_concurrency=args.concurrency) as client:
+        client.detect_many(images)
+
+
+def async_batched(url, images, args):
+    async def run():
+        async with AsyncDetectionClient(url, batch_size=args.batch_size, max_concurrency=args.concurrency) as client:
+            await client.detect_many(images)
+    asyncio.run(run())
+
+
+MODES = [("naive", naive), ("pooled", pooled), ("batched", batched), ("async", async_batched)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="работающий ML API (по умолчанию запускается локальный)")
+    parser.add_argument("--workers", type=int, default=2, help="процессов uvicorn локального API")
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 480], metavar=("W", "H"))
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    images = make_images(args.images, *args.size)
+    process, url = (None, args.url) if args.url else start_api(args.workers)
+    try:
+        print(f"{args.images} JPEG {args.size[0]}x{args.size[1]} "
+              f"(~{sum(map(len, images)) / len(images) / 1024:.0f} КБ), {url}")
+        print(f"{'режим':<10}{'время, с':>10}{'изобр./с':>10}{'ускорение':>11}")
+        baseline = None
+        for name, run in MODES:
+            start = time.perf_counter()
+            run(url, images, args)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{name:<10}{elapsed:>10.2f}{args.images / elapsed:>10.1f}{baseline / elapsed:>10.1f}x")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
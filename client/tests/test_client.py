@@ -0,0 +1,156 @@
+"""
+Тесты клиента ML API на подменённом транспорте httpx
+"""
+import asyncio
+import base64
+import gzip
+import json
+
+import httpx
+import pytest
+
+from traffic_sign_client import AsyncDetectionClient, DetectionClient, DetectionError, RetryPolicy
+
+NO_WAIT = RetryPolicy(max_retries=3, backoff=0, max_backoff=0)
+
+
+class FakeAPI:
+    """Минимальный ML API: детекция возвращает размер изображения как sign_id"""
+
+    def __init__(self, batch=True, failures=(), max_batch=None):
+        self.batch = batch
+        self.failures = list(failures)  # статусы первых ответов
+        self.max_batch = max_batch
+        self.requests = []
+
+    def __call__(self, request):
+        body = request.content
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        self.requests.append((request.url.path, request.headers.get("content-encoding"), payload))
+        if self.failures:
+            return httpx.Response(self.failures.pop(0), headers={"Retry-After": "0"}, json={"success": False})
+        if request.url.path == "/detection/detect":
+            if not payload["image_base64"]:
+                return httpx.Response(200, json={"success": False, "error": "Invalid base64 image data"})
+            return httpx.Response(200, json={"success": True, "results": self._detect(payload["image_base64"]),
+                                             "model_version": "1.0.0"})
+        if not self.batch:
+            return httpx.Response(404, json={"detail": "Not Found"})
+        images = payload["images_base64"]
+        if self.max_batch and len(images) > self.max_batch:
+            return httpx.Response(413, json={"success": False, "error": "Request body too large"})
+        if any(not image for image in images):
+            return httpx.Response(200, json={"success": False, "error": "Image 0: Invalid base64 image data"})
+        return httpx.Response(200, json={"success": True, "format": "rows", "model_version": "1.0.0",
+                                         "results": [self._detect(image) for image in images]})
+
+    @staticmethod
+    def _detect(image_base64):
+        return [{"sign_id": len(base64.b64decode(image_base64)), "confidence": 0.9}]
+
+
+def make_client(api, **kwargs):
+    return DetectionClient("http://api", transport=httpx.MockTransport(api), retry=NO_WAIT, **kwargs)
+
+
+def images(count):
+    return [b"x" * (i + 1) for i in range(count)]
+
+
+def sign_ids(results):
+    return [result["results"][0]["sign_id"] for result in results]
+
+
+def test_detect_many_batches_and_keeps_order():
+    api = FakeAPI()
+    with make_client(api, batch_size=4, max_concurrency=3) as client:
+        results = client.detect_many(images(10))
+    assert sign_ids(results) == list(range(1, 11))
+    assert sorted(len(payload["images_base64"]) for _, _, payload in api.requests) == [2, 4, 4]
+    assert client.batch_supported is True
+
+
+def test_falls_back_to_single_requests_without_batch_endpoint():
+    api = FakeAPI(batch=False)
+    with make_client(api, batch_size=4, max_concurrency=1) as client:
+        assert sign_ids(client.detect_many(images(6))) == list(range(1, 7))
+        assert client.batch_supported is False
+        paths = [path for path, _, _ in api.requests]
+        assert paths[0] == "/detection/detect/batch"
+        assert paths[1:] == ["/detection/detect"] * 6
+
+
+def test_oversized_batch_is_split():
+    api = FakeAPI(max_batch=2)
+    with make_client(api, batch_size=8, max_concurrency=1) as client:
+        assert sign_ids(client.detect_many(images(8))) == list(range(1, 9))
+
+
+def test_large_bodies_are_gzipped():
+    api = FakeAPI()
+    with make_client(api, compress_min_bytes=100) as client:
+        client.detect(b"small")
+        client.detect(b"\0" * 1000)
+    assert [encoding for _, encoding, _ in api.requests] == [None, "gzip"]
+
+
+def test_retries_on_429_and_503():
+    api = FakeAPI(failures=[429, 503])
+    with make_client(api) as client:
+        assert sign_ids([client.detect(b"abc")]) == [3]
+    assert len(api.requests) == 3
+
+    api = FakeAPI(failures=[503] * 5)
+    with make_client(api) as client, pytest.raises(DetectionError) as error:
+        client.detect(b"abc")
+    assert error.value.status_code == 503
+    assert len(api.requests) == 4  # 1 + max_retries
+
+
+def test_retry_delay_is_jittered_and_honours_retry_after():
+    policy = RetryPolicy(backoff=0.1, max_backoff=1.0)
+    delays = [policy.delay(3) for _ in range(50)]
+    assert all(0 <= delay <= 0.8 for delay in delays) and len(set(delays)) > 1
+    assert policy.delay(0, retry_after="0.5") >= 0.5
+    assert policy.delay(0, retry_after="60") == 1.0
+
+
+def test_return_exceptions_isolates_bad_images():
+    api = FakeAPI()
+    with make_client(api, batch_size=4) as client:
+        results = client.detect_many([b"ab", b"", b"abcd"], return_exceptions=True)
+        assert sign_ids([results[0], results[2]]) == [2, 4]
+        assert isinstance(results[1], DetectionError)
+        with pytest.raises(DetectionError):
+            client.detect_many([b"ab", b""])
+
+
+def test_options_unsupported_by_batch_endpoint_use_single_requests():
+    api = FakeAPI()
+    with make_client(api) as client:
+        client.detect_many(images(3), tiled=True)
+    assert {path for path, _, _ in api.requests} == {"/detection/detect"}
+    assert all(payload["tiled"] is True for _, _, payload in api.requests)
+
+
+def test_async_client_bounds_concurrency():
+    api = FakeAPI()
+    active, peak = 0, 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return api(request)
+
+    async def scenario():
+        async with AsyncDetectionClient("http://api", transport=httpx.MockTransport(handler), retry=NO_WAIT,
+                                        batch_size=2, max_concurrency=3) as client:
+            return await client.detect_many(images(20))
+
+    assert sign_ids(asyncio.run(scenario())) == list(range(1, 21))
+    assert peak == 3
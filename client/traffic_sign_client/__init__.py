@@ -0,0 +1,14 @@
+"""
+Клиент ML API распознавания дорожных знаков
+
+Синхронный (DetectionClient) и asyncio (AsyncDetectionClient) клиенты:
+пул соединений, автоматические пакеты, gzip тел запросов, ограничение
+конкурентности и повторы с backoff на 429/503.
+"""
+from .aio import AsyncDetectionClient
+from .common import DetectionError, RetryPolicy
+from .sync import DetectionClient
+
+__version__ = "1.0.0"
+
+__all__ = ["AsyncDetectionClient", "DetectionClient", "DetectionError", "RetryPolicy"]
@@ -0,0 +1,88 @@
+"""
+Асинхронный (asyncio) клиент ML API
+"""
+import asyncio
+
+import httpx
+
+from .common import (
+    DETECT_PATH, RETRY_ERRORS, DetectionError, RetryPolicy, detect_flow, encode_body, encode_image, parse_single,
+    plan_requests,
+)
+
+
+class AsyncDetectionClient:
+    """
+    Асинхронный вариант DetectionClient с теми же параметрами.
+
+        async with AsyncDetectionClient("http://localhost:8001") as client:
+            results = await client.detect_many(images)
+    """
+
+    def __init__(self, base_url="http://localhost:8001", timeout=60.0, batch_size=16, max_concurrency=4,
+                 compress_min_bytes=1024, compress_level=1, retry=None, transport=None):
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+        self.retry = retry or RetryPolicy()
+        self.batch_supported = None
+        self._client = httpx.AsyncClient(
+            base_url=base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def detect(self, image, **options):
+        """Одно изображение (bytes, путь или файл) -> {"results": [...], "model_version": ...}"""
+        response = await self._post(DETECT_PATH, {"image_base64": encode_image(image), **options})
+        return parse_single(response)
+
+    async def detect_many(self, images, return_exceptions=False, **options):
+        """Список изображений -> список результатов в том же порядке (см. DetectionClient.detect_many)"""
+        images = list(images)
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def limited(indices):
+            async with semaphore:
+                return await self._detect_indices(images, indices, options, return_exceptions)
+
+        requests = plan_requests(len(images), options, self.batch_size, self.batch_supported)
+        parts = await asyncio.gather(*(limited(indices) for indices in requests))
+        return [result for part in parts for result in part]
+
+    async def _detect_indices(self, images, indices, options, return_exceptions):
+        flow = detect_flow(self, images, indices, options, return_exceptions)
+        outcome, failed = None, False
+        while True:
+            try:
+                path, payload = flow.throw(outcome) if failed else flow.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                outcome, failed = await self._post(path, payload), False
+            except DetectionError as e:
+                outcome, failed = e, True
+
+    async def _post(self, path, payload):
+        body, headers = encode_body(payload, self.compress_min_bytes, self.compress_level)
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.post(path, content=body, headers=headers)
+            except RETRY_ERRORS as e:
+                delay = self.retry.next_delay(attempt, error=e)
+            else:
+                delay = self.retry.next_delay(attempt, response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,171 @@
+"""
+Общая часть синхронного и асинхронного клиентов: тела запросов, сжатие,
+повторы с backoff и разбор ответов
+"""
+import base64
+import gzip
+import json
+import os
+import random
+
+import httpx
+
+# Ответы, после которых запрос повторяется: сервер перегружен или ограничивает частоту
+RETRY_STATUSES = (429, 503)
+# Обрыв соединения (в т.ч. закрытое сервером keep-alive соединение); таймауты
+# не повторяются, чтобы не умножать нагрузку на перегруженный сервер
+RETRY_ERRORS = (httpx.NetworkError, httpx.RemoteProtocolError)
+
+DETECT_PATH = "/detection/detect"
+BATCH_PATH = "/detection/detect/batch"
+
+# Параметры, которые понимает пакетный endpoint; с остальными (tiled, tile_*)
+# изображения отправляются по одному
+BATCH_OPTIONS = {"user_id", "cascade", "cascade_thresholds"}
+
+
+class DetectionError(Exception):
+    """API вернул ошибку или success=False"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def read_image(image):
+    """bytes, путь к файлу или файловый объект -> bytes"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            return f.read()
+    return image.read()
+
+
+def encode_image(image):
+    return base64.b64encode(read_image(image)).decode("ascii")
+
+
+def plan_requests(count, options, batch_size, batch_supported):
+    """
+    Индексы изображений по запросам: пакеты по batch_size или по одному,
+    если пакетный endpoint не поддерживается или не принимает options
+    """
+    indices = list(range(count))
+    if batch_supported is False or batch_size <= 1 or not set(options) <= BATCH_OPTIONS:
+        batch_size = 1
+    return [indices[start:start + batch_size] for start in range(0, count, batch_size)]
+
+
+def encode_body(payload, compress_min_bytes, compress_level):
+    """
+    JSON тело запроса и заголовки; тела от compress_min_bytes сжимаются gzip.
+
+    base64 JPEG сжимается примерно на четверть (base64 раздувает байты на 1/3),
+    PNG и несжатые форматы - сильнее.
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Content-Type": "application/json"}
+    if compress_min_bytes is not None and len(body) >= compress_min_bytes:
+        body = gzip.compress(body, compresslevel=compress_level)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+class RetryPolicy:
+    """
+    Повторы на 429/503 и ошибках соединения с экспоненциальным backoff
+    и full jitter; Retry-After сервера задаёт нижнюю границу паузы
+    """
+
+    def __init__(self, max_retries=4, backoff=0.1, max_backoff=5.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def next_delay(self, attempt, response=None, error=None):
+        """
+        Пауза перед повтором попытки attempt или None - ответ возвращается
+        как есть. Ошибка соединения после последней попытки становится
+        DetectionError.
+        """
+        if error is not None:
+            if attempt >= self.max_retries:
+                raise DetectionError(f"{type(error).__name__}: {error}") from error
+            return self.delay(attempt)
+        if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        return self.delay(attempt, response.headers.get("Retry-After"))
+
+    def delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        return delay
+
+
+def detect_flow(client, images, indices, options, return_exceptions):
+    """
+    Детекция изображений indices без ввода-вывода - общая логика
+    DetectionClient и AsyncDetectionClient.
+
+    Генератор отдаёт запросы (path, payload) и получает на них httpx.Response;
+    ошибку запроса (DetectionError) клиент передаёт в него через throw().
+    Возвращает результаты по изображениям. Пакет, на который сервер ответил
+    413, делится пополам; на 404/405 пакетного endpoint нет
+    (client.batch_supported = False), и изображения уходят по одному.
+    """
+    if len(indices) > 1 and client.batch_supported is not False:
+        payload = {"images_base64": [encode_image(images[i]) for i in indices], "format": "rows", **options}
+        try:
+            results = parse_batch((yield BATCH_PATH, payload), len(indices))
+            client.batch_supported = True
+            return results
+        except DetectionError as e:
+            if e.status_code in (404, 405):
+                client.batch_supported = False
+            elif e.status_code == 413:
+                # Пакет больше лимита тела запроса - делим пополам
+                middle = len(indices) // 2
+                return ((yield from detect_flow(client, images, indices[:middle], options, return_exceptions))
+                        + (yield from detect_flow(client, images, indices[middle:], options, return_exceptions)))
+            elif not return_exceptions:
+                raise
+
+    results = []
+    for i in indices:
+        try:
+            results.append(parse_single((yield DETECT_PATH, {"image_base64": encode_image(images[i]), **options})))
+        except DetectionError as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+def parse_single(response):
+    """Ответ /detection/detect -> {"results": [...], "model_version": ...}"""
+    data = _json(response)
+    return {"results": data["results"], "model_version": data.get("model_version")}
+
+
+def parse_batch(response, count):
+    """Ответ пакетного endpoint (format=rows) -> список результатов по изображениям"""
+    data = _json(response)
+    if len(data["results"]) != count:
+        raise DetectionError(f"Batch response has {len(data['results'])} results for {count} images")
+    return [{"results": rows, "model_version": data.get("model_version")} for rows in data["results"]]
+
+
+def _json(response):
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code >= 400 or not data.get("success"):
+        error = data.get("error") or f"HTTP {response.status_code}"
+        raise DetectionError(error, status_code=response.status_code)
+    return data
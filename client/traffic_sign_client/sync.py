@@ -0,0 +1,101 @@
+"""
+Синхронный клиент ML API
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from .common import (
+    DETECT_PATH, RETRY_ERRORS, DetectionError, RetryPolicy, detect_flow, encode_body, encode_image, parse_single,
+    plan_requests,
+)
+
+
+class DetectionClient:
+    """
+    Клиент /detection/detect с пулом соединений.
+
+    detect_many() отправляет изображения пакетами по batch_size на пакетный
+    endpoint (если сервер его не знает - по одному), не больше
+    max_concurrency запросов одновременно; тела от compress_min_bytes
+    сжимаются gzip (None - без сжатия), 429/503 и обрывы соединения
+    повторяются по retry (RetryPolicy).
+
+        with DetectionClient("http://localhost:8001") as client:
+            results = client.detect_many(["a.jpg", "b.jpg"])
+    """
+
+    def __init__(self, base_url="http://localhost:8001", timeout=60.0, batch_size=16, max_concurrency=4,
+                 compress_min_bytes=1024, compress_level=1, retry=None, transport=None):
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+        self.retry = retry or RetryPolicy()
+        # None - ещё не известно, есть ли у сервера пакетный endpoint
+        self.batch_supported = None
+        self._client = httpx.Client(
+            base_url=base_url, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._client.close()
+
+    def detect(self, image, **options):
+        """Одно изображение (bytes, путь или файл) -> {"results": [...], "model_version": ...}"""
+        response = self._post(DETECT_PATH, {"image_base64": encode_image(image), **options})
+        return parse_single(response)
+
+    def detect_many(self, images, return_exceptions=False, **options):
+        """
+        Список изображений -> список результатов в том же порядке.
+
+        С return_exceptions=True ошибка изображения возвращается на его месте
+        как DetectionError, остальные изображения обрабатываются.
+        """
+        images = list(images)
+        requests = plan_requests(len(images), options, self.batch_size, self.batch_supported)
+        if len(requests) <= 1 or self.max_concurrency <= 1:
+            parts = [self._detect_indices(images, indices, options, return_exceptions) for indices in requests]
+        else:
+            with ThreadPoolExecutor(min(self.max_concurrency, len(requests))) as pool:
+                parts = list(pool.map(
+                    lambda indices: self._detect_indices(images, indices, options, return_exceptions), requests,
+                ))
+        return [result for part in parts for result in part]
+
+    def _detect_indices(self, images, indices, options, return_exceptions):
+        flow = detect_flow(self, images, indices, options, return_exceptions)
+        outcome, failed = None, False
+        while True:
+            try:
+                path, payload = flow.throw(outcome) if failed else flow.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                outcome, failed = self._post(path, payload), False
+            except DetectionError as e:
+                outcome, failed = e, True
+
+    def _post(self, path, payload):
+        body, headers = encode_body(payload, self.compress_min_bytes, self.compress_level)
+        attempt = 0
+        while True:
+            try:
+                response = self._client.post(path, content=body, headers=headers)
+            except RETRY_ERRORS as e:
+                delay = self.retry.next_delay(attempt, error=e)
+            else:
+                delay = self.retry.next_delay(attempt, response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Бенчмарк: сколько одновременных запросов выдерживает Django под WSGI и под ASGI
+
+По умолчанию поднимает оба сервера сам (runserver для WSGI, uvicorn для ASGI)
+и нагружает эндпоинт проверки статуса задачи. Нужен запущенный Redis
+(CELERY_RESULT_BACKEND), иначе запросы будут завершаться ошибкой.
+
+Пример:
+    python benchmarks/bench_asgi_wsgi.py --concurrency 50 --requests 2000
+    python benchmarks/bench_asgi_wsgi.py --wsgi-url http://localhost:8000 --asgi-url http://localhost:8002
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(mode, port):
+    """Запускает Django в нужном режиме и ждёт, пока он начнёт отвечать"""
+    env = dict(os.environ, DJANGO_SERVER_MODE=mode)
+    if mode == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'traffic_sign_app.asgi:application',
+               '--port', str(port), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+    process = subprocess.Popen(cmd, cwd=WEB_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            httpx.get(url + '/', timeout=1.0)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{mode} сервер не запустился на порту {port}')
+
+
+async def run_load(url, path, concurrency, total):
+    """Гоняет total запросов с заданной конкурентностью, возвращает статистику"""
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker(client):
+        nonlocal errors
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.get(path.format(i=i))
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/check-task/bench-{i}/', help='путь запроса, {i} - номер запроса')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--wsgi-url', help='уже запущенный WSGI сервер')
+    parser.add_argument('--asgi-url', help='уже запущенный ASGI сервер')
+    args = parser.parse_args()
+
+    targets = [('wsgi', args.wsgi_url, 8101), ('asgi', args.asgi_url, 8102)]
+
+    print('=' * 60)
+    print(f'WSGI vs ASGI: {args.requests} запросов, конкурентность {args.concurrency}')
+    print('=' * 60)
+    for mode, url, port in targets:
+        process = None
+        if url is None:
+            process, url = start_server(mode, port)
+        try:
+            stats = asyncio.run(run_load(url, args.path, args.concurrency, args.requests))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        print(f"{mode.upper():5} {stats['rps']:8.1f} req/s   p50 {stats['p50']:7.1f} ms   "
+              f"p95 {stats['p95']:7.1f} ms   ошибок: {stats['errors']}")
+
+
+if __name__ == '__main__':
+    main()
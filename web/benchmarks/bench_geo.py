@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Бенчмарк пространственных запросов по детекциям
+
+Заполняет отдельную SQLite базу (по умолчанию миллион детекций, точки по
+области ~100x100 км) и сравнивает запросы «в радиусе» и «в прямоугольнике»
+через индекс geohash с фильтром только по latitude/longitude (полный скан).
+
+Пример:
+    python benchmarks/bench_geo.py --rows 1000000 --queries 200
+    python benchmarks/bench_geo.py --db /tmp/geo.sqlite3 --reuse
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'traffic_sign_app.settings')
+
+CENTER = (55.75, 37.62)
+SPREAD = 0.45  # градусы широты вокруг центра
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_path}
+    django.setup()
+
+
+def populate(rows, batch_size=20000):
+    from django.core.management import call_command
+    from traffic_signs.geo import location_fields
+    from traffic_signs.models import DetectionResult, TrafficSign
+
+    call_command('migrate', verbosity=0)
+    signs = [TrafficSign.objects.create(name=f'Sign {i}', sign_type='other') for i in range(5)]
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        DetectionResult.objects.bulk_create([
+            DetectionResult(
+                image='bench.jpg', sign=rng.choice(signs), confidence=0.9,
+                **location_fields(CENTER[0] + rng.uniform(-SPREAD, SPREAD),
+                                  CENTER[1] + rng.uniform(-SPREAD * 1.8, SPREAD * 1.8)),
+            )
+            for _ in range(min(batch_size, rows - offset))
+        ])
+    print(f'Вставлено {rows} строк за {time.perf_counter() - start:.1f} с')
+
+
+def timed(fn, points):
+    latencies = []
+    found = 0
+    for point in points:
+        start = time.perf_counter()
+        found += fn(*point)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        'avg_found': round(found / len(points), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=200.0, help='радиус, метры')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'bench_geo.sqlite3'))
+    parser.add_argument('--reuse', action='store_true', help='не пересоздавать базу')
+    args = parser.parse_args()
+
+    if not args.reuse and os.path.exists(args.db):
+        os.remove(args.db)
+    setup_django(args.db)
+    if not args.reuse:
+        populate(args.rows)
+
+    from traffic_signs import geo
+    from traffic_signs.models import DetectionResult
+
+    rng = random.Random(7)
+    points = [(CENTER[0] + rng.uniform(-SPREAD, SPREAD), CENTER[1] + rng.uniform(-SPREAD, SPREAD))
+              for _ in range(args.queries)]
+
+    def nearby_indexed(lat, lon):
+        rows, _ = geo.nearby_page(lat, lon, args.radius, limit=500)
+        return len(rows)
+
+    def nearby_scan(lat, lon):
+        min_lat, min_lon, max_lat, max_lon = geo.radius_bbox(lat, lon, args.radius)
+        candidates = DetectionResult.objects.filter(
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon),
+        ).values_list('latitude', 'longitude')
+        return sum(1 for a, b in candidates if geo.haversine_m(lat, lon, a, b) <= args.radius)
+
+    def bbox_indexed(lat, lon):
+        return geo.bbox_queryset(lat, lon, lat + 0.01, lon + 0.02).count()
+
+    def bbox_scan(lat, lon):
+        return DetectionResult.objects.filter(
+            latitude__range=(lat, lat + 0.01), longitude__range=(lon, lon + 0.02)).count()
+
+    print(f'{"запрос":<24}{"p50, мс":>10}{"p95, мс":>10}{"найдено":>10}')
+    for name, fn in [('radius / geohash', nearby_indexed), ('radius / full scan', nearby_scan),
+                     ('bbox / geohash', bbox_indexed), ('bbox / full scan', bbox_scan)]:
+        stats = timed(fn, points)
+        print(f'{name:<24}{stats["p50_ms"]:>10}{stats["p95_ms"]:>10}{stats["avg_found"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
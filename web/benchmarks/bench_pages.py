@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Бенчмарк рендеринга страниц с кэшем и без
+
+Заполняет отдельную SQLite базу (знаки и детекции) и через тестовый клиент
+Django замеряет запросы в секунду для home, api_docs, results и upload
+(GET) дважды: без кэша (DummyCache - поведение до CACHES) и с кэшем
+(память процесса или Redis из --cache-url). Доля обращений, после которых
+меняются детекции (--write-ratio), показывает цену инвалидации фрагмента.
+
+Пример:
+    python benchmarks/bench_pages.py --requests 500
+    python benchmarks/bench_pages.py --cache-url redis://localhost:6379/1 --write-ratio 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'traffic_sign_app.settings')
+
+PAGES = ['home', 'api_docs', 'results', 'upload']
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_path}
+    settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    settings.ALLOWED_HOSTS = ['*']
+    django.setup()
+
+
+def populate(rows):
+    from django.core.management import call_command
+    from traffic_signs.models import DetectionResult, TrafficSign
+
+    call_command('migrate', verbosity=0)
+    signs = [TrafficSign.objects.create(name=f'Sign {i}', sign_type='other') for i in range(20)]
+    rng = random.Random(42)
+    DetectionResult.objects.bulk_create([
+        DetectionResult(image=f'detections/bench_{i}.jpg', sign=rng.choice(signs), confidence=0.9)
+        for i in range(rows)
+    ], batch_size=5000)
+    return signs
+
+
+def measure(client, page, requests, write_ratio, sign):
+    from django.urls import reverse
+    from traffic_signs.models import DetectionResult
+
+    url = reverse(f'traffic_signs:{page}')
+    rng = random.Random(7)
+    client.get(url)  # прогрев
+    start = time.perf_counter()
+    for _ in range(requests):
+        if write_ratio and rng.random() < write_ratio:
+            DetectionResult.objects.create(image='detections/new.jpg', sign=sign, confidence=0.8)
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='детекций в базе')
+    parser.add_argument('--requests', type=int, default=300, help='запросов на страницу')
+    parser.add_argument('--write-ratio', type=float, default=0.0, help='доля запросов с новой детекцией')
+    parser.add_argument('--cache-url', help='Redis для кэша (по умолчанию память процесса)')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'bench_pages.sqlite3'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    setup_django(args.db)
+    signs = populate(args.rows)
+
+    from django.core.cache import cache
+    from django.test import Client, override_settings
+
+    cached = ({'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': args.cache_url}
+              if args.cache_url else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'})
+    backends = [
+        ('без кэша', {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}),
+        ('с кэшем', cached),
+    ]
+
+    results = {}
+    for label, backend in backends:
+        with override_settings(CACHES={'default': backend}):
+            cache.clear()
+            client = Client()
+            results[label] = {page: measure(client, page, args.requests, args.write_ratio, signs[0])
+                              for page in PAGES}
+
+    print(f'{"страница":<12}' + ''.join(f'{label + ", req/s":>18}' for label, _ in backends) + f'{"ускорение":>12}')
+    for page in PAGES:
+        before, after = (results[label][page] for label, _ in backends)
+        print(f'{page:<12}{before:>18.0f}{after:>18.0f}{after / before:>11.1f}x')
+
+
+if __name__ == '__main__':
+    main()
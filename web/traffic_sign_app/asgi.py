@@ -0,0 +1,23 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'traffic_sign_app.settings')
+
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core.asgi import get_asgi_application
+from django.views.static import serve
+
+
+class StaticRootHandler(ASGIStaticFilesHandler):
+    """
+    Статика из STATIC_ROOT (после collectstatic, имена с хэшем) мимо
+    цепочки middleware - вместо WhiteNoise, который под ASGI синхронный.
+    """
+
+    def serve(self, request):
+        return serve(request, self.file_path(request.path), document_root=settings.STATIC_ROOT)
+
+
+application = get_asgi_application()
+if settings.SERVER_MODE == 'asgi':
+    application = StaticRootHandler(application)
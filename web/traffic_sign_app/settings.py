@@ -4,6 +4,10 @@ Django settings for traffic_sign_app project.
 import os
 from pathlib import Path
 
+from kombu import Queue
+
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TRAFFIC_SIGNS_DIR = os.path.join(BASE_DIR, 'traffic_signs')
@@ -38,7 +42,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
 ROOT_URLCONF = 'traffic_sign_app.urls'
@@ -60,20 +63,35 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'traffic_sign_app.wsgi.application'
+ASGI_APPLICATION = 'traffic_sign_app.asgi.application'
+
+# Режим сервера: 'wsgi' (runserver/gunicorn) или 'asgi' (uvicorn).
+# В режиме asgi основные view подключаются в асинхронных версиях.
+SERVER_MODE = os.environ.get('DJANGO_SERVER_MODE', 'wsgi')
+
+# WhiteNoise - только синхронное middleware: под ASGI вся цепочка ушла бы
+# в sync_to_async. Там статику отдаёт обёртка в asgi.py до цепочки middleware.
+if SERVER_MODE != 'asgi':
+    MIDDLEWARE.append('whitenoise.middleware.WhiteNoiseMiddleware')
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DATABASE_URL (docker-compose: Postgres), без него - SQLite (см. database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        'USER': 'traffic_sign_user',
-        'PASSWORD': 'traffic_sign_password',
-        'HOST': 'localhost',  # Имя сервиса в docker-compose
-        'PORT': '5432',  # Внутренний порт в контейнере
-    }
+    'default': database_config(
+        os.environ.get('DATABASE_URL', ''),
+        default_sqlite_path=os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами (и задачами Celery) до CONN_MAX_AGE секунд.
+        # Под ASGI запросы обслуживаются в разных потоках sync_to_async, и постоянные
+        # соединения копились бы по одному на поток - там они отключены
+        conn_max_age=0 if SERVER_MODE == 'asgi' else int(os.environ.get('CONN_MAX_AGE', 60)),
+        conn_health_checks=os.environ.get('CONN_HEALTH_CHECKS', '1') == '1',
+        sqlite_busy_timeout=float(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+    )
 }
+# WAL для SQLite (одноузловой запуск и тесты): чтение не блокирует запись
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -117,17 +135,97 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кэш: Redis из CACHE_URL (docker-compose), без него - память процесса
+# (тесты, локальный запуск). Страницы без пользовательских данных кэшируются
+# целиком, список последних детекций - фрагментом (traffic_signs/caching.py)
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'traffic_signs',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 10 * 60))  # секунды
+RECENT_DETECTIONS_CACHE_TIMEOUT = int(os.environ.get('RECENT_DETECTIONS_CACHE_TIMEOUT', 60))  # секунды
+
+# ML API (FastAPI сервис детекции)
+ML_API_URL = os.environ.get('ML_API_URL', 'http://api:8001')
+ML_API_TIMEOUT = float(os.environ.get('ML_API_TIMEOUT', '60'))  # секунды
+# Каскадный режим: неуверенные детекции перепроверяет тяжёлый классификатор,
+# пороги по знакам берутся из TrafficSign.escalation_threshold
+ML_CASCADE = os.environ.get('ML_CASCADE', '0') == '1'
+# Видео до ML_TRACK_MAX_FRAMES кадров уходит одним запросом /detection/track
+# (не больше MAX_TRACK_FRAMES API); длинное - покадрово через /detection/stream,
+# при переходе потока на другой воркер API он начинается заново, не больше
+# ML_STREAM_RESTARTS раз
+ML_TRACK_MAX_FRAMES = int(os.environ.get('ML_TRACK_MAX_FRAMES', '300'))
+ML_STREAM_RESTARTS = int(os.environ.get('ML_STREAM_RESTARTS', '3'))
+
+# Быстрый режим админки DetectionResult для больших таблиц: оценка числа
+# строк вместо COUNT(*), пагинация по ключу, поиск по индексам
+ADMIN_FAST_MODE = os.environ.get('ADMIN_FAST_MODE', '1') == '1'
+
 # Celery settings
-CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
+
+# Очереди: интерактивные загрузки и пакетные прогоны обслуживаются
+# разными воркерами (traffic_signs.queues, docker-compose.yml)
+CELERY_TASK_QUEUES = (
+    Queue('interactive', routing_key='interactive'),
+    Queue('bulk', routing_key='bulk'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'interactive'
+CELERY_TASK_ROUTES = {
+    'traffic_signs.tasks.process_image_task': {'queue': 'interactive'},
+    'traffic_signs.tasks.process_video_frames_task': {'queue': 'bulk'},
+    'traffic_signs.tasks.compact_task_results': {'queue': 'bulk'},
+    'traffic_signs.tasks.backfill_task': {'queue': 'bulk'},
+    'traffic_signs.tasks.maintain_detection_partitions': {'queue': 'bulk'},
+}
+# Воркер берёт по одной задаче за раз: длинные задачи не скапливаются
+# в prefetch-буфере одного процесса, пока другие простаивают
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+CELERY_TASK_ACKS_LATE = True
+
+# Хранение результатов: TTL в Redis и периодический перенос в DetectionResult
+CELERY_RESULT_EXPIRES = int(os.environ.get('CELERY_RESULT_EXPIRES', 24 * 3600))  # секунды
+RESULT_COMPACTION_MIN_AGE = int(os.environ.get('RESULT_COMPACTION_MIN_AGE', 10 * 60))  # секунды
+RESULT_COMPACTION_INTERVAL = int(os.environ.get('RESULT_COMPACTION_INTERVAL', 5 * 60))  # секунды
+# Помесячные секции DetectionResult (traffic_signs.partitions): секции создаются
+# на DETECTION_PARTITIONS_AHEAD месяцев вперёд, месяцы старше
+# DETECTION_RETENTION_DAYS удаляются вместе с файлами (0 - хранить всё)
+DETECTION_PARTITIONS_AHEAD = int(os.environ.get('DETECTION_PARTITIONS_AHEAD', 3))
+DETECTION_RETENTION_DAYS = int(os.environ.get('DETECTION_RETENTION_DAYS', 0))
+PARTITION_MAINTENANCE_INTERVAL = int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL', 6 * 3600))  # секунды
+CELERY_BEAT_SCHEDULE = {
+    'compact-task-results': {
+        'task': 'traffic_signs.tasks.compact_task_results',
+        'schedule': RESULT_COMPACTION_INTERVAL,
+    },
+    'maintain-detection-partitions': {
+        'task': 'traffic_signs.tasks.maintain_detection_partitions',
+        'schedule': PARTITION_MAINTENANCE_INTERVAL,
+    },
+}
+
+# Кэш сводки нагрузки воркеров (queues/load/) для частого опроса автоскейлером
+LOAD_METRICS_TTL = float(os.environ.get('LOAD_METRICS_TTL', '1.0'))  # секунды
+
+# Пакетная проверка статусов задач (check-tasks/)
+TASK_STATUS_CACHE_TTL = float(os.environ.get('TASK_STATUS_CACHE_TTL', '1.0'))  # секунды
+TASK_STATUS_BULK_LIMIT = 500
@@ -1,20 +1,192 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import TrafficSign, DetectionResult
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import BackfillRun, TrafficSign, DetectionResult
+from .result_codec import sign_catalog
 
 @admin.register(TrafficSign)
 class TrafficSignAdmin(admin.ModelAdmin):
-    list_display = ['name', 'sign_type', 'created_at']
+    list_display = ['name', 'sign_type', 'model_sign_id', 'escalation_threshold', 'created_at']
     list_filter = ['sign_type']
     search_fields = ['name', 'description']
     ordering = ['name']
 
-@admin.register(DetectionResult)
+@admin.register(BackfillRun)
+class BackfillRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'target_version', 'status', 'processed', 'skipped', 'failed', 'cursor', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['cursor', 'processed', 'skipped', 'failed', 'failures_in_row', 'last_error',
+                       'created_at', 'updated_at']
+
 class DetectionResultAdmin(admin.ModelAdmin):
     list_display = ['sign', 'confidence', 'detected_at', 'user']
     list_filter = ['sign', 'detected_at']
     search_fields = ['sign__name']
     date_hierarchy = 'detected_at'
     readonly_fields = ['detected_at']
-    
+
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('sign', 'user')
+
+
+# --- Быстрый режим для таблиц в миллионы строк (ADMIN_FAST_MODE) ---
+
+# До скольких строк отфильтрованная выборка считается точно
+EXACT_COUNT_LIMIT = 10000
+AFTER_VAR = 'after'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator без полного COUNT(*).
+
+    Без фильтров число строк берётся из статистики БД (pg_class.reltuples
+    на Postgres, MAX(id) на остальных), с фильтрами считается не дальше
+    EXACT_COUNT_LIMIT строк.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_table_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[:EXACT_COUNT_LIMIT].count()
+
+
+def estimated_table_count(model, using='default'):
+    """Приблизительное число строк таблицы без её сканирования"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+            # У секционированной таблицы статистика хранится в секциях
+            # (-1 - секция ещё не анализировалась)
+            cursor.execute('SELECT SUM(GREATEST(c.reltuples, 0))::bigint FROM pg_inherits i '
+                           'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)', [table])
+            row = cursor.fetchone()
+            if row and row[0]:
+                return row[0]
+        # MAX по первичному ключу - один шаг по индексу
+        cursor.execute(f'SELECT MAX({connection.ops.quote_name(model._meta.pk.column)}) '
+                       f'FROM {connection.ops.quote_name(table)}')
+        row = cursor.fetchone()
+    return (row[0] or 0) if row else None
+
+
+class CachedSignFilter(admin.SimpleListFilter):
+    """Фильтр по знаку: варианты из кэша каталога, без запроса к БД на каждую загрузку"""
+    title = 'Распознанный знак'
+    parameter_name = 'sign'
+
+    def lookups(self, request, model_admin):
+        return sorted(((sign_id, name) for sign_id, (name, _) in sign_catalog().items()),
+                      key=lambda item: item[1])
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(sign_id=self.value())
+        return queryset
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Список с пагинацией по ключу: ?after=<id> вместо OFFSET.
+
+    Используется для порядка по умолчанию (новые сначала, по id); при
+    сортировке по колонке - обычные страницы с оценкой числа строк.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        after = request.GET.get(AFTER_VAR, '')
+        self.keyset_after = int(after) if after.isdigit() else None
+        self.next_after = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Смена фильтров и сортировки начинает список сначала
+        if not new_params or AFTER_VAR not in new_params:
+            remove = [*(remove or []), AFTER_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def keyset_mode(self):
+        return ORDER_VAR not in self.params
+
+    def get_results(self, request):
+        if not self.keyset_mode:
+            return super().get_results(request)
+
+        queryset = self.queryset.order_by('-pk')
+        if self.keyset_after is not None:
+            queryset = queryset.filter(pk__lt=self.keyset_after)
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_after = rows[-1].pk
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = self.next_after is not None or self.keyset_after is not None
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[AFTER_VAR])
+
+    @property
+    def next_page_url(self):
+        if self.next_after is None:
+            return None
+        return self.get_query_string({AFTER_VAR: self.next_after})
+
+
+class FastDetectionResultAdmin(DetectionResultAdmin):
+    """
+    DetectionResultAdmin для больших таблиц: без date_hierarchy и полных
+    COUNT(*), фильтр знаков из кэша, пагинация по ключу, поиск по индексам.
+    """
+    list_filter = [CachedSignFilter, 'detected_at']
+    date_hierarchy = None
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_help_text = 'Название знака или ID задачи'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Название знака ищется в кэше каталога, а в таблице детекций -
+        по индексам sign_id и task_id вместо LIKE '%...%' с JOIN.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        sign_ids = [sign_id for sign_id, (name, _) in sign_catalog().items() if term.lower() in name.lower()]
+        return queryset.filter(Q(sign_id__in=sign_ids) | Q(task_id=term)), False
+
+
+admin.site.register(
+    DetectionResult,
+    FastDetectionResultAdmin if getattr(settings, 'ADMIN_FAST_MODE', True) else DetectionResultAdmin,
+)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class TrafficSignsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'traffic_signs'
+
+    def ready(self):
+        # Подключаем обработчики сигналов Celery для метрик очередей
+        from . import queues  # noqa: F401
+        # Сброс кэша фрагментов и каталога знаков при изменении моделей
+        from . import caching  # noqa: F401
+
+        # WAL и busy timeout для SQLite (traffic_sign_app/database.py)
+        from django.db.backends.signals import connection_created
+        from traffic_sign_app.database import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='configure_sqlite')
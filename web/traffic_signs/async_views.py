@@ -1,11 +1,115 @@
 """
 Асинхронные view для Django
 """
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
 from django.views import View
+from django.core.files.storage import default_storage
+from asgiref.sync import sync_to_async
 import httpx
 import asyncio
 import base64
+import random
+
+from .caching import recent_detections_context
+from .geo import location_from_exif
+from .models import TrafficSign, DetectionResult
+from .queues import INTERACTIVE_QUEUE, enqueue_detection
+from .task_status import (
+    aget_task_metas, build_status_payload, build_status_delta, expand_metas, parse_bulk_request,
+)
+
+
+async def _aget_user(request):
+    """Пользователь запроса без синхронного обращения к БД из event loop"""
+    def get_user():
+        return request.user if request.user.is_authenticated else None
+    return await sync_to_async(get_user)()
+
+
+async def async_upload_image(request):
+    """
+    Асинхронная версия upload_image (async ORM)
+
+    Шаблон рендерится в потоке (sync_to_async): список последних детекций -
+    ленивый QuerySet, который выполняется только при промахе кэша фрагмента.
+    """
+    if request.method == 'POST' and request.FILES.get('image'):
+        uploaded_file = request.FILES['image']
+
+        test_signs = [sign async for sign in TrafficSign.objects.all()]
+        if test_signs:
+            test_sign = random.choice(test_signs)
+        else:
+            test_sign = await TrafficSign.objects.acreate(
+                name='Stop Sign',
+                sign_type='regulatory',
+                description='Test stop sign'
+            )
+
+        detection = DetectionResult(
+            image=uploaded_file,
+            sign=test_sign,
+            confidence=random.uniform(0.7, 0.99),
+            user=await _aget_user(request),
+            **location_from_exif(uploaded_file)
+        )
+        await detection.asave()
+
+        return await sync_to_async(render)(request, 'traffic_signs/upload.html', {
+            'detection': detection,
+            'message': 'Image successfully processed!',
+            **recent_detections_context(),
+        })
+
+    return await sync_to_async(render)(request, 'traffic_signs/upload.html', recent_detections_context())
+
+
+async def async_celery_upload_view(request):
+    """Асинхронная версия celery_upload_view"""
+    if request.method == 'POST' and request.FILES.get('image'):
+        image = request.FILES['image']
+
+        try:
+            # Запись файла и публикация задачи блокирующие - уводим их из event loop
+            file_path = await sync_to_async(default_storage.save)(f'celery_uploads/{image.name}', image)
+            task = await sync_to_async(enqueue_detection)(
+                file_path, queue=INTERACTIVE_QUEUE, tiled=request.POST.get('tiled') == 'on')
+
+            return render(request, 'traffic_signs/celery_upload.html', {
+                'task_id': task.id,
+                'message': 'Изображение отправлено на обработку'
+            })
+
+        except Exception as e:
+            return render(request, 'traffic_signs/celery_upload.html', {
+                'error': str(e)
+            })
+
+    return render(request, 'traffic_signs/celery_upload.html')
+
+
+async def async_check_task_status(request, task_id):
+    """Асинхронная проверка статуса задачи Celery (неблокирующий запрос к Redis)"""
+    metas = await sync_to_async(expand_metas)(await aget_task_metas([task_id]))
+    return JsonResponse(build_status_payload(task_id, metas[task_id]))
+
+
+async def async_check_tasks_status(request):
+    """Асинхронная пакетная проверка статусов задач"""
+    try:
+        task_ids, cursor = parse_bulk_request(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    metas = await sync_to_async(expand_metas)(await aget_task_metas(task_ids))
+    return JsonResponse(build_status_delta(metas, cursor))
+
+
+# csrf_exempt в Django 4.2 оборачивает view в синхронную функцию,
+# поэтому для корутины ставим флаг напрямую
+async_check_tasks_status.csrf_exempt = True
 
 class AsyncAPIView(View):
     """Асинхронный view для работы с API"""
@@ -14,7 +118,7 @@ class AsyncAPIView(View):
         async with httpx.AsyncClient() as client:
             try:
                 # Асинхронный запрос к ML API
-                response = await client.get('http://api:8001/health', timeout=10.0)
+                response = await client.get(f'{settings.ML_API_URL}/health', timeout=10.0)
                 data = response.json()
                 return JsonResponse({
                     'api_status': data.get('status', 'unknown'),
@@ -27,24 +131,30 @@ class AsyncAPIView(View):
         """Асинхронная обработка изображения"""
         if request.FILES.get('image'):
             image = request.FILES['image']
-            image_data = await image.read()
+            image_data = image.read()
             image_base64 = base64.b64encode(image_data).decode('utf-8')
+            user = await _aget_user(request)
             
             async with httpx.AsyncClient() as client:
                 try:
                     payload = {
                         'image_base64': image_base64,
-                        'user_id': request.user.id if request.user.is_authenticated else None
+                        'user_id': user.id if user else None
                     }
                     
                     # Асинхронный запрос к ML API
                     response = await client.post(
-                        'http://api:8001/detection/detect',
+                        f'{settings.ML_API_URL}/detection/detect',
                         json=payload,
                         timeout=30.0
                     )
                     
-                    return JsonResponse(response.json())
+                    # Отдаём тело ответа ML API как есть, без разбора и повторной сериализации
+                    return HttpResponse(
+                        response.content,
+                        status=response.status_code,
+                        content_type=response.headers.get('content-type', 'application/json')
+                    )
                     
                 except httpx.RequestError as e:
                     return JsonResponse({
@@ -0,0 +1,318 @@
+"""
+Повторная обработка сохранённых изображений после смены модели (backfill)
+
+Для каждого обработанного изображения хранится ProcessedImage: SHA-256
+содержимого и версия модели. Прогон (BackfillRun) обходит каталоги
+BACKFILL_DIRS в MEDIA_ROOT в стабильном порядке и отправляет на
+/detection/detect/batch только устаревшие изображения: без записи, с другой
+версией модели или с изменившимся содержимым. Хэш пересчитывается, только
+если файл изменён после обработки.
+
+Прогон - цепочка задач backfill_task в очереди bulk: каждая задача
+обрабатывает один пакет, сохраняет позицию обхода (cursor) и ставит
+следующую с задержкой, выдерживающей rate изображений в секунду. Пауза -
+смена статуса, продолжение - новая цепочка с того же курсора; у каждой
+цепочки свой token, так что после паузы и продолжения старая задача,
+ещё ждущая в очереди, не запустит второй параллельный обход.
+
+Если пакет не обработан (ML API недоступен), курсор не сдвигается, и пакет
+повторяется с экспоненциальной задержкой; после MAX_FAILURES_IN_ROW ошибок
+подряд прогон ставится на паузу. Ответ другой версии модели, чем целевая,
+останавливает прогон сразу, до записи строк.
+"""
+import hashlib
+import io
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import invalidate_recent_detections
+from .geo import location_from_exif
+from .ingest import IMAGE_EXTENSIONS
+from .models import BackfillRun, DetectionResult, ProcessedImage, TrafficSign
+
+BACKFILL_DIRS = ('detections', 'celery_uploads', 'direct_uploads')
+# Сколько актуальных изображений можно просмотреть за одну задачу
+MAX_SCAN_PER_BATCH = 2000
+# Повтор пакета после ошибки: RETRY_DELAY * 2**n секунд, не больше MAX_RETRY_DELAY
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 600
+MAX_FAILURES_IN_ROW = 5
+
+
+class ModelVersionMismatch(Exception):
+    """ML API ответил не той версией модели, под которую идёт прогон"""
+
+
+def backfill_key(path):
+    """task_id для строк изображения, у которого раньше не было детекций в БД"""
+    return f'backfill:{path}'[:255]
+
+
+def file_hash(path):
+    """SHA-256 файла из MEDIA_ROOT"""
+    digest = hashlib.sha256()
+    with open(os.path.join(settings.MEDIA_ROOT, path), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cursor_parts(cursor):
+    return tuple(cursor.split('/')) if cursor else ()
+
+
+def iter_images(after='', root=None, directories=BACKFILL_DIRS):
+    """
+    Пути изображений (относительно MEDIA_ROOT) после пути after.
+
+    Порядок - обход в глубину с сортировкой имён внутри каталога, то есть
+    сравнение путей покомпонентно. Поэтому поддеревья целиком до курсора
+    пропускаются без чтения, и продолжение с курсора не зависит от размера
+    уже пройденной части.
+    """
+    root = root or settings.MEDIA_ROOT
+    after_parts = _cursor_parts(after)
+
+    def walk(parts):
+        try:
+            entries = sorted(os.scandir(os.path.join(root, *parts)), key=lambda entry: entry.name)
+        except OSError:
+            return
+        for entry in entries:
+            entry_parts = (*parts, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                # Всё поддерево не дальше курсора
+                if entry_parts < after_parts[:len(entry_parts)]:
+                    continue
+                yield from walk(entry_parts)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry_parts > after_parts:
+                yield '/'.join(entry_parts)
+
+    for directory in sorted(directories):
+        if (directory,) >= after_parts[:1]:
+            yield from walk((directory,))
+
+
+def is_stale(path, record, target_version):
+    """
+    Нужно ли обработать изображение заново.
+
+    Возвращает (устарело ли, хэш содержимого или None, если не считался).
+    """
+    if record is None or record.model_version != target_version:
+        return True, None
+    modified = os.path.getmtime(os.path.join(settings.MEDIA_ROOT, path))
+    if modified <= record.processed_at.timestamp():
+        return False, None
+    content_hash = file_hash(path)
+    return content_hash != record.content_hash, content_hash
+
+
+def record_processed(path, content_hash, model_version, detections):
+    """Отмечает изображение как обработанное версией model_version"""
+    ProcessedImage.objects.update_or_create(path=path, defaults={
+        'content_hash': content_hash,
+        'model_version': model_version or '',
+        'detections': detections,
+    })
+
+
+def collect_stale(run, target_version=None):
+    """
+    Следующий пакет устаревших изображений после run.cursor.
+
+    Возвращает (пути с хэшами [(path, hash), ...], число актуальных,
+    новый курсор, обход закончен).
+    """
+    target_version = target_version or run.target_version
+    stale = []
+    fresh = 0
+    cursor = run.cursor
+    images = iter_images(run.cursor)
+    exhausted = True
+    window = []
+    for path in images:
+        window.append(path)
+        if len(window) >= run.batch_size:
+            fresh += _filter_window(window, target_version, stale)
+            cursor = window[-1]
+            window = []
+            if len(stale) >= run.batch_size or fresh >= MAX_SCAN_PER_BATCH:
+                exhausted = False
+                break
+    if window:
+        fresh += _filter_window(window, target_version, stale)
+        cursor = window[-1]
+    return stale, fresh, cursor, exhausted
+
+
+def _filter_window(paths, target_version, stale):
+    records = ProcessedImage.objects.in_bulk(paths, field_name='path')
+    fresh = 0
+    for path in paths:
+        try:
+            outdated, content_hash = is_stale(path, records.get(path), target_version)
+        except OSError:
+            # Файл удалён между обходом и проверкой
+            continue
+        if outdated:
+            stale.append((path, content_hash))
+        else:
+            fresh += 1
+    return fresh
+
+
+def reprocess(items, request_options, expected_version=None):
+    """
+    Детекция пакета изображений и замена их строк DetectionResult.
+
+    Строки изображения заменяются целиком; task_id, пользователь,
+    координаты и время детекции берутся из прежних строк, чтобы статус
+    задачи и привязка к пользователю сохранились, а строки остались
+    в секции изображения (partitions.py). Возвращает (число изображений,
+    версия модели, ответившей на запрос). Если ответила не expected_version,
+    бросает ModelVersionMismatch, ничего не записав.
+    """
+    from .ml_client import detect_batch
+
+    contents = []
+    for path, content_hash in items:
+        with open(os.path.join(settings.MEDIA_ROOT, path), 'rb') as f:
+            content = f.read()
+        contents.append((path, content_hash or hashlib.sha256(content).hexdigest(), content))
+    if not contents:
+        return 0, None
+
+    results, model_version = detect_batch([content for _, _, content in contents], **request_options)
+    if expected_version and model_version != expected_version:
+        raise ModelVersionMismatch(f'ML API answered with model {model_version!r}, expected {expected_version!r}')
+    paths = [path for path, _, _ in contents]
+    previous = {}
+    for image, task_id, user_id, latitude, longitude, geohash, detected_at in (
+            DetectionResult.objects.filter(image__in=paths)
+            .values_list('image', 'task_id', 'user_id', 'latitude', 'longitude', 'geohash', 'detected_at')):
+        previous.setdefault(image, {
+            'task_id': task_id, 'user_id': user_id,
+            'latitude': latitude, 'longitude': longitude, 'geohash': geohash,
+            'detected_at': detected_at,
+        })
+
+    # sign_id ML API -> TrafficSign (см. TrafficSign.model_sign_id)
+    signs = dict(TrafficSign.objects.exclude(model_sign_id=None).values_list('model_sign_id', 'id'))
+    rows = []
+    for (path, _, content), detections in zip(contents, results):
+        fields = previous.get(path) or {'task_id': backfill_key(path), **location_from_exif(io.BytesIO(content))}
+        rows.extend(
+            DetectionResult(
+                image=path,
+                sign_id=signs[detection['sign_id']],
+                confidence=detection['confidence'],
+                bounding_box=detection['bounding_box'],
+                **fields,
+            )
+            for detection in detections if detection['sign_id'] in signs
+        )
+
+    with transaction.atomic():
+        DetectionResult.objects.filter(image__in=paths).delete()
+        DetectionResult.objects.bulk_create(rows, batch_size=500)
+        for (path, content_hash, _), detections in zip(contents, results):
+            record_processed(path, content_hash, model_version, len(detections))
+    invalidate_recent_detections()
+    return len(contents), model_version
+
+
+def run_batch(run, token):
+    """
+    Один шаг прогона. Возвращает задержку до следующего шага в секундах
+    или None, если прогон остановлен (пауза, завершение, чужой token).
+    """
+    from .ml_client import detection_options
+
+    run.refresh_from_db()
+    if run.status != BackfillRun.RUNNING or run.token != token:
+        return None
+
+    started = time.monotonic()
+    stale, fresh, cursor, exhausted = collect_stale(run)
+    processed = 0
+    if stale:
+        try:
+            processed, _ = reprocess(stale, detection_options(), expected_version=run.target_version)
+        except Exception as e:
+            return _record_failure(run, token, len(stale), e)
+
+    # Пока шёл пакет, прогон могли приостановить: статус не перезаписываем
+    BackfillRun.objects.filter(pk=run.pk, token=token).update(
+        cursor=cursor,
+        processed=F('processed') + processed,
+        skipped=F('skipped') + fresh,
+        failures_in_row=0,
+        updated_at=timezone.now(),
+    )
+    if exhausted:
+        BackfillRun.objects.filter(pk=run.pk, token=token, status=BackfillRun.RUNNING).update(
+            status=BackfillRun.DONE)
+        return None
+    # Троттлинг: не больше rate изображений в секунду к ML API
+    return max(0.0, processed / run.rate - (time.monotonic() - started)) if run.rate > 0 else 0.0
+
+
+def _record_failure(run, token, count, error):
+    """
+    Ошибка пакета: курсор остаётся на месте, пакет повторяется с задержкой.
+    Возвращает задержку или None, если прогон поставлен на паузу.
+    """
+    failures = run.failures_in_row + 1
+    BackfillRun.objects.filter(pk=run.pk, token=token).update(
+        failed=F('failed') + count,
+        failures_in_row=failures,
+        last_error=str(error),
+        updated_at=timezone.now(),
+    )
+    # Повтор не поможет против чужой модели; при долгом сбое ждём оператора
+    if isinstance(error, ModelVersionMismatch) or failures >= MAX_FAILURES_IN_ROW:
+        BackfillRun.objects.filter(pk=run.pk, token=token, status=BackfillRun.RUNNING).update(
+            status=BackfillRun.PAUSED)
+        return None
+    return min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+
+
+def start(target_version, rate=2.0, batch_size=16):
+    """Создаёт прогон и ставит первую задачу в очередь bulk"""
+    run = BackfillRun.objects.create(target_version=target_version, rate=rate, batch_size=batch_size,
+                                     token=uuid.uuid4().hex)
+    enqueue_step(run)
+    return run
+
+
+def pause(run):
+    BackfillRun.objects.filter(pk=run.pk, status=BackfillRun.RUNNING).update(
+        status=BackfillRun.PAUSED, updated_at=timezone.now())
+    run.refresh_from_db()
+    return run
+
+
+def resume(run):
+    """Продолжает прогон с сохранённого курсора новой цепочкой задач"""
+    token = uuid.uuid4().hex
+    if BackfillRun.objects.filter(pk=run.pk, status=BackfillRun.PAUSED).update(
+            status=BackfillRun.RUNNING, token=token, failures_in_row=0, updated_at=timezone.now()):
+        run.refresh_from_db()
+        enqueue_step(run)
+    else:
+        run.refresh_from_db()
+    return run
+
+
+def enqueue_step(run, countdown=0):
+    """Ставит шаг прогона в очередь bulk"""
+    from .queues import BULK_QUEUE
+    from .tasks import backfill_task
+    return backfill_task.apply_async((run.pk, run.token), queue=BULK_QUEUE, countdown=countdown)
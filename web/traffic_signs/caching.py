@@ -0,0 +1,53 @@
+"""
+Кэш страниц и фрагментов (CACHES в settings.py)
+
+Список последних детекций на странице загрузки кэшируется фрагментом
+шаблона {% cache %} и удаляется из кэша при сохранении DetectionResult. Пакетные вставки (bulk_create) сигналов не шлют, поэтому
+compaction, ingest и backfill вызывают invalidate_recent_detections сами.
+Каталог знаков хранится в памяти процесса (result_codec) и сбрасывается
+при изменении TrafficSign.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DetectionResult, TrafficSign
+from .result_codec import reset_catalog
+
+RECENT_DETECTIONS_FRAGMENT = 'recent_detections'
+RECENT_DETECTIONS_LIMIT = 5
+
+
+def recent_detections_key():
+    return make_template_fragment_key(RECENT_DETECTIONS_FRAGMENT)
+
+
+def recent_detections():
+    """
+    Последние детекции для фрагмента (ленивый QuerySet: при попадании
+    в кэш фрагмента запрос к БД не выполняется)
+    """
+    return DetectionResult.objects.select_related('sign').order_by('-detected_at')[:RECENT_DETECTIONS_LIMIT]
+
+
+def recent_detections_context():
+    return {
+        'recent_detections': recent_detections(),
+        'recent_cache_timeout': settings.RECENT_DETECTIONS_CACHE_TIMEOUT,
+    }
+
+
+# Только post_save: обработчик post_delete лишил бы QuerySet.delete()
+# быстрого удаления одним запросом; удаление покрывает TTL фрагмента
+@receiver(post_save, sender=DetectionResult)
+def invalidate_recent_detections(**kwargs):
+    cache.delete(recent_detections_key())
+
+
+@receiver([post_save, post_delete], sender=TrafficSign)
+def invalidate_sign_catalog(**kwargs):
+    reset_catalog()
+    # Во фрагменте показаны названия знаков
+    cache.delete(recent_detections_key())
@@ -3,9 +3,12 @@ Views для работы с Celery
 """
 from django.shortcuts import render
 from django.http import JsonResponse
-from .tasks import process_image_task  # ИЗМЕНИТЕ ИМПОРТ!
+from .queues import INTERACTIVE_QUEUE, enqueue_detection
+from django.views.decorators.csrf import csrf_exempt
+from .task_status import (
+    build_status_payload, build_status_delta, expand_metas, get_task_metas, parse_bulk_request,
+)
 import base64
-from celery.result import AsyncResult
 import tempfile
 import os
 
@@ -21,8 +24,8 @@ def celery_upload_view(request):
             file_path = default_storage.save(f'celery_uploads/{image.name}', image)
 
             # Запускаем асинхронную задачу
-            from .tasks import process_image_task
-            task = process_image_task.delay(file_path)
+            task = enqueue_detection(file_path, queue=INTERACTIVE_QUEUE,
+                                     tiled=request.POST.get('tiled') == 'on')
 
             # Возвращаем HTML с task_id (для простой формы)
             return render(request, 'traffic_signs/celery_upload.html', {
@@ -40,20 +43,16 @@ def celery_upload_view(request):
 
 def check_task_status(request, task_id):
     """Проверка статуса задачи Celery"""
-    task_result = AsyncResult(task_id)
-    
-    response_data = {
-        'task_id': task_id,
-        'status': task_result.status,
-        'ready': task_result.ready()
-    }
-    
-    if task_result.ready():
-        if task_result.successful():
-            response_data['result'] = task_result.result
-            response_data['status'] = 'SUCCESS'
-        else:
-            response_data['error'] = str(task_result.result)
-            response_data['status'] = 'FAILURE'
-    
-    return JsonResponse(response_data)
+    meta = expand_metas(get_task_metas([task_id]))[task_id]
+    return JsonResponse(build_status_payload(task_id, meta))
+
+
+@csrf_exempt
+def check_tasks_status(request):
+    """Пакетная проверка статусов: один MGET и только изменившиеся задачи"""
+    try:
+        task_ids, cursor = parse_bulk_request(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(build_status_delta(expand_metas(get_task_metas(task_ids)), cursor))
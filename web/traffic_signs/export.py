@@ -0,0 +1,197 @@
+"""
+Потоковая выгрузка истории детекций (CSV, NDJSON, Parquet)
+
+Строки читаются через values_list(...).iterator(chunk_size) - на Postgres
+это серверный курсор, модели не создаются - и сразу сериализуются порциями.
+В памяти одновременно находится не больше одной порции, сколько бы строк
+ни было в выборке. Parquet пишется группами строк (row group), для него
+нужен pyarrow (необязательная зависимость).
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import DetectionResult
+
+CHUNK_SIZE = 2000
+
+COLUMNS = (
+    ('id', 'id'),
+    ('detected_at', 'detected_at'),
+    ('sign_id', 'sign_id'),
+    ('sign_name', 'sign__name'),
+    ('sign_type', 'sign__sign_type'),
+    ('confidence', 'confidence'),
+    ('bounding_box', 'bounding_box'),
+    ('latitude', 'latitude'),
+    ('longitude', 'longitude'),
+    ('image', 'image'),
+    ('task_id', 'task_id'),
+    ('user_id', 'user_id'),
+)
+FIELD_NAMES = [name for name, _ in COLUMNS]
+
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки или недоступный формат"""
+
+
+def parse_time(value, end=False):
+    """
+    ISO дата/время -> aware datetime.
+
+    Для даты без времени end=True даёт начало следующего дня (граница не включается).
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportError(f'Invalid date/time: {value}')
+        moment = datetime.datetime.combine(day + datetime.timedelta(days=1 if end else 0), datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def export_queryset(start=None, end=None, sign_ids=None):
+    """Строки выгрузки: start <= detected_at < end, знаки из sign_ids, по возрастанию id"""
+    queryset = DetectionResult.objects.all()
+    if start is not None:
+        queryset = queryset.filter(detected_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(detected_at__lt=end)
+    if sign_ids:
+        queryset = queryset.filter(sign_id__in=sign_ids)
+    return queryset.order_by('id').values_list(*(lookup for _, lookup in COLUMNS))
+
+
+def _chunks(rows, chunk_size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELD_NAMES)
+    for chunk in _chunks(rows, chunk_size):
+        for row in chunk:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, list) else _plain(value)
+                for value in row
+            ])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(rows, chunk_size=CHUNK_SIZE):
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(
+            json.dumps(dict(zip(FIELD_NAMES, map(_plain, row))), ensure_ascii=False) + '\n'
+            for row in chunk
+        ).encode('utf-8')
+
+
+class _DrainableSink(io.RawIOBase):
+    """Файлоподобный приёмник: накопленные байты забираются после каждой группы строк"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ('id', pa.int64()),
+        ('detected_at', pa.timestamp('us', tz='UTC')),
+        ('sign_id', pa.int64()),
+        ('sign_name', pa.string()),
+        ('sign_type', pa.string()),
+        ('confidence', pa.float64()),
+        ('bounding_box', pa.list_(pa.float64())),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('image', pa.string()),
+        ('task_id', pa.string()),
+        ('user_id', pa.int64()),
+    ])
+
+
+def iter_parquet(rows, chunk_size=CHUNK_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires pyarrow') from None
+
+    schema = _parquet_schema(pa)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# формат -> (генератор, content type, расширение файла)
+FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def stream_export(export_format, start=None, end=None, sign_ids=None, chunk_size=CHUNK_SIZE):
+    """Генератор байтов выгрузки в формате export_format"""
+    if export_format not in FORMATS:
+        raise ExportError(f'Unknown format {export_format!r}, expected one of: {", ".join(FORMATS)}')
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError('Parquet export requires pyarrow') from None
+    rows = export_queryset(start, end, sign_ids).iterator(chunk_size=chunk_size)
+    return FORMATS[export_format][0](rows, chunk_size=chunk_size)
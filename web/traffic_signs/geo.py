@@ -0,0 +1,278 @@
+"""
+Координаты детекций: извлечение GPS из EXIF и пространственные запросы
+
+Пространственный индекс - столбец DetectionResult.geohash с обычным B-tree
+индексом (работает и в SQLite, и в Postgres). Прямоугольник запроса
+покрывается ячейками geohash, каждая ячейка - диапазон строк
+geohash >= prefix AND geohash < следующий префикс, то есть range scan по
+индексу. Обе границы состоят из символов geohash ([0-9a-z]), поэтому
+порядок сравнения одинаков в любой сортировке БД (C, en_US и т.п.).
+Точная проверка попадания (прямоугольник, радиус) делается по
+latitude/longitude уже на кандидатах.
+"""
+import itertools
+import math
+
+from django.db.models import Q
+
+from .models import DetectionResult
+
+GEOHASH_PRECISION = 9  # ~5 м
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+EARTH_RADIUS_M = 6371008.8
+# Сколько ячеек покрытия допускается на один запрос
+MAX_COVER_CELLS = 32
+
+GPS_IFD = 0x8825
+
+
+def _to_degrees(value, ref):
+    degrees, minutes, seconds = (float(part) for part in value)
+    result = degrees + minutes / 60 + seconds / 3600
+    return -result if ref in ('S', 'W') else result
+
+
+def extract_gps(file):
+    """
+    (latitude, longitude) из EXIF изображения или None.
+
+    Читается только заголовок файла, пиксели не декодируются.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    position = file.tell() if hasattr(file, 'tell') else None
+    try:
+        with Image.open(file) as image:
+            gps = image.getexif().get_ifd(GPS_IFD)
+        if not gps or 2 not in gps or 4 not in gps:
+            return None
+        latitude = _to_degrees(gps[2], gps.get(1, 'N'))
+        longitude = _to_degrees(gps[4], gps.get(3, 'E'))
+    except (UnidentifiedImageError, OSError, ValueError, TypeError, ZeroDivisionError):
+        return None
+    finally:
+        if position is not None:
+            file.seek(position)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # чётные биты - долгота
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value = value * 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def location_fields(latitude, longitude):
+    """Значения полей DetectionResult для точки (или пустые, если точки нет)"""
+    if latitude is None or longitude is None:
+        return {'latitude': None, 'longitude': None, 'geohash': ''}
+    return {'latitude': latitude, 'longitude': longitude, 'geohash': encode_geohash(latitude, longitude)}
+
+
+def _cell_size(precision):
+    """Размер ячейки geohash (высота, ширина) в градусах"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def cover_bbox(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Диапазоны geohash [(start, stop), ...], покрывающие прямоугольник.
+
+    Берётся самая мелкая точность, при которой хватает max_cells ячеек;
+    соседние по порядку geohash ячейки сливаются в один диапазон.
+    """
+    prefixes = ['']
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = range(math.floor((min_lat + 90) / height), math.floor((max_lat + 90) / height) + 1)
+        cols = range(math.floor((min_lon + 180) / width), math.floor((max_lon + 180) / width) + 1)
+        if len(rows) * len(cols) <= max_cells:
+            prefixes = sorted({
+                encode_geohash(
+                    min(-90 + (row + 0.5) * height, 90.0),
+                    min(-180 + (col + 0.5) * width, 180.0),
+                    precision,
+                )
+                for row in rows for col in cols
+            })
+            break
+
+    ranges = []
+    for prefix in prefixes:
+        stop = prefix_stop(prefix)
+        if ranges and ranges[-1][1] == prefix:
+            ranges[-1] = (ranges[-1][0], stop)
+        else:
+            ranges.append((prefix, stop))
+    return ranges
+
+
+def prefix_stop(prefix):
+    """
+    Исключающая верхняя граница строк с префиксом prefix: следующий префикс
+    той же или меньшей длины ('u4z' -> 'u5'). None - границы нет ('zz', '').
+    """
+    prefix = prefix.rstrip(_BASE32[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + _BASE32[_BASE32.index(prefix[-1]) + 1]
+
+
+def location_from_exif(file):
+    """Поля местоположения DetectionResult по EXIF файла"""
+    return location_fields(*(extract_gps(file) or (None, None)))
+
+
+def _cover_q(ranges):
+    condition = Q()
+    for start, stop in ranges:
+        condition |= _range_q(start, stop)
+    return condition
+
+
+def _range_q(start, stop):
+    if stop is None:
+        return Q(geohash__gte=start)
+    return Q(geohash__gte=start, geohash__lt=stop)
+
+
+def bbox_queryset(min_lat, min_lon, max_lat, max_lon, queryset=None):
+    """Детекции внутри прямоугольника (без пересечения антимеридиана)"""
+    if queryset is None:
+        queryset = DetectionResult.objects.all()
+    return queryset.filter(
+        _cover_q(cover_bbox(min_lat, min_lon, max_lat, max_lon)),
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+    )
+
+
+def radius_bbox(latitude, longitude, radius_m):
+    """Прямоугольник, описанный вокруг круга радиусом radius_m метров"""
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    delta_lon = delta_lat / max(math.cos(math.radians(latitude)), 1e-6)
+    return (
+        max(latitude - delta_lat, -90.0), max(longitude - delta_lon, -180.0),
+        min(latitude + delta_lat, 90.0), min(longitude + delta_lon, 180.0),
+    )
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Расстояние между точками по сфере, метры"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def detection_row(detection, distance_m=None):
+    row = {
+        'id': detection.id,
+        'sign_id': detection.sign_id,
+        'sign_name': detection.sign.name,
+        'confidence': detection.confidence,
+        'latitude': detection.latitude,
+        'longitude': detection.longitude,
+        'image': detection.image.name,
+        'detected_at': detection.detected_at.isoformat(),
+    }
+    if distance_m is not None:
+        row['distance_m'] = round(distance_m, 1)
+    return row
+
+
+def encode_cursor(detection):
+    return f'{detection.geohash}:{detection.id}'
+
+
+def decode_cursor(cursor):
+    """Курсор страницы 'geohash:id' -> (geohash, id); бросает ValueError"""
+    geohash, _, detection_id = cursor.rpartition(':')
+    if not geohash or not set(geohash) <= set(_BASE32):
+        raise ValueError('Invalid cursor')
+    return geohash, int(detection_id)
+
+
+def iter_bbox(min_lat, min_lon, max_lat, max_lon, cursor=None, chunk_size=100):
+    """
+    Детекции в прямоугольнике в порядке (geohash, id), начиная после курсора.
+
+    Диапазоны покрытия не пересекаются и отсортированы, поэтому они читаются
+    по очереди, каждый - отдельными запросами с LIMIT. Такой запрос всегда
+    один range scan по индексу geohash в порядке сортировки, независимо от
+    статистики планировщика.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    for start, stop in cover_bbox(min_lat, min_lon, max_lat, max_lon):
+        if after and stop is not None and stop <= after[0]:
+            continue
+        while True:
+            queryset = (DetectionResult.objects
+                        .filter(_range_q(start, stop),
+                                latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon))
+                        .select_related('sign').order_by('geohash', 'id'))
+            if after:
+                queryset = queryset.filter(Q(geohash__gt=after[0]) | Q(geohash=after[0], id__gt=after[1]))
+            chunk = list(queryset[:chunk_size])
+            yield from chunk
+            if len(chunk) < chunk_size:
+                break
+            after = (chunk[-1].geohash, chunk[-1].id)
+
+
+def bbox_page(min_lat, min_lon, max_lat, max_lon, limit=50, cursor=None):
+    """
+    Страница детекций в прямоугольнике с пагинацией по ключу (geohash, id).
+
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    detections = list(itertools.islice(
+        iter_bbox(min_lat, min_lon, max_lat, max_lon, cursor, chunk_size=limit + 1), limit + 1))
+    next_cursor = encode_cursor(detections[limit - 1]) if len(detections) > limit else None
+    return [detection_row(detection) for detection in detections[:limit]], next_cursor
+
+
+def nearby_page(latitude, longitude, radius_m, limit=50, cursor=None):
+    """
+    Страница детекций в радиусе radius_m метров от точки, пагинация по (geohash, id).
+
+    Кандидаты выбираются по индексу geohash для описанного прямоугольника,
+    углы прямоугольника отсекаются точным расстоянием.
+    """
+    rows = []
+    last = None
+    candidates = iter_bbox(*radius_bbox(latitude, longitude, radius_m), cursor=cursor,
+                           chunk_size=max(limit * 2, 100))
+    for detection in candidates:
+        distance = haversine_m(latitude, longitude, detection.latitude, detection.longitude)
+        if distance > radius_m:
+            continue
+        if len(rows) == limit:
+            return rows, encode_cursor(last)
+        rows.append(detection_row(detection, distance))
+        last = detection
+    return rows, None
@@ -0,0 +1,135 @@
+"""
+Массовая загрузка каталога изображений (manage.py ingest_images)
+
+Файлы делятся на пакеты. Каждый пакет в отдельном процессе читается,
+копируется в MEDIA_ROOT, из EXIF берутся координаты, и весь пакет одним
+запросом уходит на /detection/detect/batch. Основной процесс вставляет
+результаты через bulk_create и дописывает обработанные файлы в файл
+контрольной точки, так что прерванный запуск продолжается с места остановки.
+"""
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+STORAGE_PREFIX = 'ingest'
+CHECKPOINT_NAME = '.ingest_checkpoint'
+
+
+def ingest_key(relative_path):
+    """Значение DetectionResult.task_id для строк, загруженных из файла"""
+    return f'ingest:{relative_path}'[:255]
+
+
+def find_images(root, extensions=IMAGE_EXTENSIONS):
+    """Относительные пути изображений в каталоге (рекурсивно, в стабильном порядке)"""
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                paths.append(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/'))
+    return paths
+
+
+class Checkpoint:
+    """
+    Файл контрольной точки: по строке на обработанный файл, только дозапись.
+
+    Обрыв посреди записи оставляет не более одной неполной строки; такой
+    файл просто будет обработан повторно (дубликаты отсекаются по task_id).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = {line.rstrip('\n') for line in f if line.endswith('\n')}
+
+    def record(self, relative_paths):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(f'{path}\n' for path in relative_paths)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(relative_paths)
+
+
+def init_worker():
+    """Инициализация процесса пула: Django настроен, соединения родителя не используются"""
+    import django
+    django.setup()
+
+    from django.db import connections
+    connections.close_all()
+
+
+def process_batch(root, relative_paths, options):
+    """
+    Обрабатывает пакет в процессе пула.
+
+    Возвращает список (относительный путь, путь в storage, gps, детекции или None, ошибка)
+    и версию модели.
+    """
+    from .geo import extract_gps
+    from .ml_client import detect_batch
+
+    prepared = []
+    errors = []
+    for relative_path in relative_paths:
+        try:
+            with open(os.path.join(root, relative_path), 'rb') as f:
+                content = f.read()
+            image_file = ContentFile(content)
+            gps = extract_gps(image_file)
+            stored = default_storage.save(f'{STORAGE_PREFIX}/{relative_path}', image_file)
+            prepared.append((relative_path, stored, gps, content))
+        except OSError as e:
+            errors.append((relative_path, None, None, None, str(e)))
+
+    if not prepared:
+        return errors, None
+    try:
+        results, model_version = detect_batch([item[3] for item in prepared], **options)
+    except Exception as e:
+        return errors + [(path, stored, gps, None, str(e)) for path, stored, gps, _ in prepared], None
+    return errors + [
+        (path, stored, gps, detections, None)
+        for (path, stored, gps, _), detections in zip(prepared, results)
+    ], model_version
+
+
+def build_rows(outcomes, signs, already_ingested, user=None):
+    """
+    Строки DetectionResult для результатов пакета.
+
+    signs - соответствие sign_id ML API -> id TrafficSign (model_sign_id).
+
+    Возвращает (строки, число пропущенных детекций неизвестных знаков).
+    """
+    from .geo import location_fields
+    from .models import DetectionResult
+
+    rows = []
+    skipped = 0
+    for relative_path, stored, gps, detections, error in outcomes:
+        key = ingest_key(relative_path)
+        if error or key in already_ingested:
+            continue
+        location = location_fields(*(gps or (None, None)))
+        for detection in detections:
+            sign_id = signs.get(detection['sign_id'])
+            if sign_id is None:
+                skipped += 1
+                continue
+            rows.append(DetectionResult(
+                image=stored,
+                sign_id=sign_id,
+                confidence=detection['confidence'],
+                bounding_box=detection['bounding_box'],
+                task_id=key,
+                user=user,
+                **location,
+            ))
+    return rows, skipped
@@ -0,0 +1,68 @@
+"""
+Повторная обработка сохранённых изображений под новую версию модели
+
+    python manage.py backfill start --rate 5 --batch-size 16
+    python manage.py backfill pause 3
+    python manage.py backfill resume 3
+    python manage.py backfill status
+
+Прогон выполняют задачи в очереди bulk (см. traffic_signs.backfill);
+обрабатываются только изображения, обработанные другой версией модели
+или изменённые после обработки.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signs import backfill
+from traffic_signs.ml_client import published_model_version
+from traffic_signs.models import BackfillRun
+
+
+class Command(BaseCommand):
+    help = 'Запуск, пауза, продолжение и статус прогонов backfill'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+
+        start = subcommands.add_parser('start', help='Новый прогон')
+        start.add_argument('--model-version', help='Целевая версия (по умолчанию опубликованная в ML API)')
+        start.add_argument('--rate', type=float, default=2.0, help='Не больше изображений в секунду')
+        start.add_argument('--batch-size', type=int, default=16, help='Изображений в одном запросе к ML API')
+
+        for name, help_text in [('pause', 'Приостановить прогон'), ('resume', 'Продолжить прогон')]:
+            subcommands.add_parser(name, help=help_text).add_argument('run_id', type=int)
+
+        status = subcommands.add_parser('status', help='Состояние прогонов')
+        status.add_argument('run_id', type=int, nargs='?')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'start':
+            self._start(options)
+        elif action == 'status':
+            runs = BackfillRun.objects.all()
+            if options['run_id']:
+                runs = runs.filter(pk=options['run_id'])
+            for run in runs[:20]:
+                self._report(run)
+        else:
+            run = BackfillRun.objects.filter(pk=options['run_id']).first()
+            if run is None:
+                raise CommandError(f'Backfill run {options["run_id"]} does not exist')
+            run = backfill.pause(run) if action == 'pause' else backfill.resume(run)
+            self._report(run)
+
+    def _start(self, options):
+        if options['rate'] <= 0 or options['batch_size'] < 1:
+            raise CommandError('--rate and --batch-size must be positive')
+        if BackfillRun.objects.filter(status=BackfillRun.RUNNING).exists():
+            raise CommandError('Another backfill run is in progress; pause it first')
+        target_version = options['model_version'] or published_model_version()
+        run = backfill.start(target_version, rate=options['rate'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Started backfill run {run.pk} -> {target_version}'))
+
+    def _report(self, run):
+        self.stdout.write(
+            f'#{run.pk} {run.status:<8} -> {run.target_version}: {run.processed} reprocessed, '
+            f'{run.skipped} up to date, {run.failed} failed, at {run.cursor or "-"}'
+            + (f' (last error: {run.last_error})' if run.last_error else '')
+        )
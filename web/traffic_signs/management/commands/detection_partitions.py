@@ -0,0 +1,53 @@
+"""
+Помесячные секции истории детекций
+
+    python manage.py detection_partitions status
+    python manage.py detection_partitions ensure --months-ahead 3
+    python manage.py detection_partitions prune --retention-days 365 --dry-run
+
+Периодически то же делает задача maintain_detection_partitions
+(CELERY_BEAT_SCHEDULE, очередь bulk); см. traffic_signs.partitions.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signs import partitions
+from traffic_signs.caching import invalidate_recent_detections
+
+
+class Command(BaseCommand):
+    help = 'Состояние, создание и удаление помесячных секций DetectionResult'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+        subcommands.add_parser('status', help='Список секций')
+        ensure = subcommands.add_parser('ensure', help='Создать секции на будущие месяцы')
+        ensure.add_argument('--months-ahead', type=int, default=settings.DETECTION_PARTITIONS_AHEAD)
+        prune = subcommands.add_parser('prune', help='Удалить истёкшие секции вместе с файлами')
+        prune.add_argument('--retention-days', type=int, default=settings.DETECTION_RETENTION_DAYS)
+        prune.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        mode = 'native' if partitions.is_partitioned() else 'logical'
+        if action == 'status':
+            self.stdout.write(f'{partitions.TABLE}: {mode} partitions')
+            for partition in partitions.list_partitions():
+                self.stdout.write(f'  {partition.name}  {partition.start:%Y-%m-%d} .. {partition.end:%Y-%m-%d}')
+        elif action == 'ensure':
+            created = partitions.ensure_partitions(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Created {len(created)} partitions' + (f': {", ".join(created)}' if created else '')))
+        else:
+            if options['retention_days'] <= 0:
+                raise CommandError('--retention-days must be positive (DETECTION_RETENTION_DAYS=0 keeps everything)')
+            if options['dry_run']:
+                for partition in partitions.expired_partitions(options['retention_days']):
+                    self.stdout.write(f'Would drop {partition.name}')
+                return
+            dropped = partitions.enforce_retention(options['retention_days'])
+            if dropped:
+                invalidate_recent_detections()
+            for name, files in dropped:
+                self.stdout.write(f'Dropped {name} ({files} media files)')
+            self.stdout.write(self.style.SUCCESS(f'Dropped {len(dropped)} {mode} partitions'))
@@ -0,0 +1,51 @@
+"""
+Потоковая выгрузка истории детекций в файл или stdout
+
+    python manage.py export_detections --format csv --output detections.csv
+    python manage.py export_detections --format parquet --since 2024-01-01 --sign 1 --sign 3 -o week.parquet
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signs.export import CHUNK_SIZE, FORMATS, ExportError, parse_time, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает DetectionResult в CSV, NDJSON или Parquet с постоянным расходом памяти'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('-o', '--output', default='-', help='Файл выгрузки, "-" - stdout')
+        parser.add_argument('--since', help='Начало периода (ISO дата или дата/время, включительно)')
+        parser.add_argument('--until', help='Конец периода (ISO дата или дата/время, не включительно)')
+        parser.add_argument('--sign', type=int, action='append', dest='signs', help='ID знака (можно несколько)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            chunks = stream_export(
+                options['format'],
+                start=parse_time(options['since']),
+                end=parse_time(options['until'], end=True),
+                sign_ids=options['signs'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        written = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        if options['output'] != '-':
+            self.stderr.write(f'Written {written} bytes to {options["output"]} '
+                              f'in {time.monotonic() - started:.1f}s')
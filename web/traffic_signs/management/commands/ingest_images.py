@@ -0,0 +1,126 @@
+"""
+Массовая загрузка каталога изображений с детекцией
+
+    python manage.py ingest_images ../test_images --workers 4 --batch-size 16
+
+Повторный запуск с тем же каталогом пропускает уже обработанные файлы
+(файл контрольной точки .ingest_checkpoint в каталоге или --checkpoint).
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from traffic_signs.caching import invalidate_recent_detections
+from traffic_signs.ingest import (
+    CHECKPOINT_NAME, Checkpoint, build_rows, find_images, ingest_key, init_worker, process_batch,
+)
+from traffic_signs.ml_client import detection_options
+from traffic_signs.models import DetectionResult, TrafficSign
+
+
+class Command(BaseCommand):
+    help = 'Загружает изображения из каталога: детекция пакетами в пуле процессов, bulk insert, контрольная точка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов в пуле (0 - без пула, в текущем процессе)')
+        parser.add_argument('--batch-size', type=int, default=16, help='Изображений в одном запросе к ML API')
+        parser.add_argument('--checkpoint', help=f'Файл контрольной точки (по умолчанию <directory>/{CHECKPOINT_NAME})')
+        parser.add_argument('--user', help='Имя пользователя, от которого сохраняются детекции')
+        parser.add_argument('--report-every', type=float, default=5.0, help='Период отчёта о скорости, секунды')
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(options['directory'])
+        if not os.path.isdir(root):
+            raise CommandError(f'{root} is not a directory')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]!r} does not exist')
+
+        checkpoint = Checkpoint(options['checkpoint'] or os.path.join(root, CHECKPOINT_NAME))
+        paths = [path for path in find_images(root) if path not in checkpoint.done]
+        self.stdout.write(f'{len(paths)} images to ingest ({len(checkpoint.done)} already done)')
+        if not paths:
+            return
+
+        size = options['batch_size']
+        batches = [paths[start:start + size] for start in range(0, len(paths), size)]
+        # Пороги каскада и каталог знаков читаются один раз, в основном процессе
+        request_options = detection_options()
+        self.signs = dict(TrafficSign.objects.exclude(model_sign_id=None).values_list('model_sign_id', 'id'))
+        self.user = user
+        self.checkpoint = checkpoint
+        self.stats = {'images': 0, 'rows': 0, 'errors': 0, 'unknown_signs': 0}
+        self.total = len(paths)
+        self.started = self.last_report = time.monotonic()
+        self.report_every = options['report_every']
+
+        if options['workers'] <= 0:
+            for batch in batches:
+                self._store(*process_batch(root, batch, request_options))
+        else:
+            self._run_pool(root, batches, request_options, options['workers'])
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {self.stats["images"]} images, {self.stats["rows"]} detections, '
+            f'{self.stats["errors"]} errors, {self.stats["unknown_signs"]} unknown signs skipped '
+            f'in {elapsed:.1f}s ({self.stats["images"] / elapsed if elapsed else 0:.1f} img/s)'
+        ))
+
+    def _run_pool(self, root, batches, request_options, workers):
+        pending = set()
+        queued = iter(batches)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            # Не больше двух пакетов на процесс в работе: память не растёт с размером каталога
+            for batch in queued:
+                pending.add(pool.submit(process_batch, root, batch, request_options))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._store(*future.result())
+                    batch = next(queued, None)
+                    if batch is not None:
+                        pending.add(pool.submit(process_batch, root, batch, request_options))
+
+    def _store(self, outcomes, model_version):
+        keys = [ingest_key(outcome[0]) for outcome in outcomes]
+        # Пакет мог быть вставлен, но не попасть в контрольную точку (обрыв между ними)
+        already_ingested = set(DetectionResult.objects.filter(task_id__in=keys).values_list('task_id', flat=True))
+        rows, unknown = build_rows(outcomes, self.signs, already_ingested, self.user)
+        with transaction.atomic():
+            DetectionResult.objects.bulk_create(rows, batch_size=500)
+        if rows:
+            invalidate_recent_detections()
+
+        succeeded = [relative_path for relative_path, _, _, _, error in outcomes if error is None]
+        self.checkpoint.record(succeeded)
+        for relative_path, _, _, _, error in outcomes:
+            if error is not None:
+                self.stderr.write(f'{relative_path}: {error}')
+
+        self.stats['images'] += len(outcomes)
+        self.stats['rows'] += len(rows)
+        self.stats['errors'] += len(outcomes) - len(succeeded)
+        self.stats['unknown_signs'] += unknown
+
+        now = time.monotonic()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            elapsed = now - self.started
+            self.stdout.write(
+                f'{self.stats["images"]}/{self.total} images, {self.stats["rows"]} detections, '
+                f'{self.stats["images"] / elapsed:.1f} img/s, model {model_version or "?"}'
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='bounding_box',
+            field=models.JSONField(blank=True, help_text='[x, y, ширина, высота]', null=True, verbose_name='Рамка'),
+        ),
+        migrations.AddField(
+            model_name='detectionresult',
+            name='task_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='ID задачи Celery'),
+        ),
+    ]
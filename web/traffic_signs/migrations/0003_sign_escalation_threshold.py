@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:44
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0002_detection_task_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficsign',
+            name='escalation_threshold',
+            field=models.FloatField(blank=True, help_text='Детекции знака с уверенностью ниже порога перепроверяет тяжёлый классификатор; пусто - порог по умолчанию ML API', null=True, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)], verbose_name='Порог эскалации'),
+        ),
+    ]
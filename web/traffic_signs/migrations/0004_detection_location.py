@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0003_sign_escalation_threshold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.AddField(
+            model_name='detectionresult',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='detectionresult',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='Долгота'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0004_detection_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='detectionresult',
+            name='detected_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время детекции'),
+        ),
+    ]
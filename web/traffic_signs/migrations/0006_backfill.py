@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0005_detection_detected_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_version', models.CharField(max_length=64, verbose_name='Целевая версия модели')),
+                ('status', models.CharField(choices=[('running', 'Выполняется'), ('paused', 'Приостановлен'), ('done', 'Завершён')], default='running', max_length=20, verbose_name='Статус')),
+                ('cursor', models.CharField(blank=True, max_length=500, verbose_name='Последний просмотренный путь')),
+                ('rate', models.FloatField(default=2.0, verbose_name='Изображений в секунду (не больше)')),
+                ('batch_size', models.PositiveIntegerField(default=16, verbose_name='Изображений в пакете')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Обработано')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Актуальны, пропущено')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('token', models.CharField(blank=True, editable=False, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлён')),
+            ],
+            options={
+                'verbose_name': 'Прогон backfill',
+                'verbose_name_plural': 'Прогоны backfill',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProcessedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True, verbose_name='Путь в MEDIA_ROOT')),
+                ('content_hash', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256 содержимого')),
+                ('model_version', models.CharField(db_index=True, max_length=64, verbose_name='Версия модели')),
+                ('detections', models.PositiveIntegerField(default=0, verbose_name='Число детекций')),
+                ('processed_at', models.DateTimeField(auto_now=True, verbose_name='Время обработки')),
+            ],
+            options={
+                'verbose_name': 'Обработанное изображение',
+                'verbose_name_plural': 'Обработанные изображения',
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+"""
+Секционирование DetectionResult по месяцам detected_at (только Postgres)
+
+Таблица пересоздаётся как PARTITION BY RANGE (detected_at): первичный ключ
+секционированной таблицы обязан включать ключ секционирования, поэтому
+он становится (id, detected_at); id по-прежнему выдаётся identity
+последовательностью и уникален. Индексы и внешние ключи переносятся
+с прежней таблицы, строки копируются в месячные секции.
+На SQLite операция ничего не делает (см. traffic_signs.partitions).
+"""
+import datetime
+
+import django.utils.timezone
+from django.db import migrations, models
+
+TABLE = 'traffic_signs_detectionresult'
+MONTHS_AHEAD = 3
+
+
+def _month_start(moment):
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def _add_month(start):
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def partition_detections(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    old = f'{TABLE}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        if cursor.fetchone():
+            return
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                       [TABLE])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute('SELECT indexname, indexdef FROM pg_indexes '
+                       'WHERE tablename = %s AND schemaname = current_schema()', [TABLE])
+        indexes = cursor.fetchall()
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = to_regclass(%s) AND contype = 'f'", [TABLE])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MIN(detected_at) FROM {quote(TABLE)}')
+        first = cursor.fetchone()[0]
+
+        # Имена индексов уникальны в схеме: освобождаем их для новой таблицы
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}')
+        for number, (name, _) in enumerate(indexes):
+            cursor.execute(f'ALTER INDEX {quote(name)} RENAME TO {quote(f"{old}_{number}")}')
+
+        cursor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING STORAGE) PARTITION BY RANGE (detected_at)')
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(primary_key)} '
+                       f'PRIMARY KEY (id, detected_at)')
+        for name, definition in indexes:
+            if name != primary_key:
+                cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}')
+
+        cursor.execute(f'CREATE TABLE {quote(TABLE + "_default")} PARTITION OF {quote(TABLE)} DEFAULT')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        start, last = _month_start(min(first or now, now)), _month_start(now)
+        for _ in range(MONTHS_AHEAD):
+            last = _add_month(last)
+        while start <= last:
+            end = _add_month(start)
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{TABLE}_p{start:%Y_%m}")} PARTITION OF {quote(TABLE)} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+            start = end
+
+        cursor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                       f'COALESCE((SELECT MAX(id) FROM {quote(TABLE)}), 0) + 1, false)', [TABLE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0006_backfill'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='detectionresult',
+            name='detected_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False,
+                                       verbose_name='Время детекции'),
+        ),
+        # Обратно таблица остаётся секционированной: для прежних миграций это та же таблица
+        migrations.RunPython(partition_detections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0007_detection_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backfillrun',
+            name='failures_in_row',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ошибок подряд'),
+        ),
+    ]
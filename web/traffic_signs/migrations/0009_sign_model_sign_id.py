@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+# Каталог ML API (api/app/catalog.py) на момент миграции
+API_SIGNS = {
+    1: 'Стоп',
+    2: 'Ограничение скорости 60',
+    3: 'Поворот направо',
+    4: 'Пешеходный переход',
+    5: 'Главная дорога',
+}
+
+
+def link_api_signs(apps, schema_editor):
+    """Связывает существующие знаки с каталогом ML API по точному названию"""
+    TrafficSign = apps.get_model('traffic_signs', 'TrafficSign')
+    for model_sign_id, name in API_SIGNS.items():
+        signs = list(TrafficSign.objects.filter(name=name)[:2])
+        if len(signs) == 1:
+            TrafficSign.objects.filter(pk=signs[0].pk).update(model_sign_id=model_sign_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signs', '0008_backfill_failures_in_row'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trafficsign',
+            name='model_sign_id',
+            field=models.PositiveIntegerField(blank=True, help_text='sign_id этого знака в ответах ML API (каталог api/app/catalog.py); пусто - модель знак не распознаёт', null=True, unique=True, verbose_name='Идентификатор в ML API'),
+        ),
+        migrations.RunPython(link_api_signs, migrations.RunPython.noop),
+    ]
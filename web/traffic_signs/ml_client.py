@@ -0,0 +1,127 @@
+"""
+Клиент ML API для Celery задач
+"""
+import base64
+import uuid
+
+import httpx
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Один клиент на процесс воркера - соединения с ML API переиспользуются
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = httpx.Client(base_url=settings.ML_API_URL, timeout=settings.ML_API_TIMEOUT)
+    return _client
+
+
+def detection_options(**options):
+    """Параметры запроса детекции с учётом каскадного режима (ML_CASCADE)"""
+    if settings.ML_CASCADE:
+        from .result_codec import escalation_thresholds
+        options.update(cascade=True, cascade_thresholds=escalation_thresholds())
+    return options
+
+
+def _read_base64(file_path):
+    with default_storage.open(file_path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('ascii')
+
+
+def _post(path, payload, client=None):
+    response = (client or _get_client()).post(path, json=payload)
+    response.raise_for_status()
+    data = response.json()
+    if not data.get('success'):
+        raise RuntimeError(data.get('error') or 'Detection failed')
+    return data
+
+
+def detect_file(file_path, **options):
+    """
+    Отправляет файл из MEDIA_ROOT на /detection/detect и возвращает ответ API.
+
+    Бросает RuntimeError, если API вернул success=False.
+    """
+    return _post('/detection/detect', {'image_base64': _read_base64(file_path), **options})
+
+
+def detect_batch(images, **options):
+    """
+    Пакетная детекция: список байтов изображений -> список результатов
+    (по списку детекций на изображение) и версия модели.
+    """
+    data = _post('/detection/detect/batch', {
+        'images_base64': [base64.b64encode(image).decode('ascii') for image in images],
+        'format': 'rows',
+        **options,
+    })
+    return data['results'], data.get('model_version')
+
+
+def published_model_version():
+    """Версия модели, опубликованная в реестре ML API (цель для backfill)"""
+    response = _get_client().get('/models')
+    response.raise_for_status()
+    return response.json()['published']
+
+
+def _stream_client():
+    """Клиент с единственным соединением: кадры потока, как правило, попадают в один воркер API"""
+    return httpx.Client(base_url=settings.ML_API_URL, timeout=settings.ML_API_TIMEOUT,
+                        limits=httpx.Limits(max_connections=1))
+
+
+class StreamRestart(Exception):
+    """Состояние потока в API потеряно (другой воркер, обрыв соединения) - поток начинается заново"""
+
+
+def track_files(file_paths):
+    """
+    Трекинг кадров видео (по порядку). Возвращает по одной записи на трек
+    и статистику вызовов классификатора - как /detection/track.
+
+    До ML_TRACK_MAX_FRAMES кадров видео уходит одним запросом и от воркера
+    API не зависит. Длинное видео идёт покадрово через /detection/stream
+    (в памяти один кадр); состояние потока живёт в процессе API, и если
+    кадр попал в другой воркер или соединение оборвалось, поток с новым
+    stream_id отправляется заново с первого кадра.
+    """
+    if len(file_paths) <= settings.ML_TRACK_MAX_FRAMES:
+        data = _post('/detection/track', {'frames_base64': [_read_base64(path) for path in file_paths]})
+        return {key: data.get(key) for key in ('tracks', 'stats', 'model_version', 'processing_time')}
+
+    for restart in range(settings.ML_STREAM_RESTARTS + 1):
+        try:
+            return _stream_files(file_paths)
+        except (StreamRestart, httpx.TransportError) as e:
+            if restart == settings.ML_STREAM_RESTARTS:
+                raise RuntimeError(f'Video stream was restarted {restart} times: {e}') from e
+
+
+def _stream_files(file_paths):
+    stream_id = uuid.uuid4().hex
+    tracks = []
+    data = {}
+    processing_time = 0.0
+    with _stream_client() as client:
+        for position, path in enumerate(file_paths):
+            data = _post('/detection/stream', {
+                'image_base64': _read_base64(path),
+                'stream_id': stream_id,
+                'end': position == len(file_paths) - 1,
+            }, client)
+            if data['frame'] != position + 1:
+                raise StreamRestart(f'frame {position + 1} was tracked as frame {data["frame"]}')
+            tracks.extend(data['emitted'])
+            processing_time += data['processing_time']
+    return {
+        'tracks': sorted(tracks, key=lambda track: track['track_id']),
+        'stats': data.get('stats', {}),
+        'model_version': data.get('model_version'),
+        'processing_time': round(processing_time, 6),
+    }
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 
 class TrafficSign(models.Model):
     """Модель для хранения информации о дорожных знаках"""
@@ -15,6 +17,19 @@ class TrafficSign(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название знака')
     sign_type = models.CharField(max_length=50, choices=SIGN_TYPES, verbose_name='Тип знака')
     description = models.TextField(blank=True, verbose_name='Описание')
+    model_sign_id = models.PositiveIntegerField(
+        null=True, blank=True, unique=True,
+        verbose_name='Идентификатор в ML API',
+        help_text='sign_id этого знака в ответах ML API (каталог api/app/catalog.py); '
+                  'пусто - модель знак не распознаёт',
+    )
+    escalation_threshold = models.FloatField(
+        null=True, blank=True,
+        validators=[MinValueValidator(0.0), MaxValueValidator(1.0)],
+        verbose_name='Порог эскалации',
+        help_text='Детекции знака с уверенностью ниже порога перепроверяет тяжёлый классификатор; '
+                  'пусто - порог по умолчанию ML API',
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -31,8 +46,16 @@ class DetectionResult(models.Model):
     image = models.ImageField(upload_to='detections/%Y/%m/%d/', verbose_name='Изображение')
     sign = models.ForeignKey(TrafficSign, on_delete=models.CASCADE, verbose_name='Распознанный знак')
     confidence = models.FloatField(verbose_name='Уверенность', help_text='Значение от 0 до 1')
-    detected_at = models.DateTimeField(auto_now_add=True, verbose_name='Время детекции')
+    # Ключ секционирования таблицы (см. partitions.py); задаётся явно при backfill
+    detected_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True,
+                                       verbose_name='Время детекции')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Пользователь')
+    bounding_box = models.JSONField(null=True, blank=True, verbose_name='Рамка', help_text='[x, y, ширина, высота]')
+    task_id = models.CharField(max_length=255, blank=True, db_index=True, verbose_name='ID задачи Celery')
+    # Место съёмки из EXIF; geohash с B-tree индексом - пространственный индекс (см. geo.py)
+    latitude = models.FloatField(null=True, blank=True, verbose_name='Широта')
+    longitude = models.FloatField(null=True, blank=True, verbose_name='Долгота')
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, verbose_name='Geohash')
     
     class Meta:
         verbose_name = 'Результат детекции'
@@ -41,3 +64,54 @@ class DetectionResult(models.Model):
     
     def __str__(self):
         return f'{self.sign.name} ({self.confidence:.2f})'
+
+
+class ProcessedImage(models.Model):
+    """Какой версией модели и при каком содержимом файла обработано изображение"""
+    path = models.CharField(max_length=500, unique=True, verbose_name='Путь в MEDIA_ROOT')
+    content_hash = models.CharField(max_length=64, db_index=True, verbose_name='SHA-256 содержимого')
+    model_version = models.CharField(max_length=64, db_index=True, verbose_name='Версия модели')
+    detections = models.PositiveIntegerField(default=0, verbose_name='Число детекций')
+    processed_at = models.DateTimeField(auto_now=True, verbose_name='Время обработки')
+
+    class Meta:
+        verbose_name = 'Обработанное изображение'
+        verbose_name_plural = 'Обработанные изображения'
+
+    def __str__(self):
+        return f'{self.path} ({self.model_version})'
+
+
+class BackfillRun(models.Model):
+    """Прогон повторной обработки изображений под новую версию модели"""
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    DONE = 'done'
+    STATUSES = [
+        (RUNNING, 'Выполняется'),
+        (PAUSED, 'Приостановлен'),
+        (DONE, 'Завершён'),
+    ]
+
+    target_version = models.CharField(max_length=64, verbose_name='Целевая версия модели')
+    status = models.CharField(max_length=20, choices=STATUSES, default=RUNNING, verbose_name='Статус')
+    cursor = models.CharField(max_length=500, blank=True, verbose_name='Последний просмотренный путь')
+    rate = models.FloatField(default=2.0, verbose_name='Изображений в секунду (не больше)')
+    batch_size = models.PositiveIntegerField(default=16, verbose_name='Изображений в пакете')
+    processed = models.PositiveIntegerField(default=0, verbose_name='Обработано')
+    skipped = models.PositiveIntegerField(default=0, verbose_name='Актуальны, пропущено')
+    failed = models.PositiveIntegerField(default=0, verbose_name='Ошибок')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    failures_in_row = models.PositiveIntegerField(default=0, verbose_name='Ошибок подряд')
+    # Текущая цепочка задач: задачи со старым token завершаются без работы
+    token = models.CharField(max_length=32, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлён')
+
+    class Meta:
+        verbose_name = 'Прогон backfill'
+        verbose_name_plural = 'Прогоны backfill'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Backfill #{self.pk} -> {self.target_version} ({self.status})'
@@ -0,0 +1,217 @@
+"""
+Хранение DetectionResult по месяцам и удаление истории целыми месяцами
+
+На Postgres таблица детекций секционирована по detected_at
+(PARTITION BY RANGE, миграция 0007): одна секция на календарный месяц UTC
+плюс секция DEFAULT для строк вне созданных диапазонов. Секции создаются
+заранее на DETECTION_PARTITIONS_AHEAD месяцев вперёд, а истёкшая секция
+удаляется DETACH + DROP TABLE - без построчного DELETE, раздувания таблицы
+и долгого VACUUM. Истёкшие месяцы, строки которых лежат в DEFAULT (секцию
+не успели создать), удаляются пачками, как логические.
+
+На SQLite (и на Postgres до миграции) секции логические: те же месяцы
+по индексу detected_at, а истёкший месяц удаляется пачками по
+RETENTION_DELETE_CHUNK строк, каждая - короткая транзакция.
+
+Перед удалением секции удаляются её файлы в MEDIA_ROOT и записи
+ProcessedImage. Все строки одного изображения лежат в одной секции:
+backfill сохраняет detected_at прежних строк (см. backfill.reprocess).
+"""
+import datetime
+import logging
+import re
+from collections import namedtuple
+
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .models import DetectionResult, ProcessedImage
+
+logger = logging.getLogger(__name__)
+
+TABLE = DetectionResult._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+RETENTION_DELETE_CHUNK = 5000
+
+Partition = namedtuple('Partition', ['name', 'start', 'end'])
+
+
+def month_start(moment):
+    """Начало месяца (UTC) для момента времени"""
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(start, months):
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def partition_for(start):
+    """Секция месяца, начинающегося в start"""
+    return Partition(f'{TABLE}_p{start:%Y_%m}', start, add_months(start, 1))
+
+
+def is_partitioned(cursor=None):
+    """Секционирована ли таблица детекций средствами БД (только Postgres)"""
+    if connection.vendor != 'postgresql':
+        return False
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return is_partitioned(cursor)
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def months_between(first, last):
+    """Логические секции месяцев от first до last включительно"""
+    if first is None:
+        return []
+    partitions, start, last = [], month_start(first), month_start(last)
+    while start <= last:
+        partitions.append(partition_for(start))
+        start = add_months(start, 1)
+    return partitions
+
+
+def list_partitions():
+    """Месячные секции по возрастанию (на SQLite - месяцы от первой до последней детекции)"""
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                           'WHERE i.inhparent = to_regclass(%s)', [TABLE])
+            names = [row[0] for row in cursor.fetchall()]
+        starts = []
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                starts.append(datetime.datetime(int(match[1]), int(match[2]), 1, tzinfo=datetime.timezone.utc))
+        return [partition_for(start) for start in sorted(starts)]
+
+    # MIN/MAX по индексу detected_at - два шага по индексу
+    bounds = DetectionResult.objects.aggregate(first=Min('detected_at'), last=Max('detected_at'))
+    return months_between(bounds['first'], bounds['last'])
+
+
+def default_months(before):
+    """Логические секции месяцев, строки которых старше before лежат в DEFAULT"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(detected_at), MAX(detected_at) FROM {connection.ops.quote_name(DEFAULT_PARTITION)} '
+                       'WHERE detected_at < %s', [before])
+        return months_between(*cursor.fetchone())
+
+
+def expired_partitions(retention_days, now=None):
+    """Секции (и месяцы в DEFAULT), все строки которых старше retention_days дней"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=retention_days)
+    partitions = list_partitions()
+    if is_partitioned():
+        partitions = sorted(partitions + default_months(cutoff), key=lambda partition: partition.start)
+    return [partition for partition in partitions if partition.end <= cutoff]
+
+
+def create_partition_sql(partition):
+    return (f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(partition.name)} '
+            f'PARTITION OF {connection.ops.quote_name(TABLE)} '
+            f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')")
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """
+    Создаёт секции текущего месяца и months_ahead следующих.
+
+    Строки, попавшие в DEFAULT (например, beat долго не работал), переносятся
+    в новую секцию: Postgres не создаёт секцию, пока в DEFAULT есть строки
+    её диапазона. Возвращает имена созданных секций; без секционирования - [].
+    """
+    if not is_partitioned():
+        return []
+    existing = {partition.name for partition in list_partitions()}
+    start = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        partition = partition_for(add_months(start, offset))
+        if partition.name not in existing:
+            _create_partition(partition)
+            created.append(partition.name)
+    if created:
+        logger.info('Created detection partitions: %s', ', '.join(created))
+    return created
+
+
+def _create_partition(partition):
+    quote = connection.ops.quote_name
+    default, table, name = quote(DEFAULT_PARTITION), quote(TABLE), quote(partition.name)
+    bounds = [partition.start, partition.end]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {default} WHERE detected_at >= %s AND detected_at < %s LIMIT 1', bounds)
+        if cursor.fetchone() is None:
+            cursor.execute(create_partition_sql(partition))
+            return
+        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+        cursor.execute(create_partition_sql(partition))
+        cursor.execute(f'INSERT INTO {name} SELECT * FROM {default} WHERE detected_at >= %s AND detected_at < %s',
+                       bounds)
+        cursor.execute(f'DELETE FROM {default} WHERE detected_at >= %s AND detected_at < %s', bounds)
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+
+
+def partition_images(partition):
+    """Пути изображений, на которые ссылаются строки секции"""
+    return (DetectionResult.objects
+            .filter(detected_at__gte=partition.start, detected_at__lt=partition.end)
+            .order_by().values_list('image', flat=True).distinct().iterator())
+
+
+def delete_media(paths, chunk=500):
+    """Удаляет файлы и записи ProcessedImage; возвращает число удалённых файлов"""
+    deleted, batch = 0, []
+    for path in paths:
+        if not path:
+            continue
+        if default_storage.exists(path):
+            default_storage.delete(path)
+            deleted += 1
+        batch.append(path)
+        if len(batch) >= chunk:
+            ProcessedImage.objects.filter(path__in=batch).delete()
+            batch = []
+    if batch:
+        ProcessedImage.objects.filter(path__in=batch).delete()
+    return deleted
+
+
+def drop_partition(partition, partitioned=None):
+    """
+    Удаляет секцию вместе с файлами изображений. Возвращает число удалённых файлов.
+
+    Файлы удаляются первыми: если задача прервётся, повторный запуск найдёт
+    те же строки, а не оставит файлы без строк.
+    """
+    files = delete_media(list(partition_images(partition)))
+    if partitioned is None:
+        partitioned = is_partitioned()
+    if partitioned:
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(partition.name)}')
+            cursor.execute(f'DROP TABLE {quote(partition.name)}')
+    else:
+        queryset = DetectionResult.objects.filter(detected_at__gte=partition.start, detected_at__lt=partition.end)
+        while True:
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:RETENTION_DELETE_CHUNK])
+            if not ids:
+                break
+            DetectionResult.objects.filter(pk__in=ids).delete()
+    logger.info('Dropped detection partition %s (%d media files)', partition.name, files)
+    return files
+
+
+def enforce_retention(retention_days, now=None):
+    """Удаляет все истёкшие секции; возвращает [(секция, удалено файлов)]"""
+    attached = {partition.name for partition in list_partitions()} if is_partitioned() else set()
+    return [(partition.name, drop_partition(partition, partition.name in attached))
+            for partition in expired_partitions(retention_days, now)]
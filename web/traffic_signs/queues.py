@@ -0,0 +1,175 @@
+"""
+Очереди Celery: интерактивная и пакетная (bulk) обработка, метрики очередей
+
+Интерактивные загрузки идут в очередь 'interactive', массовые прогоны -
+в 'bulk'. Очереди обслуживаются разными воркерами (см. docker-compose.yml),
+поэтому длинный bulk-прогон не задерживает загрузки пользователей.
+
+load_metrics() - сводка для автоскейлера воркеров: глубина очередей,
+ожидание и время выполнения задач (p50/p95) и задачи в работе - один
+round trip к брокеру, результат кэшируется в процессе на LOAD_METRICS_TTL.
+"""
+import threading
+import time
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+
+INTERACTIVE_QUEUE = 'interactive'
+BULK_QUEUE = 'bulk'
+QUEUES = (INTERACTIVE_QUEUE, BULK_QUEUE)
+
+# Сколько последних замеров времени ожидания хранить на очередь
+WAIT_SAMPLES = 1000
+WAIT_KEY = 'traffic_signs:queue_wait:{queue}'
+RUN_KEY = 'traffic_signs:task_run:{queue}'
+# Хэш kombu (транспорт Redis) с сообщениями, выданными воркерам и ещё не
+# подтверждёнными; при CELERY_TASK_ACKS_LATE - выполняющиеся и в prefetch
+UNACKED_KEY = 'unacked'
+
+_broker_client = None
+
+
+def broker_client():
+    """Клиент Redis брокера (для LLEN очередей и хранения метрик)"""
+    global _broker_client
+    if _broker_client is None:
+        import redis
+        _broker_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    return _broker_client
+
+
+def _queue_keys(queue):
+    """Ключи списков Redis, в которых kombu хранит сообщения очереди с учётом приоритетов"""
+    return [queue] + [f'{queue}\x06\x16{step}' for step in (3, 6, 9)]
+
+
+def enqueue_detection(file_path, queue=INTERACTIVE_QUEUE, tiled=False, **options):
+    """Ставит process_image_task в нужную очередь"""
+    from .tasks import process_image_task
+    return process_image_task.apply_async((file_path,), {'tiled': tiled}, queue=queue, **options)
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """Время постановки в очередь - для расчёта ожидания в воркере"""
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+def _task_queue(request):
+    return (request.delivery_info or {}).get('routing_key') or INTERACTIVE_QUEUE
+
+
+def _push_sample(key, value):
+    try:
+        pipe = broker_client().pipeline()
+        pipe.lpush(key, round(value, 3))
+        pipe.ltrim(key, 0, WAIT_SAMPLES - 1)
+        pipe.execute()
+    except Exception:
+        # Метрики не должны ронять задачу
+        pass
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    """Записывает, сколько задача ждала в очереди до начала выполнения"""
+    request = getattr(task, 'request', None)
+    if request is None:
+        return
+    request.started_at = time.time()
+    enqueued_at = getattr(request, 'enqueued_at', None)
+    if not enqueued_at:
+        return
+    _push_sample(WAIT_KEY.format(queue=_task_queue(request)), request.started_at - float(enqueued_at))
+
+
+@task_postrun.connect
+def record_task_run(task=None, **kwargs):
+    """Записывает время выполнения задачи"""
+    request = getattr(task, 'request', None)
+    started_at = getattr(request, 'started_at', None)
+    if not started_at:
+        return
+    _push_sample(RUN_KEY.format(queue=_task_queue(request)), time.time() - started_at)
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def queue_metrics(queues=QUEUES):
+    """
+    Глубина каждой очереди, время ожидания и выполнения задач
+    (p50/p95, секунды) за один round trip
+    """
+    pipe = broker_client().pipeline()
+    _queue_commands(pipe, queues)
+    return _queue_metrics_from(queues, iter(pipe.execute()))
+
+
+def _queue_commands(pipe, queues):
+    for queue in queues:
+        for key in _queue_keys(queue):
+            pipe.llen(key)
+        pipe.lrange(WAIT_KEY.format(queue=queue), 0, -1)
+        pipe.lrange(RUN_KEY.format(queue=queue), 0, -1)
+
+
+def _queue_metrics_from(queues, replies):
+    metrics = {}
+    for queue in queues:
+        depth = sum(next(replies) for _ in _queue_keys(queue))
+        waits = [float(value) for value in next(replies)]
+        runs = [float(value) for value in next(replies)]
+        metrics[queue] = {
+            'depth': depth,
+            'wait_p50': _percentile(waits, 50),
+            'wait_p95': _percentile(waits, 95),
+            'wait_samples': len(waits),
+            'run_p50': _percentile(runs, 50),
+            'run_p95': _percentile(runs, 95),
+        }
+    return metrics
+
+
+_load_cache = {'expires_at': 0.0, 'value': None}
+_load_lock = threading.Lock()
+
+
+def load_metrics():
+    """
+    Нагрузка на воркеры для автоскейлера: queue_metrics, задачи в работе
+    (unacked) и суммарный backlog.
+
+    Кэшируется на LOAD_METRICS_TTL секунд: частый опрос несколькими
+    потребителями не умножает запросы к брокеру.
+    """
+    ttl = getattr(settings, 'LOAD_METRICS_TTL', 1.0)
+    with _load_lock:
+        if _load_cache['value'] is not None and _load_cache['expires_at'] > time.monotonic():
+            return _load_cache['value']
+
+    pipe = broker_client().pipeline()
+    _queue_commands(pipe, QUEUES)
+    pipe.hlen(UNACKED_KEY)
+    replies = iter(pipe.execute())
+    metrics = _queue_metrics_from(QUEUES, replies)
+    value = {
+        'queues': metrics,
+        'backlog': sum(queue['depth'] for queue in metrics.values()),
+        'in_progress': next(replies),
+        'timestamp': time.time(),
+    }
+    with _load_lock:
+        _load_cache.update(expires_at=time.monotonic() + ttl, value=value)
+    return value
+
+
+def reset_load_cache():
+    with _load_lock:
+        _load_cache.update(expires_at=0.0, value=None)
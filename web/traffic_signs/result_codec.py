@@ -0,0 +1,106 @@
+"""
+Компактное хранение результатов детекции в result backend Celery
+
+В Redis кладутся только id знаков, уверенность и рамки:
+    {'v': 1, 'd': [[sign_id, confidence, x, y, w, h], ...], ...}
+Названия и типы знаков подставляются из каталога TrafficSign при чтении.
+
+sign_id в ответах ML API - идентификатор каталога модели, а не первичный
+ключ TrafficSign: соответствие задаёт поле TrafficSign.model_sign_id.
+В компактных строках и в БД хранится уже id TrafficSign (None - знак,
+которого нет в каталоге).
+"""
+import threading
+import time
+
+COMPACT_VERSION = 1
+
+# Каталог знаков меняется редко - держим его в памяти процесса
+CATALOG_TTL = 60.0
+_catalog = {'expires_at': 0.0, 'signs': {}, 'model_signs': {}, 'thresholds': {}}
+_catalog_lock = threading.Lock()
+
+
+def encode_detections(detections, signs=None):
+    """Детекции ML API (dict) -> компактные строки [id TrafficSign, score, *bbox]"""
+    if signs is None:
+        signs = model_signs()
+    return [
+        [signs.get(d['sign_id']), round(float(d['confidence']), 4), *[round(float(v), 1) for v in d['bounding_box']]]
+        for d in detections
+    ]
+
+
+def is_compact(result):
+    return isinstance(result, dict) and result.get('v') == COMPACT_VERSION
+
+
+def _load_catalog():
+    from .models import TrafficSign
+
+    with _catalog_lock:
+        if _catalog['expires_at'] < time.monotonic():
+            rows = list(TrafficSign.objects.values_list(
+                'id', 'name', 'sign_type', 'model_sign_id', 'escalation_threshold'))
+            _catalog['signs'] = {sign_id: (name, sign_type) for sign_id, name, sign_type, _, _ in rows}
+            _catalog['model_signs'] = {
+                model_sign_id: sign_id for sign_id, _, _, model_sign_id, _ in rows if model_sign_id is not None
+            }
+            # Пороги уходят в ML API - по его идентификаторам знаков
+            _catalog['thresholds'] = {
+                model_sign_id: threshold for _, _, _, model_sign_id, threshold in rows
+                if model_sign_id is not None and threshold is not None
+            }
+            _catalog['expires_at'] = time.monotonic() + CATALOG_TTL
+        return _catalog
+
+
+def sign_catalog():
+    """id знака -> (название, тип) из таблицы TrafficSign"""
+    return _load_catalog()['signs']
+
+
+def model_signs():
+    """sign_id ML API -> id TrafficSign (только знаки с заданным model_sign_id)"""
+    return _load_catalog()['model_signs']
+
+
+def escalation_thresholds():
+    """sign_id ML API -> порог эскалации каскада (только знаки с заданным порогом)"""
+    return _load_catalog()['thresholds']
+
+
+def reset_catalog():
+    with _catalog_lock:
+        _catalog['expires_at'] = 0.0
+
+
+def decode_detections(rows, catalog=None):
+    """Компактные строки -> полный список детекций с названиями знаков"""
+    if catalog is None:
+        catalog = sign_catalog()
+    detections = []
+    for sign_id, confidence, *bbox in rows:
+        name, sign_type = catalog.get(sign_id) or ('Unknown sign' if sign_id is None else f'Sign #{sign_id}', 'other')
+        detections.append({
+            'sign_id': sign_id,
+            'sign_name': name,
+            'confidence': confidence,
+            'bounding_box': bbox,
+            'class': sign_type,
+        })
+    return detections
+
+
+def expand_result(result, task_id=None):
+    """Компактный результат задачи -> формат, который ожидает фронтенд"""
+    if not is_compact(result):
+        return result
+
+    expanded = {key: value for key, value in result.items() if key not in ('v', 'd')}
+    expanded['detections'] = decode_detections(result['d'])
+    expanded['total_detections'] = len(result['d'])
+    expanded['file_name'] = result.get('file_path', '').rsplit('/', 1)[-1]
+    if task_id is not None:
+        expanded['task_id'] = task_id
+    return expanded
@@ -0,0 +1,297 @@
+"""
+Получение статуса Celery задач напрямую из result backend
+"""
+import asyncio
+import base64
+import binascii
+import json
+import struct
+import threading
+import time
+import weakref
+import zlib
+
+from asgiref.sync import sync_to_async
+from celery import states
+from celery.result import AsyncResult
+from django.conf import settings
+
+from traffic_sign_app.celery import app as celery_app
+
+from .models import DetectionResult
+from .result_codec import COMPACT_VERSION, expand_result, is_compact
+
+# Отдельный асинхронный клиент Redis на каждый event loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class _TTLCache:
+    """Небольшой потокобезопасный кэш с коротким временем жизни записей"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            if len(self._data) >= self.max_size:
+                self._data.clear()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Гасит шторм одинаковых опросов одной задачи в пределах TTL
+_meta_cache = _TTLCache()
+# Результат поиска задачи среди перенесённых в БД (False - не найдена):
+# опрос задач в очереди обращается к БД не чаще раза за TTL
+_restore_cache = _TTLCache()
+
+
+def _cache_ttl():
+    return getattr(settings, 'TASK_STATUS_CACHE_TTL', 1.0)
+
+
+def redis_backend():
+    """Возвращает backend, если результаты хранятся в Redis, иначе None"""
+    backend = celery_app.backend
+    if backend.__class__.__name__ in ('RedisBackend', 'SentinelBackend'):
+        return backend
+    return None
+
+
+def _async_client(backend):
+    """Асинхронный клиент Redis для текущего event loop"""
+    import redis.asyncio as aioredis
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.from_url(backend.url)
+        _async_clients[loop] = client
+    return client
+
+
+def _meta_from_async_result(task_id):
+    """Метаданные задачи через стандартный AsyncResult (синхронно)"""
+    task_result = AsyncResult(task_id)
+    return {'status': task_result.status, 'result': task_result.result}
+
+
+def _decode_meta(backend, raw):
+    if raw is None:
+        return {'status': states.PENDING, 'result': None}
+    return backend.decode_result(raw)
+
+
+def _split_cached(task_ids):
+    """Делит task_ids на найденные в кэше и те, что нужно запросить"""
+    metas = {}
+    missing = []
+    for task_id in dict.fromkeys(task_ids):
+        meta = _meta_cache.get(task_id)
+        if meta is None:
+            missing.append(task_id)
+        else:
+            metas[task_id] = meta
+    return metas, missing
+
+
+def _store(metas, task_ids, raw_values, backend):
+    ttl = _cache_ttl()
+    for task_id, raw in zip(task_ids, raw_values):
+        meta = _decode_meta(backend, raw)
+        _meta_cache.set(task_id, meta, ttl)
+        metas[task_id] = meta
+    return metas
+
+
+def get_task_metas(task_ids):
+    """
+    Метаданные нескольких задач за один MGET к Redis.
+
+    Возвращает dict task_id -> {'status': ..., 'result': ...}.
+    """
+    metas, missing = _split_cached(task_ids)
+    if not missing:
+        return metas
+
+    backend = redis_backend()
+    if backend is None:
+        for task_id in missing:
+            metas[task_id] = _meta_from_async_result(task_id)
+            _meta_cache.set(task_id, metas[task_id], _cache_ttl())
+        return metas
+
+    keys = [backend.get_key_for_task(task_id) for task_id in missing]
+    return _store(metas, missing, backend.client.mget(keys), backend)
+
+
+async def aget_task_metas(task_ids):
+    """Асинхронная версия get_task_metas (неблокирующий MGET)"""
+    metas, missing = _split_cached(task_ids)
+    if not missing:
+        return metas
+
+    backend = redis_backend()
+    if backend is None:
+        metas.update(await sync_to_async(get_task_metas)(missing))
+        return metas
+
+    keys = [backend.get_key_for_task(task_id) for task_id in missing]
+    raw_values = await _async_client(backend).mget(keys)
+    return _store(metas, missing, raw_values, backend)
+
+
+def _restore_compacted(task_ids):
+    """Результаты задач, которые compact_task_results уже перенёс в БД"""
+    results = {}
+    lookup = []
+    for task_id in task_ids:
+        cached = _restore_cache.get(task_id)
+        if cached is None:
+            lookup.append(task_id)
+        elif cached:
+            results[task_id] = cached
+    if not lookup:
+        return results
+
+    found = {}
+    rows = (DetectionResult.objects.filter(task_id__in=lookup)
+            .order_by('id').values_list('task_id', 'image', 'sign_id', 'confidence', 'bounding_box'))
+    for task_id, image, sign_id, confidence, bounding_box in rows:
+        result = found.setdefault(task_id, {
+            'v': COMPACT_VERSION, 'success': True, 'file_path': image, 'd': [], 'compacted': True,
+        })
+        result['d'].append([sign_id, confidence, *(bounding_box or [])])
+    ttl = _cache_ttl()
+    for task_id in lookup:
+        _restore_cache.set(task_id, found.get(task_id, False), ttl)
+    results.update(found)
+    return results
+
+
+def expand_metas(metas):
+    """
+    Готовит метаданные к отдаче клиенту: разворачивает компактные
+    результаты и восстанавливает из БД задачи, вытесненные из Redis.
+    """
+    pending = [task_id for task_id, meta in metas.items() if meta['status'] == states.PENDING]
+    restored = _restore_compacted(pending) if pending else {}
+
+    expanded = {}
+    for task_id, meta in metas.items():
+        if task_id in restored:
+            meta = {'status': states.SUCCESS, 'result': restored[task_id]}
+        if meta['status'] == states.SUCCESS and is_compact(meta['result']):
+            meta = {**meta, 'result': expand_result(meta['result'], task_id)}
+        expanded[task_id] = meta
+    return expanded
+
+
+def build_status_payload(task_id, meta):
+    """Формирует ответ check-task/ из метаданных задачи"""
+    status = meta['status']
+    response_data = {
+        'task_id': task_id,
+        'status': status,
+        'ready': status in states.READY_STATES,
+    }
+
+    if status == states.SUCCESS:
+        response_data['result'] = meta['result']
+    elif status in states.PROPAGATE_STATES:
+        response_data['error'] = str(meta['result'])
+        response_data['status'] = states.FAILURE
+    elif status == 'PROGRESS':
+        response_data['progress'] = meta['result']
+
+    return response_data
+
+
+def _state_hash(task_id, payload):
+    """32-битный отпечаток состояния задачи"""
+    state = json.dumps(payload, sort_keys=True, default=str)
+    return zlib.crc32(f'{task_id}\0{state}'.encode('utf-8'))
+
+
+def decode_cursor(cursor):
+    """Курсор -> множество отпечатков состояний, которые клиент уже видел"""
+    if not cursor:
+        return set()
+    try:
+        packed = base64.urlsafe_b64decode(cursor.encode('ascii'))
+    except (binascii.Error, ValueError, UnicodeEncodeError):
+        return set()
+    count = len(packed) // 4
+    return set(struct.unpack(f'<{count}I', packed[:count * 4]))
+
+
+def encode_cursor(hashes):
+    packed = struct.pack(f'<{len(hashes)}I', *sorted(hashes))
+    return base64.urlsafe_b64encode(packed).decode('ascii')
+
+
+def build_status_delta(metas, cursor=None):
+    """
+    Ответ пакетной проверки статусов.
+
+    В 'tasks' попадают только задачи, состояние которых изменилось
+    с момента выдачи курсора; новый курсор описывает текущее состояние
+    всех запрошенных задач.
+    """
+    seen = decode_cursor(cursor)
+    changed = {}
+    hashes = []
+    for task_id, meta in metas.items():
+        payload = build_status_payload(task_id, meta)
+        del payload['task_id']
+        state_hash = _state_hash(task_id, payload)
+        hashes.append(state_hash)
+        if state_hash not in seen:
+            changed[task_id] = payload
+
+    return {'tasks': changed, 'cursor': encode_cursor(hashes)}
+
+
+def parse_bulk_request(request):
+    """
+    Достаёт task_ids и курсор из запроса check-tasks/.
+
+    GET: ?ids=a,b,c&cursor=...; POST: {"task_ids": [...], "cursor": "..."}.
+    Возвращает (task_ids, cursor) или бросает ValueError.
+    """
+    if request.method == 'POST':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Request body must be a JSON object')
+        task_ids = data.get('task_ids') or []
+        cursor = data.get('cursor')
+    else:
+        task_ids = [t for t in request.GET.get('ids', '').split(',') if t]
+        cursor = request.GET.get('cursor')
+
+    if not isinstance(task_ids, list) or not all(isinstance(t, str) for t in task_ids):
+        raise ValueError('task_ids must be a list of strings')
+    if not isinstance(cursor, (str, type(None))):
+        raise ValueError('cursor must be a string')
+    limit = getattr(settings, 'TASK_STATUS_BULK_LIMIT', 500)
+    if len(task_ids) > limit:
+        raise ValueError(f'Too many task ids (max {limit})')
+    return task_ids, cursor
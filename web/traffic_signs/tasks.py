@@ -1,74 +1,84 @@
 """
 Celery tasks for traffic_signs application
 """
-from celery import shared_task
+from celery import shared_task, states
+import datetime
 import time
 import os
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .backfill import enqueue_step, file_hash, record_processed, run_batch
+from .caching import invalidate_recent_detections
+from .geo import extract_gps, location_fields
+from .models import BackfillRun, TrafficSign, DetectionResult
+from .ml_client import detect_file, detection_options, track_files
+from .partitions import enforce_retention, ensure_partitions
+from .result_codec import COMPACT_VERSION, encode_detections, is_compact
+from .task_status import redis_backend
+
+STAGES = ['Loading image', 'Detection', 'Post-processing']
+
+
+def _report_progress(task, step):
+    """Обновляет прогресс задачи (шаг step из STAGES, нумерация с 1)"""
+    task.update_state(
+        state='PROGRESS',
+        meta={
+            'current': step,
+            'total': len(STAGES),
+            'percent': int(step * 100 / len(STAGES)),
+            'status': f'Processing step {step}/{len(STAGES)}',
+            'stage': STAGES[step - 1]
+        }
+    )
+
 
 @shared_task(bind=True)
-def process_image_task(self, file_path):
+def process_image_task(self, file_path, tiled=False):
     """
     Celery задача для обработки изображения с дорожными знаками
+
+    Детекцию выполняет ML API; в результат записывается версия модели.
+    tiled=True - тайловая детекция для изображений высокого разрешения.
+    При ML_CASCADE детекция идёт каскадом с порогами из каталога знаков.
     """
     try:
-        # Имитация длительной обработки
-        total_steps = 10
-
-        for i in range(total_steps):
-            # Обновляем прогресс
-            self.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': i + 1,
-                    'total': total_steps,
-                    'percent': int((i + 1) * 100 / total_steps),
-                    'status': f'Processing step {i + 1}/{total_steps}',
-                    'stage': ['Loading image', 'Preprocessing', 'Detection',
-                             'Classification', 'Post-processing'][min(i, 4)]
-                }
-            )
-            time.sleep(1)  # Имитация обработки
+        _report_progress(self, 1)
 
         # Полный путь к файлу
         full_path = os.path.join(settings.MEDIA_ROOT, file_path)
         file_exists = os.path.exists(full_path)
+        gps = None
+        content_hash = None
+        if file_exists:
+            # Координаты съёмки из EXIF: читается только заголовок файла
+            with default_storage.open(file_path, 'rb') as f:
+                gps = extract_gps(f)
+            content_hash = file_hash(file_path)
+
+        _report_progress(self, 2)
+        response = detect_file(file_path, **detection_options(tiled=tiled))
 
-        # Здесь должна быть реальная логика детекции знаков
-        # Пока возвращаем тестовый результат
+        _report_progress(self, 3)
+        if content_hash:
+            # Изображение уже обработано этой версией: backfill его пропустит
+            record_processed(file_path, content_hash, response.get('model_version'), len(response['results']))
 
+        # В backend кладём компактный результат: названия знаков
+        # подставляются из каталога при чтении (см. result_codec)
         return {
+            'v': COMPACT_VERSION,
             'success': True,
             'file_path': file_path,
-            'file_name': os.path.basename(file_path),
             'file_exists': file_exists,
             'file_size': os.path.getsize(full_path) if file_exists else 0,
-            'detections': [
-                {
-                    'sign_id': 1,
-                    'sign_name': 'Stop Sign',
-                    'confidence': 0.95,
-                    'bounding_box': [100, 100, 150, 150],
-                    'class': 'regulatory'
-                },
-                {
-                    'sign_id': 2,
-                    'sign_name': 'Speed Limit 50',
-                    'confidence': 0.87,
-                    'bounding_box': [200, 200, 250, 250],
-                    'class': 'regulatory'
-                },
-                {
-                    'sign_id': 3,
-                    'sign_name': 'Pedestrian Crossing',
-                    'confidence': 0.78,
-                    'bounding_box': [300, 150, 350, 200],
-                    'class': 'warning'
-                }
-            ],
-            'processing_time': total_steps,
-            'total_detections': 3,
-            'task_id': self.request.id,
+            'd': encode_detections(response['results']),
+            'gps': list(gps) if gps else None,
+            'model_version': response.get('model_version'),
+            'escalated': response.get('escalated'),
+            'processing_time': response['processing_time'],
             'timestamp': time.time()
         }
     except Exception as e:
@@ -77,4 +87,152 @@ def process_image_task(self, file_path):
             'error': str(e),
             'file_path': file_path,
             'task_id': self.request.id
-        }
\ No newline at end of file
+        }
+
+
+@shared_task(bind=True)
+def process_video_frames_task(self, frame_paths):
+    """
+    Celery задача для последовательности кадров видео одной камеры
+
+    Кадры обрабатываются с трекингом: каждый знак попадает в результат
+    один раз, классификатор вызывается только для новых и неуверенных треков.
+    """
+    try:
+        response = track_files(frame_paths)
+        return {
+            'success': True,
+            'frames': len(frame_paths),
+            'tracks': response['tracks'],
+            'stats': response['stats'],
+            'model_version': response.get('model_version'),
+            'processing_time': response['processing_time'],
+            'timestamp': time.time()
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'frames': len(frame_paths),
+            'task_id': self.request.id
+        }
+
+
+@shared_task
+def backfill_task(run_id, token):
+    """
+    Шаг прогона backfill: пакет устаревших изображений, затем следующий шаг
+    с задержкой по rate прогона (см. traffic_signs.backfill)
+    """
+    run = BackfillRun.objects.filter(pk=run_id).first()
+    if run is None:
+        return {'stopped': 'run does not exist'}
+    countdown = run_batch(run, token)
+    if countdown is None:
+        run.refresh_from_db()
+        return {'stopped': run.status}
+    enqueue_step(run, countdown=countdown)
+    return {'next_in': round(countdown, 3)}
+
+
+@shared_task
+def maintain_detection_partitions(retention_days=None, months_ahead=None):
+    """
+    Создаёт будущие секции DetectionResult и удаляет истёкшие вместе
+    с файлами изображений (см. traffic_signs.partitions)
+    """
+    if retention_days is None:
+        retention_days = settings.DETECTION_RETENTION_DAYS
+    if months_ahead is None:
+        months_ahead = settings.DETECTION_PARTITIONS_AHEAD
+    created = ensure_partitions(months_ahead)
+    dropped = enforce_retention(retention_days) if retention_days > 0 else []
+    if dropped:
+        invalidate_recent_detections()
+    return {
+        'created': created,
+        'dropped': [name for name, _ in dropped],
+        'media_deleted': sum(files for _, files in dropped),
+    }
+
+
+@shared_task
+def compact_task_results(batch_size=500, min_age=None):
+    """
+    Переносит завершённые результаты детекции из Redis в DetectionResult
+    и удаляет их из result backend.
+
+    Статус таких задач после переноса восстанавливается из БД по task_id.
+    """
+    backend = redis_backend()
+    if backend is None:
+        return {'skipped': 'result backend is not Redis'}
+
+    if min_age is None:
+        min_age = settings.RESULT_COMPACTION_MIN_AGE
+    cutoff = time.time() - min_age
+    known_signs = set(TrafficSign.objects.values_list('id', flat=True))
+    stats = {'scanned': 0, 'compacted': 0, 'rows': 0}
+
+    keys = []
+    for key in backend.client.scan_iter(match=backend.task_keyprefix + b'*', count=batch_size):
+        keys.append(key)
+        if len(keys) >= batch_size:
+            _compact_batch(backend, keys, cutoff, known_signs, stats)
+            keys = []
+    if keys:
+        _compact_batch(backend, keys, cutoff, known_signs, stats)
+    return stats
+
+
+def _compact_batch(backend, keys, cutoff, known_signs, stats):
+    candidates = {}
+    for key, raw in zip(keys, backend.client.mget(keys)):
+        stats['scanned'] += 1
+        if raw is None:
+            continue
+        meta = backend.decode_result(raw)
+        result = meta.get('result')
+        if meta['status'] != states.SUCCESS or not is_compact(result):
+            continue
+        # Пустые результаты и результаты с неизвестными знаками не переносим:
+        # восстановить их статус из БД было бы не по чему, они истекут
+        # по CELERY_RESULT_EXPIRES
+        if not result['d'] or any(row[0] not in known_signs for row in result['d']):
+            continue
+        if result.get('timestamp', 0) > cutoff:
+            continue
+        candidates[meta['task_id']] = (key, result)
+
+    if not candidates:
+        return
+    # Задачи, уже перенесённые прошлым запуском, который не успел удалить
+    # ключи из Redis, повторно не вставляются - ключи только удаляются
+    done = set(DetectionResult.objects.filter(task_id__in=candidates).values_list('task_id', flat=True))
+    rows = []
+    compacted_keys = []
+    for task_id, (key, result) in candidates.items():
+        compacted_keys.append(key)
+        if task_id in done:
+            continue
+        location = location_fields(*(result.get('gps') or (None, None)))
+        # Время обработки, а не переноса: от него зависят секция и срок хранения
+        detected_at = datetime.datetime.fromtimestamp(result['timestamp'], tz=datetime.timezone.utc)
+        for sign_id, confidence, *bbox in result['d']:
+            rows.append(DetectionResult(
+                image=result['file_path'],
+                sign_id=sign_id,
+                confidence=confidence,
+                bounding_box=bbox,
+                task_id=task_id,
+                detected_at=detected_at,
+                **location,
+            ))
+
+    if rows:
+        with transaction.atomic():
+            DetectionResult.objects.bulk_create(rows, batch_size=500)
+        invalidate_recent_detections()
+    backend.client.delete(*compacted_keys)
+    stats['compacted'] += len(compacted_keys)
+    stats['rows'] += len(rows)
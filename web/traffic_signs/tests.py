@@ -1,3 +1,1017 @@
-from django.test import TestCase
+import datetime
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, AsyncRequestFactory, override_settings
+from django.urls import reverse
+
+import httpx
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from .async_views import AsyncAPIView, async_check_task_status, async_upload_image
+from .models import BackfillRun, ProcessedImage, TrafficSign, DetectionResult
+from . import backfill, geo, partitions, queues, result_codec, task_status
+from .task_status import build_status_payload, build_status_delta, expand_metas
+from .tasks import compact_task_results, process_image_task, process_video_frames_task
+
+
+class TaskStatusTests(TestCase):
+    def test_build_status_payload_success(self):
+        payload = build_status_payload('abc', {'status': 'SUCCESS', 'result': {'success': True}})
+        self.assertTrue(payload['ready'])
+        self.assertEqual(payload['result'], {'success': True})
+
+    def test_build_status_payload_progress(self):
+        payload = build_status_payload('abc', {'status': 'PROGRESS', 'result': {'percent': 40}})
+        self.assertFalse(payload['ready'])
+        self.assertEqual(payload['progress']['percent'], 40)
+
+    def test_build_status_payload_revoked_is_failure(self):
+        payload = build_status_payload('abc', {'status': 'REVOKED', 'result': 'terminated'})
+        self.assertEqual(payload['status'], 'FAILURE')
+        self.assertEqual(payload['error'], 'terminated')
+
+
+class BulkTaskStatusTests(TestCase):
+    def setUp(self):
+        task_status._meta_cache.clear()
+        task_status._restore_cache.clear()
+
+    def test_delta_returns_only_changed_tasks(self):
+        metas = {
+            'a': {'status': 'PROGRESS', 'result': {'percent': 10}},
+            'b': {'status': 'PENDING', 'result': None},
+        }
+        first = build_status_delta(metas)
+        self.assertEqual(set(first['tasks']), {'a', 'b'})
+
+        self.assertEqual(build_status_delta(metas, first['cursor'])['tasks'], {})
+
+        metas['a'] = {'status': 'PROGRESS', 'result': {'percent': 20}}
+        second = build_status_delta(metas, first['cursor'])
+        self.assertEqual(list(second['tasks']), ['a'])
+        self.assertEqual(second['tasks']['a']['progress']['percent'], 20)
+
+    def test_invalid_cursor_is_treated_as_empty(self):
+        metas = {'a': {'status': 'PENDING', 'result': None}}
+        self.assertEqual(list(build_status_delta(metas, '%%%')['tasks']), ['a'])
+
+    def test_get_task_metas_uses_single_mget_and_cache(self):
+        backend = mock.Mock()
+        backend.get_key_for_task.side_effect = lambda task_id: f'celery-task-meta-{task_id}'
+        backend.client.mget.return_value = [None, b'raw']
+        backend.decode_result.return_value = {'status': 'SUCCESS', 'result': 1}
+
+        with mock.patch.object(task_status, 'redis_backend', return_value=backend):
+            metas = task_status.get_task_metas(['a', 'b'])
+            task_status.get_task_metas(['a', 'b'])
+
+        backend.client.mget.assert_called_once_with(['celery-task-meta-a', 'celery-task-meta-b'])
+        self.assertEqual(metas['a']['status'], 'PENDING')
+        self.assertEqual(metas['b']['status'], 'SUCCESS')
+
+    def test_pending_tasks_hit_db_once_per_ttl(self):
+        metas = {'a': {'status': 'PENDING', 'result': None}}
+        with self.assertNumQueries(1):
+            expand_metas(metas)
+        with self.assertNumQueries(0):
+            self.assertEqual(expand_metas(metas)['a']['status'], 'PENDING')
+
+    def test_check_tasks_view(self):
+        metas = {'a': {'status': 'SUCCESS', 'result': {'ok': True}}}
+        with mock.patch('traffic_signs.celery_views.get_task_metas', return_value=metas) as get_metas:
+            response = self.client.post(reverse('traffic_signs:check_tasks'),
+                                        data={'task_ids': ['a']}, content_type='application/json')
+        get_metas.assert_called_once_with(['a'])
+        data = response.json()
+        self.assertEqual(data['tasks']['a']['result'], {'ok': True})
+        self.assertIn('cursor', data)
+
+    def test_check_tasks_view_rejects_bad_payload(self):
+        response = self.client.post(reverse('traffic_signs:check_tasks'),
+                                    data={'task_ids': 'a'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_check_tasks_view_rejects_non_object_body_and_cursor(self):
+        for payload in (['a'], {'task_ids': ['a'], 'cursor': 5}):
+            response = self.client.post(reverse('traffic_signs:check_tasks'),
+                                        data=payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class ResultCompactionTests(TestCase):
+    def setUp(self):
+        result_codec.reset_catalog()
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop', model_sign_id=5)
+        task_status._restore_cache.clear()
+
+    def _compact_result(self, sign_id, timestamp=0):
+        return {
+            'v': 1, 'success': True, 'file_path': 'celery_uploads/a.jpg', 'timestamp': timestamp,
+            'd': result_codec.encode_detections([
+                {'sign_id': sign_id, 'confidence': 0.91, 'bounding_box': [1, 2, 3, 4]},
+            ]),
+        }
+
+    def test_expand_result_resolves_names_from_catalog(self):
+        result = result_codec.expand_result(self._compact_result(5), task_id='t1')
+        detection = result['detections'][0]
+        self.assertEqual(detection['sign_id'], self.sign.id)
+        self.assertEqual(detection['sign_name'], 'Стоп')
+        self.assertEqual(detection['class'], 'stop')
+        self.assertEqual(detection['bounding_box'], [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(result['file_name'], 'a.jpg')
+        self.assertEqual(result['total_detections'], 1)
+
+    def test_compaction_moves_results_to_db_and_evicts(self):
+        old = {'status': 'SUCCESS', 'task_id': 'old',
+               'result': {**self._compact_result(5, timestamp=1718000000), 'gps': [55.75, 37.6]}}
+        fresh = {'status': 'SUCCESS', 'task_id': 'new',
+                 'result': self._compact_result(5, timestamp=10 ** 12)}
+        backend = mock.Mock(task_keyprefix=b'celery-task-meta-')
+        backend.client.scan_iter.return_value = [b'celery-task-meta-old', b'celery-task-meta-new']
+        backend.client.mget.return_value = [b'old', b'new']
+        backend.decode_result.side_effect = lambda raw: old if raw == b'old' else fresh
+
+        with mock.patch('traffic_signs.tasks.redis_backend', return_value=backend):
+            stats = compact_task_results(min_age=60)
+
+        self.assertEqual(stats['compacted'], 1)
+        backend.client.delete.assert_called_once_with(b'celery-task-meta-old')
+        row = DetectionResult.objects.get(task_id='old')
+        self.assertEqual(row.sign_id, self.sign.id)
+        self.assertEqual(row.bounding_box, [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(row.geohash, geo.encode_geohash(55.75, 37.6))
+        self.assertEqual(row.detected_at, datetime.datetime(2024, 6, 10, 6, 13, 20, tzinfo=datetime.timezone.utc))
+
+        # После вытеснения из Redis статус восстанавливается из БД
+        meta = expand_metas({'old': {'status': 'PENDING', 'result': None}})['old']
+        self.assertEqual(meta['status'], 'SUCCESS')
+        self.assertEqual(meta['result']['detections'][0]['sign_name'], 'Стоп')
+
+    def test_compaction_skips_tasks_already_in_db(self):
+        # Прошлый запуск вставил строки, но упал до удаления ключа из Redis
+        DetectionResult.objects.create(image='celery_uploads/a.jpg', sign=self.sign, confidence=0.91,
+                                       task_id='old')
+        old = {'status': 'SUCCESS', 'task_id': 'old', 'result': self._compact_result(5, timestamp=1718000000)}
+        backend = mock.Mock(task_keyprefix=b'celery-task-meta-')
+        backend.client.scan_iter.return_value = [b'celery-task-meta-old']
+        backend.client.mget.return_value = [b'old']
+        backend.decode_result.return_value = old
+
+        with mock.patch('traffic_signs.tasks.redis_backend', return_value=backend):
+            stats = compact_task_results(min_age=60)
+
+        self.assertEqual(stats, {'scanned': 1, 'compacted': 1, 'rows': 0})
+        backend.client.delete.assert_called_once_with(b'celery-task-meta-old')
+        self.assertEqual(DetectionResult.objects.filter(task_id='old').count(), 1)
+
+
+def _jpeg_with_gps(gps=None):
+    import io
+    from PIL import Image
+
+    exif = Image.Exif()
+    if gps is not None:
+        exif[geo.GPS_IFD] = gps
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop')
+
+    def _detection(self, latitude, longitude):
+        return DetectionResult.objects.create(
+            image='a.jpg', sign=self.sign, confidence=0.9, **geo.location_fields(latitude, longitude),
+        )
+
+    def test_extract_gps_from_exif(self):
+        image = SimpleUploadedFile('gps.jpg', _jpeg_with_gps({
+            1: 'N', 2: (55.0, 45.0, 36.0), 3: 'W', 4: (37.0, 37.0, 0.0),
+        }))
+        latitude, longitude = geo.extract_gps(image)
+        self.assertAlmostEqual(latitude, 55.76)
+        self.assertAlmostEqual(longitude, -37.6166667)
+        self.assertEqual(image.tell(), 0)
+        self.assertIsNone(geo.extract_gps(SimpleUploadedFile('plain.jpg', _jpeg_with_gps())))
+
+    def test_geohash(self):
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_prefix_ranges_use_only_geohash_characters(self):
+        self.assertEqual(geo.prefix_stop('u4p'), 'u4q')
+        self.assertEqual(geo.prefix_stop('u49'), 'u4b')
+        self.assertEqual(geo.prefix_stop('u4z'), 'u5')
+        self.assertIsNone(geo.prefix_stop('zz'))
+        for start, stop in geo.cover_bbox(55.74, 37.59, 55.76, 37.61) + geo.cover_bbox(80, 170, 90, 180):
+            self.assertTrue(set(start + (stop or '')) <= set(geo._BASE32))
+            self.assertTrue(stop is None or start < stop)
+
+    def test_nearby_uses_exact_distance_and_keyset_pagination(self):
+        near = [self._detection(55.7500 + i * 0.0002, 37.6000) for i in range(3)]  # до ~45 м
+        self._detection(55.7520, 37.6030)  # в описанном квадрате, но дальше 200 м
+        self._detection(59.9300, 30.3300)  # другой город
+        self._detection(None, None)
+
+        url = reverse('traffic_signs:detections_nearby')
+        seen = []
+        cursor = ''
+        for _ in range(3):
+            data = self.client.get(url, {'lat': 55.75, 'lon': 37.6, 'radius': 200, 'limit': 2,
+                                         'cursor': cursor}).json()
+            seen += [row['id'] for row in data['results']]
+            self.assertTrue(all(row['distance_m'] < 50 for row in data['results']))
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), [detection.id for detection in near])
+
+        response = self.client.get(url, {'lat': 55.75, 'lon': 37.6, 'cursor': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bbox_query(self):
+        inside = self._detection(10.5, 20.5)
+        self._detection(10.5, 21.5)
+        url = reverse('traffic_signs:detections_bbox')
+        data = self.client.get(url, {'min_lat': 10, 'min_lon': 20, 'max_lat': 11, 'max_lon': 21}).json()
+        self.assertEqual([row['id'] for row in data['results']], [inside.id])
+        self.assertEqual(data['results'][0]['sign_name'], 'Стоп')
+
+        response = self.client.get(url, {'min_lat': 11, 'min_lon': 20, 'max_lat': 10, 'max_lon': 21})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cover_bbox_matches_full_scan(self):
+        import random
+        rng = random.Random(1)
+        for _ in range(200):
+            self._detection(rng.uniform(55.0, 56.0), rng.uniform(37.0, 38.0))
+        box = (55.31, 37.22, 55.47, 37.61)
+        expected = set(DetectionResult.objects.filter(
+            latitude__range=box[0::2], longitude__range=box[1::2]).values_list('id', flat=True))
+        self.assertEqual(set(geo.bbox_queryset(*box).values_list('id', flat=True)), expected)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.stop = TrafficSign.objects.create(name='Стоп', sign_type='stop')
+        self.parking = TrafficSign.objects.create(name='Парковка', sign_type='parking')
+        for i in range(5):
+            DetectionResult.objects.create(image=f'd{i}.jpg', sign=self.stop if i % 2 else self.parking,
+                                           confidence=0.5 + i / 10, bounding_box=[1, 2, 3, 4])
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def _export(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('traffic_signs:detections_export'), params)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_csv_export_streams_in_chunks(self):
+        from .export import stream_export
+
+        chunks = list(stream_export('csv', chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'detected_at', 'sign_id', 'sign_name'])
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"[1, 2, 3, 4]"', lines[1])
+
+    def test_ndjson_export_with_sign_and_time_filters(self):
+        response, body = self._export(format='ndjson', sign=str(self.stop.id), since='2000-01-01')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row['sign_name'] == 'Стоп' for row in rows))
+
+        _, body = self._export(format='ndjson', until='2000-01-01')
+        self.assertEqual(body, b'')
+
+    def test_parquet_export(self):
+        try:
+            import io
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        from .export import stream_export
+
+        table = pq.read_table(io.BytesIO(b''.join(stream_export('parquet', chunk_size=2))))
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('bounding_box')[0].as_py(), [1.0, 2.0, 3.0, 4.0])
+
+    def test_bad_parameters_and_permissions(self):
+        response, _ = self._export(format='xml')
+        self.assertEqual(response.status_code, 400)
+        response, _ = self._export(since='yesterday')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.logout()
+        response = self.client.get(reverse('traffic_signs:detections_export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_management_command_writes_file(self):
+        import os
+        import tempfile
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.ndjson')
+            call_command('export_detections', format='ndjson', output=path, stderr=mock.Mock())
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 5)
+
+
+class IngestImagesTests(TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop', model_sign_id=5)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = os.path.join(self.tmp.name, 'images')
+        os.makedirs(os.path.join(self.root, 'cam2'))
+        for name in ('a.jpg', 'b.jpg', 'cam2/c.jpg'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(_jpeg_with_gps({1: 'N', 2: (10.0, 0.0, 0.0), 3: 'E', 4: (20.0, 0.0, 0.0)}))
+        with open(os.path.join(self.root, 'notes.txt'), 'w') as f:
+            f.write('not an image')
+
+    def _ingest(self, **options):
+        from django.core.management import call_command
+
+        def detect_batch(images, **kwargs):
+            detection = {'sign_id': 5, 'confidence': 0.9, 'bounding_box': [1, 2, 3, 4]}
+            unknown = {'sign_id': 999, 'confidence': 0.5, 'bounding_box': [0, 0, 1, 1]}
+            return [[detection, unknown] for _ in images], '1.0.0'
+
+        with self.settings(MEDIA_ROOT=self.tmp.name + '/media'), \
+                mock.patch('traffic_signs.ml_client.detect_batch', side_effect=detect_batch) as api:
+            call_command('ingest_images', self.root, workers=0, batch_size=2,
+                         stdout=mock.Mock(), stderr=mock.Mock(), **options)
+        return api
+
+    def test_ingest_inserts_rows_and_resumes_from_checkpoint(self):
+        import os
+
+        api = self._ingest()
+        self.assertEqual(api.call_count, 2)  # 3 изображения пакетами по 2
+        rows = DetectionResult.objects.order_by('task_id')
+        self.assertEqual([row.task_id for row in rows], ['ingest:a.jpg', 'ingest:b.jpg', 'ingest:cam2/c.jpg'])
+        self.assertEqual(rows[0].geohash, geo.encode_geohash(10.0, 20.0))
+        self.assertTrue(rows[0].image.name.startswith('ingest/'))
+
+        # Повторный запуск: всё уже в контрольной точке
+        api = self._ingest()
+        api.assert_not_called()
+
+        # Контрольная точка потеряна: файлы обрабатываются снова, но дубликатов нет
+        os.remove(os.path.join(self.root, '.ingest_checkpoint'))
+        self._ingest()
+        self.assertEqual(DetectionResult.objects.count(), 3)
+
+
+class BackfillTests(TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop', model_sign_id=5)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.paths = ['celery_uploads/a.jpg', 'detections/2024/01/02/b.jpg',
+                      'detections/2024/01/02/c.jpg', 'direct_uploads/d.jpg']
+        for path in self.paths:
+            os.makedirs(os.path.dirname(os.path.join(self.tmp.name, path)), exist_ok=True)
+            with open(os.path.join(self.tmp.name, path), 'wb') as f:
+                f.write(_jpeg_with_gps())
+        self.media = self.settings(MEDIA_ROOT=self.tmp.name)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        self.detected_at = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        DetectionResult.objects.create(image='celery_uploads/a.jpg', sign=self.sign, confidence=0.5,
+                                       task_id='task-a', bounding_box=[0, 0, 1, 1], detected_at=self.detected_at)
+
+    def _run(self, version='2.0.0', batch_size=2, steps=10):
+        def detect_batch(images, **kwargs):
+            detection = {'sign_id': 5, 'confidence': 0.9, 'bounding_box': [1, 2, 3, 4]}
+            return [[detection] for _ in images], version
+
+        with mock.patch('traffic_signs.backfill.enqueue_step') as enqueue, \
+                mock.patch('traffic_signs.ml_client.detect_batch', side_effect=detect_batch) as api:
+            run = backfill.start(version, rate=1000, batch_size=batch_size)
+            for _ in range(steps):
+                if backfill.run_batch(run, run.token) is None:
+                    break
+        enqueue.assert_called_once_with(run)
+        run.refresh_from_db()
+        return run, api
+
+    def test_iter_images_resumes_after_cursor(self):
+        self.assertEqual(list(backfill.iter_images()), self.paths)
+        self.assertEqual(list(backfill.iter_images('detections/2024/01/02/b.jpg')), self.paths[2:])
+
+    def test_reprocesses_only_stale_images(self):
+        import os
+
+        run, api = self._run()
+        self.assertEqual((run.status, run.processed, run.skipped), (BackfillRun.DONE, 4, 0))
+        self.assertEqual(api.call_count, 2)
+        self.assertEqual(set(ProcessedImage.objects.values_list('model_version', flat=True)), {'2.0.0'})
+        # Строки изображения заменены, task_id и время детекции (секция) прежние
+        row = DetectionResult.objects.get(image='celery_uploads/a.jpg')
+        self.assertEqual((row.task_id, row.confidence, row.detected_at), ('task-a', 0.9, self.detected_at))
+        self.assertEqual(DetectionResult.objects.count(), 4)
+
+        # Та же версия: ничего не отправляется
+        run, api = self._run()
+        api.assert_not_called()
+        self.assertEqual((run.processed, run.skipped), (0, 4))
+
+        # Изменённый после обработки файл обрабатывается снова
+        path = os.path.join(self.tmp.name, 'direct_uploads/d.jpg')
+        with open(path, 'ab') as f:
+            f.write(b'\0')
+        future = ProcessedImage.objects.get(path='direct_uploads/d.jpg').processed_at.timestamp() + 10
+        os.utime(path, (future, future))
+        run, api = self._run()
+        self.assertEqual((run.processed, run.skipped), (1, 3))
+
+    def test_pause_and_resume(self):
+        with mock.patch('traffic_signs.backfill.enqueue_step') as enqueue, \
+                mock.patch('traffic_signs.ml_client.detect_batch',
+                           side_effect=lambda images, **kwargs: ([[] for _ in images], '2.0.0')):
+            run = backfill.start('2.0.0', rate=1000, batch_size=2)
+            old_token = run.token
+            self.assertIsNotNone(backfill.run_batch(run, old_token))
+            backfill.pause(run)
+            self.assertIsNone(backfill.run_batch(run, old_token))
+            self.assertEqual(run.processed, 2)
+
+            run = backfill.resume(run)
+            self.assertEqual(run.status, BackfillRun.RUNNING)
+            self.assertEqual(enqueue.call_count, 2)
+            # Задача старой цепочки, ещё стоявшая в очереди, ничего не делает
+            self.assertIsNone(backfill.run_batch(run, old_token))
+            while backfill.run_batch(run, run.token) is not None:
+                pass
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.processed), (BackfillRun.DONE, 4))
+
+    def test_api_outage_keeps_cursor_and_pauses(self):
+        with mock.patch('traffic_signs.backfill.enqueue_step'), \
+                mock.patch('traffic_signs.ml_client.detect_batch', side_effect=httpx.ConnectError('refused')):
+            run = backfill.start('2.0.0', rate=1000, batch_size=2)
+            delays = [backfill.run_batch(run, run.token) for _ in range(backfill.MAX_FAILURES_IN_ROW)]
+        self.assertEqual(delays[:3], [30, 60, 120])
+        self.assertIsNone(delays[-1])
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.cursor, run.processed), (BackfillRun.PAUSED, '', 0))
+        self.assertEqual(run.failures_in_row, backfill.MAX_FAILURES_IN_ROW)
+        self.assertIn('refused', run.last_error)
+
+        # После продолжения тот же пакет обрабатывается, счётчик ошибок сброшен
+        with mock.patch('traffic_signs.backfill.enqueue_step'), \
+                mock.patch('traffic_signs.ml_client.detect_batch',
+                           side_effect=lambda images, **kwargs: ([[] for _ in images], '2.0.0')):
+            run = backfill.resume(run)
+            while backfill.run_batch(run, run.token) is not None:
+                pass
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.processed, run.failures_in_row), (BackfillRun.DONE, 4, 0))
+
+    def test_other_model_version_pauses_without_writing(self):
+        with mock.patch('traffic_signs.backfill.enqueue_step'), \
+                mock.patch('traffic_signs.ml_client.detect_batch',
+                           side_effect=lambda images, **kwargs: ([[] for _ in images], '1.9.0')):
+            run = backfill.start('2.0.0', rate=1000, batch_size=2)
+            self.assertIsNone(backfill.run_batch(run, run.token))
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.cursor, run.processed), (BackfillRun.PAUSED, '', 0))
+        self.assertIn("'1.9.0'", run.last_error)
+        self.assertEqual(DetectionResult.objects.get(image='celery_uploads/a.jpg').task_id, 'task-a')
+        self.assertFalse(ProcessedImage.objects.exists())
+
+
+class PartitionTests(TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.media = self.settings(MEDIA_ROOT=self.tmp.name)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        self.now = datetime.datetime(2024, 6, 10, tzinfo=datetime.timezone.utc)
+        for month in (1, 2, 5):
+            path = f'detections/2024/{month:02d}/01/{month}.jpg'
+            os.makedirs(os.path.dirname(os.path.join(self.tmp.name, path)), exist_ok=True)
+            with open(os.path.join(self.tmp.name, path), 'wb') as f:
+                f.write(b'jpeg')
+            ProcessedImage.objects.create(path=path, content_hash='x', model_version='1.0.0')
+            DetectionResult.objects.bulk_create([
+                DetectionResult(image=path, sign=self.sign, confidence=0.9,
+                                detected_at=datetime.datetime(2024, month, 20, 12, tzinfo=datetime.timezone.utc))
+                for _ in range(3)
+            ])
+
+    def test_month_arithmetic(self):
+        start = partitions.month_start(datetime.datetime(2024, 12, 31, 23, tzinfo=datetime.timezone.utc))
+        self.assertEqual(partitions.partition_for(start),
+                         partitions.Partition('traffic_signs_detectionresult_p2024_12', start,
+                                              datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)))
+
+    @skipUnless(connection.vendor == 'sqlite', 'логические секции - только без секционирования БД')
+    def test_logical_partitions_on_sqlite(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(partitions.ensure_partitions(3), [])
+        names = [partition.name[-7:] for partition in partitions.list_partitions()]
+        self.assertEqual(names, ['2024_01', '2024_02', '2024_03', '2024_04', '2024_05'])
+        expired = partitions.expired_partitions(90, now=self.now)
+        self.assertEqual([partition.name[-7:] for partition in expired], ['2024_01', '2024_02'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'секционирование средствами БД - только Postgres')
+    def test_native_partitions_on_postgres(self):
+        def rows_in(table):
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                return cursor.fetchone()[0]
+
+        self.assertTrue(partitions.is_partitioned())
+        # Строки 2024 года лежат в DEFAULT; секция мая забирает свои строки оттуда
+        may = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(partitions.ensure_partitions(1, now=may),
+                         ['traffic_signs_detectionresult_p2024_05', 'traffic_signs_detectionresult_p2024_06'])
+        self.assertEqual(rows_in('traffic_signs_detectionresult_p2024_05'), 3)
+        self.assertEqual(rows_in(partitions.DEFAULT_PARTITION), 6)
+        # Отложенные проверки FK перенесённых строк - как при COMMIT, иначе DROP их не пустит
+        connection.check_constraints()
+
+        expired = partitions.expired_partitions(90, now=self.now)
+        self.assertEqual([partition.name[-7:] for partition in expired], ['2024_01', '2024_02'])
+
+        # Истёкшие месяцы из DEFAULT удаляются пачками, созданная секция - DETACH + DROP
+        dropped = partitions.enforce_retention(90, now=datetime.datetime(2024, 10, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual([name[-7:] for name, _ in dropped], ['2024_01', '2024_02', '2024_05', '2024_06'])
+        self.assertEqual(DetectionResult.objects.count(), 0)
+        self.assertEqual([partition.name[-7:] for partition in partitions.list_partitions()
+                          if partition.start.year == 2024], [])
+
+    def test_retention_drops_expired_months_with_media(self):
+        import os
+
+        with mock.patch('traffic_signs.partitions.RETENTION_DELETE_CHUNK', 2):
+            dropped = partitions.enforce_retention(90, now=self.now)
+        self.assertEqual(dropped, [('traffic_signs_detectionresult_p2024_01', 1),
+                                   ('traffic_signs_detectionresult_p2024_02', 1)])
+        self.assertEqual(set(DetectionResult.objects.values_list('image', flat=True)), {'detections/2024/05/01/5.jpg'})
+        self.assertEqual(DetectionResult.objects.count(), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'detections/2024/01/01/1.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, 'detections/2024/05/01/5.jpg')))
+        self.assertEqual(list(ProcessedImage.objects.values_list('path', flat=True)), ['detections/2024/05/01/5.jpg'])
+
+    def test_maintenance_task_keeps_everything_without_retention(self):
+        from .tasks import maintain_detection_partitions
+
+        self.assertEqual(maintain_detection_partitions(retention_days=0),
+                         {'created': [], 'dropped': [], 'media_deleted': 0})
+        self.assertEqual(DetectionResult.objects.count(), 9)
+
+    def test_deleting_sign_removes_its_history(self):
+        self.sign.delete()
+        self.assertEqual(DetectionResult.objects.count(), 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DetectionAdminTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        result_codec.reset_catalog()
+        self.stop = TrafficSign.objects.create(name='Стоп', sign_type='stop')
+        self.parking = TrafficSign.objects.create(name='Парковка', sign_type='parking')
+        self.rows = [
+            DetectionResult.objects.create(image=f'd{i}.jpg', sign=self.stop if i % 2 else self.parking,
+                                           confidence=0.9, task_id=f'task-{i}')
+            for i in range(5)
+        ]
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.url = reverse('admin:traffic_signs_detectionresult_changelist')
+
+    def _result_ids(self, response):
+        return [obj.pk for obj in response.context['cl'].result_list]
+
+    def test_keyset_pagination(self):
+        from .admin import FastDetectionResultAdmin
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with mock.patch.object(FastDetectionResultAdmin, 'list_per_page', 2), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql']])
+            ids = self._result_ids(response)
+            self.assertEqual(ids, [self.rows[4].pk, self.rows[3].pk])
+            cl = response.context['cl']
+            self.assertEqual(cl.result_count, self.rows[4].pk)  # оценка по MAX(id)
+            self.assertContains(response, f'after={self.rows[3].pk}')
+
+            response = self.client.get(self.url, {'after': self.rows[1].pk})
+            self.assertEqual(self._result_ids(response), [self.rows[0].pk])
+            self.assertIsNone(response.context['cl'].next_page_url)
+
+    def test_filter_and_search_use_cached_catalog(self):
+        response = self.client.get(self.url, {'sign': self.stop.pk})
+        self.assertEqual(sorted(self._result_ids(response)), [self.rows[1].pk, self.rows[3].pk])
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+        response = self.client.get(self.url, {'q': 'парк'})
+        self.assertEqual(len(self._result_ids(response)), 3)
+        response = self.client.get(self.url, {'q': 'task-2'})
+        self.assertEqual(self._result_ids(response), [self.rows[2].pk])
+
+    def test_sorted_changelist_falls_back_to_pages(self):
+        response = self.client.get(self.url, {'o': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._result_ids(response)), 5)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CachingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.sign = TrafficSign.objects.create(name='Стоп', sign_type='stop')
+
+    def _detection(self, image):
+        return DetectionResult.objects.create(image=image, sign=self.sign, confidence=0.9)
+
+    def test_recent_detections_fragment_is_cached_until_save(self):
+        self._detection('detections/first.jpg')
+        url = reverse('traffic_signs:upload')
+        self.assertContains(self.client.get(url), 'first.jpg')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self._detection('detections/second.jpg')
+        self.assertContains(self.client.get(url), 'second.jpg')
+
+        # Пакетная вставка сигналов не шлёт - кэш сбрасывается явно
+        from .caching import invalidate_recent_detections
+        DetectionResult.objects.bulk_create([
+            DetectionResult(image='detections/third.jpg', sign=self.sign, confidence=0.9)])
+        self.assertNotContains(self.client.get(url), 'third.jpg')
+        invalidate_recent_detections()
+        self.assertContains(self.client.get(url), 'third.jpg')
+
+    def test_sign_rename_resets_catalog_and_fragment(self):
+        self._detection('detections/first.jpg')
+        url = reverse('traffic_signs:upload')
+        self.client.get(url)
+        result_codec.sign_catalog()
+        self.sign.name = 'Уступи дорогу'
+        self.sign.save()
+        self.assertEqual(result_codec.sign_catalog()[self.sign.id][0], 'Уступи дорогу')
+        self.assertContains(self.client.get(url), 'Уступи дорогу')
+
+    def test_static_pages_are_cached(self):
+        response = self.client.get(reverse('traffic_signs:api_docs'))
+        self.assertIn('max-age', response['Cache-Control'])
+        with mock.patch('traffic_signs.views.render') as render:
+            self.client.get(reverse('traffic_signs:api_docs'))
+        render.assert_not_called()
+
+
+class DatabaseConfigTests(TestCase):
+    def test_postgres_url(self):
+        from traffic_sign_app.database import database_config
+
+        config = database_config('postgres://user:p%40ss@db:5432/signs?sslmode=require', '/tmp/db.sqlite3',
+                                 conn_max_age=120)
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['USER'], config['PASSWORD'], config['HOST'], config['PORT']),
+                         ('signs', 'user', 'p@ss', 'db', '5432'))
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (120, True))
+
+    def test_sqlite_url_and_default(self):
+        from traffic_sign_app.database import database_config, parse_database_url
+
+        config = database_config('sqlite:////var/data/db.sqlite3', '/tmp/db.sqlite3', sqlite_busy_timeout=15)
+        self.assertEqual((config['NAME'], config['OPTIONS']), ('/var/data/db.sqlite3', {'timeout': 15}))
+        self.assertEqual(database_config('', '/tmp/db.sqlite3')['NAME'], '/tmp/db.sqlite3')
+        with self.assertRaises(ValueError):
+            parse_database_url('mysql://localhost/db')
+
+    def test_asgi_mode_disables_persistent_connections(self):
+        for mode, conn_max_age in (('asgi', 0), ('wsgi', 60)):
+            config = _settings_for(DJANGO_SERVER_MODE=mode, CONN_MAX_AGE='60').DATABASES['default']
+            self.assertEqual(config['CONN_MAX_AGE'], conn_max_age, mode)
+
+    def test_sqlite_connections_use_wal(self):
+        import os
+        import sqlite3
+        import tempfile
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        from traffic_sign_app.database import database_config
+
+        with tempfile.TemporaryDirectory() as tmp:
+            config = database_config('', os.path.join(tmp, 'db.sqlite3'))
+            wrapper = DatabaseWrapper({**config, 'TIME_ZONE': None, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False})
+            wrapper.ensure_connection()
+            wrapper.close()
+            with sqlite3.connect(config['NAME']) as connection:
+                self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+
+class ProcessImageTaskTests(TestCase):
+    def test_result_is_stamped_with_model_version(self):
+        result_codec.reset_catalog()
+        TrafficSign.objects.create(name='Парковка', sign_type='parking')
+        sign = TrafficSign.objects.create(name='Стоп', sign_type='stop', model_sign_id=1)
+        api_response = {
+            'success': True, 'processing_time': 0.12, 'model_version': '2.0.0',
+            'results': [{'sign_id': 1, 'sign_name': 'Стоп', 'confidence': 0.93,
+                         'bounding_box': [10.0, 20.0, 30.0, 40.0]},
+                        {'sign_id': 7, 'sign_name': 'Неизвестный', 'confidence': 0.5,
+                         'bounding_box': [0.0, 0.0, 1.0, 1.0]}],
+        }
+        with mock.patch('traffic_signs.tasks.detect_file', return_value=api_response), \
+                mock.patch.object(process_image_task, 'update_state'):
+            result = process_image_task.apply(args=('celery_uploads/a.jpg',)).get()
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['model_version'], '2.0.0')
+        # sign_id API -> TrafficSign по model_sign_id, знак вне каталога - None
+        self.assertEqual(result['d'], [[sign.id, 0.93, 10.0, 20.0, 30.0, 40.0], [None, 0.5, 0.0, 0.0, 1.0, 1.0]])
+
+    def test_tiled_option_is_passed_to_api(self):
+        api_response = {'success': True, 'processing_time': 0.5, 'results': [], 'tiles': 6}
+        with mock.patch('traffic_signs.tasks.detect_file', return_value=api_response) as detect, \
+                mock.patch.object(process_image_task, 'update_state'):
+            process_image_task.apply(args=('celery_uploads/big.jpg',), kwargs={'tiled': True}).get()
+        detect.assert_called_once_with('celery_uploads/big.jpg', tiled=True)
+
+    def test_cascade_passes_catalog_thresholds(self):
+        result_codec.reset_catalog()
+        TrafficSign.objects.create(name='Стоп', sign_type='stop', escalation_threshold=0.8, model_sign_id=3)
+        TrafficSign.objects.create(name='Парковка', sign_type='parking', escalation_threshold=0.5)
+        api_response = {'success': True, 'processing_time': 0.2, 'results': [], 'escalated': 0}
+        with self.settings(ML_CASCADE=True), \
+                mock.patch('traffic_signs.tasks.detect_file', return_value=api_response) as detect, \
+                mock.patch.object(process_image_task, 'update_state'):
+            result = process_image_task.apply(args=('celery_uploads/a.jpg',)).get()
+        detect.assert_called_once_with('celery_uploads/a.jpg', tiled=False, cascade=True,
+                                       cascade_thresholds={3: 0.8})
+        self.assertEqual(result['escalated'], 0)
+        result_codec.reset_catalog()
+
+    def test_api_error_is_reported(self):
+        with mock.patch('traffic_signs.tasks.detect_file', side_effect=RuntimeError('Invalid image')), \
+                mock.patch.object(process_image_task, 'update_state'):
+            result = process_image_task.apply(args=('celery_uploads/a.jpg',)).get()
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], 'Invalid image')
+
+    def test_video_frames_are_tracked(self):
+        api_response = {
+            'success': True, 'processing_time': 0.3, 'model_version': '2.0.0',
+            'tracks': [{'track_id': 1, 'sign_id': 1, 'sign_name': 'Стоп', 'confidence': 0.93}],
+            'stats': {'frames': 3, 'detections': 3, 'classifier_calls': 1, 'classifier_calls_saved': 2},
+        }
+        frames = ['video/f1.jpg', 'video/f2.jpg', 'video/f3.jpg']
+        with mock.patch('traffic_signs.tasks.track_files', return_value=api_response) as track:
+            result = process_video_frames_task.apply(args=(frames,)).get()
+        track.assert_called_once_with(frames)
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['tracks']), 1)
+        self.assertEqual(result['stats']['classifier_calls_saved'], 2)
+
+    def test_short_video_is_tracked_in_one_request(self):
+        from . import ml_client
+
+        requests = []
+
+        def handler(request):
+            requests.append((request.url.path, json.loads(request.content)))
+            return httpx.Response(200, json={
+                'success': True, 'tracks': [{'track_id': 1}], 'stats': {'frames': 3},
+                'model_version': '2.0.0', 'processing_time': 0.2,
+            })
+
+        client = httpx.Client(base_url='http://api', transport=httpx.MockTransport(handler))
+        with mock.patch('traffic_signs.ml_client._read_base64', side_effect=lambda path: path), \
+                mock.patch('traffic_signs.ml_client._get_client', return_value=client):
+            response = ml_client.track_files(['f1.jpg', 'f2.jpg', 'f3.jpg'])
+
+        self.assertEqual(requests, [('/detection/track', {'frames_base64': ['f1.jpg', 'f2.jpg', 'f3.jpg']})])
+        self.assertEqual(response, {'tracks': [{'track_id': 1}], 'stats': {'frames': 3},
+                                    'model_version': '2.0.0', 'processing_time': 0.2})
+
+    @override_settings(ML_TRACK_MAX_FRAMES=2)
+    def test_track_files_streams_frames_one_by_one(self):
+        from . import ml_client
+
+        frames = []
+
+        def handler(request):
+            payload = json.loads(request.content)
+            frames.append(payload)
+            # Трек 1 завершается на втором кадре, трек 2 - в конце потока
+            emitted = {2: [{'track_id': 1}], 3: [{'track_id': 2}]}.get(len(frames), [])
+            return httpx.Response(200, json={
+                'success': True, 'frame': len(frames), 'emitted': emitted, 'processing_time': 0.1,
+                'stats': {'frames': len(frames)}, 'model_version': '2.0.0',
+            })
+
+        client = httpx.Client(base_url='http://api', transport=httpx.MockTransport(handler))
+        with mock.patch('traffic_signs.ml_client._read_base64', side_effect=lambda path: path), \
+                mock.patch('traffic_signs.ml_client._stream_client', return_value=client):
+            response = ml_client.track_files(['f1.jpg', 'f2.jpg', 'f3.jpg'])
+
+        self.assertEqual([frame['image_base64'] for frame in frames], ['f1.jpg', 'f2.jpg', 'f3.jpg'])
+        self.assertEqual(len({frame['stream_id'] for frame in frames}), 1)
+        self.assertEqual([frame['end'] for frame in frames], [False, False, True])
+        self.assertEqual(response['tracks'], [{'track_id': 1}, {'track_id': 2}])
+        self.assertEqual((response['stats'], response['processing_time']), ({'frames': 3}, 0.3))
+
+    @override_settings(ML_TRACK_MAX_FRAMES=2, ML_STREAM_RESTARTS=1)
+    def test_stream_restarts_from_first_frame_on_another_worker(self):
+        from . import ml_client
+
+        sent = []
+
+        def track(split_streams):
+            """Первые split_streams потоков теряют состояние на втором кадре (другой воркер)"""
+            frames = {}
+
+            def handler(request):
+                payload = json.loads(request.content)
+                stream_id = payload['stream_id']
+                sent.append((stream_id, payload['image_base64']))
+                frames[stream_id] = frames.get(stream_id, 0) + 1
+                if frames[stream_id] == 2 and len(frames) <= split_streams:
+                    frames[stream_id] = 1
+                return httpx.Response(200, json={
+                    'success': True, 'frame': frames[stream_id], 'emitted': [], 'processing_time': 0.1,
+                    'stats': {'frames': frames[stream_id]}, 'model_version': '2.0.0',
+                })
+
+            def stream_client():
+                return httpx.Client(base_url='http://api', transport=httpx.MockTransport(handler))
+
+            with mock.patch('traffic_signs.ml_client._read_base64', side_effect=lambda path: path), \
+                    mock.patch('traffic_signs.ml_client._stream_client', side_effect=stream_client):
+                return ml_client.track_files(['f1.jpg', 'f2.jpg', 'f3.jpg'])
+
+        response = track(split_streams=1)
+        first, second = dict.fromkeys(stream_id for stream_id, _ in sent)
+        self.assertEqual([image for stream_id, image in sent if stream_id == second], ['f1.jpg', 'f2.jpg', 'f3.jpg'])
+        self.assertEqual(response['stats'], {'frames': 3})
+
+        with self.assertRaisesRegex(RuntimeError, 'restarted 1 times'):
+            track(split_streams=2)
+
+
+class QueueTests(TestCase):
+    def test_enqueue_detection_routes_to_queue(self):
+        with mock.patch('traffic_signs.tasks.process_image_task.apply_async') as apply_async:
+            queues.enqueue_detection('bulk/a.jpg', queue=queues.BULK_QUEUE)
+        apply_async.assert_called_once_with(('bulk/a.jpg',), {'tiled': False}, queue='bulk')
+
+    def test_publish_stamps_enqueued_at(self):
+        headers = {}
+        queues.stamp_enqueued_at(headers=headers)
+        self.assertIn('enqueued_at', headers)
+
+    def test_queue_metrics_reports_depth_and_wait(self):
+        pipe = mock.Mock()
+        # interactive: 4 LLEN (по ступеням приоритета) + 2 LRANGE (ожидание, выполнение), затем bulk
+        pipe.execute.return_value = [2, 0, 1, 0, [b'0.5', b'1.5'], [b'0.2'], 7, 0, 0, 0, [], []]
+        client = mock.Mock()
+        client.pipeline.return_value = pipe
+        with mock.patch.object(queues, 'broker_client', return_value=client):
+            metrics = queues.queue_metrics()
+        self.assertEqual(metrics['interactive']['depth'], 3)
+        self.assertEqual(metrics['interactive']['wait_p95'], 1.5)
+        self.assertEqual(metrics['interactive']['run_p95'], 0.2)
+        self.assertEqual(metrics['bulk']['depth'], 7)
+        self.assertIsNone(metrics['bulk']['wait_p50'])
+
+    def test_load_metrics_adds_in_progress_and_is_cached(self):
+        pipe = mock.Mock()
+        pipe.execute.return_value = [2, 0, 1, 0, [], [b'3.0'], 7, 0, 0, 0, [], [], 4]
+        client = mock.Mock()
+        client.pipeline.return_value = pipe
+        queues.reset_load_cache()
+        self.addCleanup(queues.reset_load_cache)
+        with mock.patch.object(queues, 'broker_client', return_value=client):
+            response = self.client.get(reverse('traffic_signs:queue_load'))
+            self.client.get(reverse('traffic_signs:queue_load'))
+        payload = response.json()
+        self.assertEqual((payload['backlog'], payload['in_progress']), (10, 4))
+        self.assertEqual(payload['queues']['interactive']['run_p95'], 3.0)
+        pipe.hlen.assert_called_once_with(queues.UNACKED_KEY)
+        self.assertEqual(pipe.execute.call_count, 1)
+
+    def test_task_run_time_is_recorded(self):
+        task = mock.Mock()
+        task.request = mock.Mock(enqueued_at=None, delivery_info={'routing_key': 'bulk'})
+        with mock.patch.object(queues, '_push_sample') as push:
+            queues.record_queue_wait(task=task)
+            queues.record_task_run(task=task)
+        push.assert_called_once()
+        self.assertEqual(push.call_args[0][0], queues.RUN_KEY.format(queue='bulk'))
+
+    def test_readiness_checks_broker(self):
+        client = mock.Mock()
+        with mock.patch('traffic_signs.views.broker_client', return_value=client):
+            self.assertEqual(self.client.get(reverse('traffic_signs:ready')).status_code, 200)
+            client.ping.side_effect = ConnectionError('refused')
+            response = self.client.get(reverse('traffic_signs:ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'broker': 'refused'})
+
+
+def _settings_for(**environ):
+    """Модуль настроек, заново выполненный с заданными переменными окружения"""
+    import importlib.util
+    import os
+    from traffic_sign_app import settings as project_settings
+
+    spec = importlib.util.spec_from_file_location('traffic_sign_app._settings_check', project_settings.__file__)
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ, environ):
+        spec.loader.exec_module(module)
+    return module
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def test_asgi_middleware_chain_stays_async(self):
+        from asgiref.sync import SyncToAsync
+        from django.core.handlers.asgi import ASGIHandler
+
+        for mode, sync_chain in (('asgi', False), ('wsgi', True)):
+            with self.settings(MIDDLEWARE=_settings_for(DJANGO_SERVER_MODE=mode).MIDDLEWARE):
+                chain = ASGIHandler()._middleware_chain
+            self.assertEqual(isinstance(chain, SyncToAsync), sync_chain, mode)
+
+    async def test_asgi_static_files_bypass_middleware(self):
+        import os
+        import tempfile
+        from asgiref.testing import ApplicationCommunicator
+        from traffic_sign_app.asgi import StaticRootHandler
+
+        application = mock.AsyncMock()
+        with tempfile.TemporaryDirectory() as tmp, self.settings(STATIC_ROOT=tmp):
+            with open(os.path.join(tmp, 'app.0123abcd.css'), 'wb') as f:
+                f.write(b'body{}')
+            communicator = ApplicationCommunicator(StaticRootHandler(application), {
+                'type': 'http', 'method': 'GET', 'path': '/static/app.0123abcd.css',
+                'query_string': b'', 'headers': [],
+            })
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output()
+            body = await communicator.receive_output()
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(body['body'], b'body{}')
+        application.assert_not_called()
+
+    async def test_async_check_task_status(self):
+        meta = {'status': 'SUCCESS', 'result': {'total_detections': 3}}
+        with mock.patch('traffic_signs.async_views.aget_task_metas',
+                        new=mock.AsyncMock(return_value={'abc': meta})):
+            response = await async_check_task_status(self.factory.get('/check-task/abc/'), 'abc')
+        data = json.loads(response.content)
+        self.assertEqual(data['status'], 'SUCCESS')
+        self.assertEqual(data['result']['total_detections'], 3)
+
+    async def test_async_upload_image_get_lists_recent(self):
+        sign = await TrafficSign.objects.acreate(name='Стоп', sign_type='stop')
+        await DetectionResult.objects.acreate(image='detections/a.jpg', sign=sign, confidence=0.9)
+        request = self.factory.get('/upload/')
+        request.user = mock.Mock(is_authenticated=False)
+        response = await async_upload_image(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Стоп')
+
+    async def test_async_api_view_passes_body_through(self):
+        upstream = httpx.Response(200, content=b'{"success":true,"results":[]}',
+                                  headers={'content-type': 'application/json'})
+        request = self.factory.post('/api/async/', {'image': SimpleUploadedFile('a.jpg', b'data')})
+        request.user = mock.Mock(is_authenticated=False)
+        with mock.patch('httpx.AsyncClient.post', new=mock.AsyncMock(return_value=upstream)):
+            response = await AsyncAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"success":true,"results":[]}')
+        self.assertEqual(response['Content-Type'], 'application/json')
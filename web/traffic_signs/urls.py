@@ -1,23 +1,43 @@
+from django.conf import settings
 from django.urls import path
 from django.shortcuts import render
 from . import views
-from .celery_views import celery_upload_view, check_task_status
 from .async_views import AsyncAPIView
 
+# Под ASGI подключаем асинхронные версии view, чтобы не терять
+# конкурентность на адаптере sync -> async
+if settings.SERVER_MODE == 'asgi':
+    from .async_views import (
+        async_celery_upload_view as celery_upload_view,
+        async_check_task_status as check_task_status,
+        async_check_tasks_status as check_tasks_status,
+        async_upload_image as upload_image,
+    )
+else:
+    from .celery_views import celery_upload_view, check_task_status, check_tasks_status
+    from .views import upload_image
+
 app_name = 'traffic_signs'
 
 urlpatterns = [
     path('test-celery/', views.test_celery_upload, name='test_celery'),
     path('test-celery/', lambda request: render(request, 'traffic_signs/test_celery.html'), name='test_celery'),
     path('', views.home, name='home'),
-    path('upload/', views.upload_image, name='upload'),
+    path('upload/', upload_image, name='upload'),
     path('results/', views.results, name='results'),
     path('api/docs/', views.api_docs, name='api_docs'),
     path('api/detect/', views.api_detect, name='api_detect'),
+    path('api/detections/nearby/', views.detections_nearby_view, name='detections_nearby'),
+    path('api/detections/bbox/', views.detections_bbox_view, name='detections_bbox'),
+    path('api/detections/export/', views.export_detections_view, name='detections_export'),
 
     # Celery
     path('celery-upload/', celery_upload_view, name='celery_upload'),
     path('check-task/<str:task_id>/', check_task_status, name='check_task'),
+    path('check-tasks/', check_tasks_status, name='check_tasks'),
+    path('queues/metrics/', views.queue_metrics_view, name='queue_metrics'),
+    path('queues/load/', views.queue_load_view, name='queue_load'),
+    path('ready/', views.readiness_view, name='ready'),
 
     # Async API
     path('api/async/', AsyncAPIView.as_view(), name='async_api'),
@@ -2,18 +2,24 @@
 Views for traffic_signs application
 """
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views import View
+from django.views.decorators.cache import cache_page
 import json
 import os
 from django.conf import settings
 from django.core.files.storage import default_storage
 from celery.result import AsyncResult
-from .tasks import process_image_task
+from .caching import recent_detections_context
+from .export import FORMATS, parse_time, stream_export
+from .geo import bbox_page, location_from_exif, nearby_page
+from .queues import INTERACTIVE_QUEUE, broker_client, enqueue_detection, load_metrics, queue_metrics
 from django.contrib.auth.models import User
 from traffic_signs.models import TrafficSign, DetectionResult
 
 # Basic views
+@cache_page(settings.PAGE_CACHE_TIMEOUT)
 def home(request):
     return render(request, 'traffic_signs/home.html', {
         'title': 'Traffic Sign Detector - Home'
@@ -25,9 +31,6 @@ def upload_image(request):
     from traffic_signs.models import TrafficSign, DetectionResult
     import random
 
-    # Получаем последние 5 детекций для показа (используем detected_at вместо uploaded_at)
-    recent_detections = DetectionResult.objects.all().order_by('-detected_at')[:5]
-
     if request.method == 'POST' and request.FILES.get('image'):
         # 1. Получаем файл
         uploaded_file = request.FILES['image']
@@ -57,25 +60,27 @@ def upload_image(request):
             image=uploaded_file,
             sign=test_sign,
             confidence=random.uniform(0.7, 0.99),  # Случайное значение уверенности
-            user=request.user if request.user.is_authenticated else None
+            user=request.user if request.user.is_authenticated else None,
+            **location_from_exif(uploaded_file)  # Координаты съёмки из EXIF (если есть)
         )
         detection.save()
 
         # 4. Показываем результат пользователю
         return render(request, 'traffic_signs/upload.html', {
             'detection': detection,
-            'recent_detections': recent_detections,
-            'message': 'Image successfully processed!'
+            'message': 'Image successfully processed!',
+            **recent_detections_context(),
         })
 
-    # GET запрос - показываем пустую форму
-    return render(request, 'traffic_signs/upload.html', {
-        'recent_detections': recent_detections
-    })
+    # GET запрос - показываем пустую форму; последние детекции (ленивый
+    # QuerySet) читаются из БД только при промахе кэша фрагмента
+    return render(request, 'traffic_signs/upload.html', recent_detections_context())
 
+@cache_page(settings.PAGE_CACHE_TIMEOUT)
 def results(request):
     return render(request, 'traffic_signs/results.html')
 
+@cache_page(settings.PAGE_CACHE_TIMEOUT)
 def api_docs(request):
     return render(request, 'traffic_signs/api_docs.html')
 
@@ -117,7 +122,7 @@ def celery_upload_view(request):
             file_path = default_storage.save(f'celery_uploads/{image_file.name}', image_file)
 
             # Запускаем Celery задачу
-            task = process_image_task.delay(file_path)
+            task = enqueue_detection(file_path, queue=INTERACTIVE_QUEUE)
 
             # Возвращаем JSON с ID задачи
             return JsonResponse({
@@ -168,6 +173,116 @@ def check_task_status(request, task_id):
         }, status=500)
 
 
+def queue_metrics_view(request):
+    """Глубина очередей Celery и время ожидания задач по каждой очереди"""
+    try:
+        return JsonResponse({'queues': queue_metrics()})
+    except Exception as e:
+        return JsonResponse({'error': f'Error reading queue metrics: {str(e)}'}, status=503)
+
+
+def queue_load_view(request):
+    """
+    Нагрузка на воркеры Celery для автоскейлера: backlog очередей, задачи
+    в работе, p95 ожидания и выполнения (кэш LOAD_METRICS_TTL секунд)
+    """
+    try:
+        return JsonResponse(load_metrics())
+    except Exception as e:
+        return JsonResponse({'error': f'Error reading load metrics: {str(e)}'}, status=503)
+
+
+def readiness_view(request):
+    """Готовность принимать запросы: доступны БД и брокер Celery; иначе 503"""
+    from django.db import connection
+
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = str(e)
+    try:
+        broker_client().ping()
+        checks['broker'] = 'ok'
+    except Exception as e:
+        checks['broker'] = str(e)
+    ready = all(value == 'ok' for value in checks.values())
+    return JsonResponse({'ready': ready, 'checks': checks}, status=200 if ready else 503)
+
+
+def _float_param(request, name, default=None, low=None, high=None):
+    value = request.GET.get(name)
+    if value is None or value == '':
+        if default is None:
+            raise ValueError(f'Parameter {name} is required')
+        return default
+    value = float(value)
+    if (low is not None and value < low) or (high is not None and value > high) or value != value:
+        raise ValueError(f'Parameter {name} must be between {low} and {high}')
+    return value
+
+
+def _page_params(request):
+    limit = int(request.GET.get('limit') or 50)
+    if not 1 <= limit <= 500:
+        raise ValueError('Parameter limit must be between 1 and 500')
+    return limit, request.GET.get('cursor') or None
+
+
+def detections_nearby_view(request):
+    """Детекции в радиусе от точки: ?lat=..&lon=..&radius=200&limit=50&cursor=.."""
+    try:
+        latitude = _float_param(request, 'lat', low=-90, high=90)
+        longitude = _float_param(request, 'lon', low=-180, high=180)
+        radius = _float_param(request, 'radius', default=200.0, low=1, high=50000)
+        limit, cursor = _page_params(request)
+        rows, next_cursor = nearby_page(latitude, longitude, radius, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': rows, 'count': len(rows), 'next_cursor': next_cursor})
+
+
+def detections_bbox_view(request):
+    """Детекции в прямоугольнике: ?min_lat=..&min_lon=..&max_lat=..&max_lon=..&limit=50&cursor=.."""
+    try:
+        min_lat = _float_param(request, 'min_lat', low=-90, high=90)
+        min_lon = _float_param(request, 'min_lon', low=-180, high=180)
+        max_lat = _float_param(request, 'max_lat', low=-90, high=90)
+        max_lon = _float_param(request, 'max_lon', low=-180, high=180)
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError('Expected min_lat <= max_lat and min_lon <= max_lon')
+        limit, cursor = _page_params(request)
+        rows, next_cursor = bbox_page(min_lat, min_lon, max_lat, max_lon, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': rows, 'count': len(rows), 'next_cursor': next_cursor})
+
+
+@staff_member_required
+def export_detections_view(request):
+    """
+    Потоковая выгрузка детекций: ?format=csv|ndjson|parquet&since=..&until=..&sign=1,2
+    """
+    export_format = request.GET.get('format', 'csv')
+    try:
+        sign_ids = [int(sign) for sign in request.GET.get('sign', '').split(',') if sign]
+        chunks = stream_export(
+            export_format,
+            start=parse_time(request.GET.get('since')),
+            end=parse_time(request.GET.get('until'), end=True),
+            sign_ids=sign_ids,
+        )
+    except ValueError as e:  # ExportError или неверный id знака
+        return JsonResponse({'error': str(e)}, status=400)
+
+    _, content_type, extension = FORMATS[export_format]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="detections.{extension}"'
+    return response
+
+
 def celery_test(request):
     """Тестовая страница для проверки Celery"""
     return render(request, 'traffic_signs/celery_test.html')
@@ -179,7 +294,7 @@ def celery_upload_direct(request):
         try:
             image_file = request.FILES['image']
             file_path = default_storage.save(f'direct_uploads/{image_file.name}', image_file)
-            task = process_image_task.delay(file_path)
+            task = enqueue_detection(file_path, queue=INTERACTIVE_QUEUE)
 
             return render(request, 'traffic_signs/celery_result.html', {
                 'task_id': task.id,